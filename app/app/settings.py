@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     "core",
     "rest_framework",
     "rest_framework.authtoken",
@@ -136,7 +137,88 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # Picked by the Accept header, the first one is the default
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.ORJSONRenderer",
+        "core.renderers.MessagePackRenderer",
+    ] + (["rest_framework.renderers.BrowsableAPIRenderer"] if DEBUG else []),
+    "DEFAULT_PARSER_CLASSES": [
+        "core.parsers.ORJSONParser",
+        "core.parsers.MessagePackParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+    # Token buckets per user (or IP when anonymous), see core.throttling
+    "DEFAULT_THROTTLE_CLASSES": ["core.throttling.TokenBucketThrottle"],
+    "DEFAULT_THROTTLE_RATES": {
+        "read": os.environ.get('THROTTLE_RATE_READ', '1200/min'),
+        "write": os.environ.get('THROTTLE_RATE_WRITE', '300/min'),
+        "login": os.environ.get('THROTTLE_RATE_LOGIN', '10/min'),
+        "upload": os.environ.get('THROTTLE_RATE_UPLOAD', '30/min'),
+    },
+}
+
+# Where the throttle buckets live: in process (LocalTokenBucketBackend, per worker)
+# or in the cache above (CacheTokenBucketBackend, shared by the workers)
+THROTTLE_BACKEND = os.environ.get('THROTTLE_BACKEND', 'core.throttling.LocalTokenBucketBackend')
+THROTTLE_LOCAL_MAX_KEYS = 100000
+
+# Default page size for list endpoints, clients can ask for up to max_page_size with ?page_size=
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 25))
+
+# Render the recipe list from plain rows instead of RecipeSerializer (same output, less CPU)
+RECIPE_FAST_LIST_SERIALIZER = True
+
+# Bulk recipe endpoint: most items per request, and whether one invalid item rejects the whole request
+# unless the client passes ?atomic=
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get('RECIPE_BULK_MAX_ITEMS', 1000))
+RECIPE_BULK_ATOMIC = True
+
+# Recipes fetched from the server side cursor per batch by the NDJSON export
+RECIPE_EXPORT_CHUNK_SIZE = int(os.environ.get('RECIPE_EXPORT_CHUNK_SIZE', 2000))
+
+# Resized copies of recipe images served in place of the original, see recipe.images.
+# size is the longest side in pixels, format a Pillow format (JPEG, WEBP or PNG).
+RECIPE_IMAGE_RENDITIONS = {
+    'thumbnail': {'size': 160, 'format': 'WEBP', 'quality': 80},
+    'medium': {'size': 480, 'format': 'WEBP', 'quality': 80},
+    'large': {'size': 1080, 'format': 'JPEG', 'quality': 85},
 }
+# Worker processes rendering them
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+# Largest recipe image upload accepted, in bytes and in pixels
+RECIPE_IMAGE_MAX_BYTES = int(os.environ.get('RECIPE_IMAGE_MAX_BYTES', 10 * 2 ** 20))
+RECIPE_IMAGE_MAX_PIXELS = int(os.environ.get('RECIPE_IMAGE_MAX_PIXELS', 50 * 10 ** 6))
+# Store recipe images under the hash of their content, so identical uploads share one file
+RECIPE_IMAGE_CONTENT_ADDRESSED = bool(int(os.environ.get('RECIPE_IMAGE_CONTENT_ADDRESSED', 0)))
+
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# The response cache relies on per-user versions stored here, so deployments
+# with several workers need a shared backend (e.g. memcached) instead of locmem.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'recipe-app'),
+    }
+}
+
+# Seconds a cached list response is kept, writes invalidate it earlier
+RESPONSE_CACHE_TIMEOUT = 300
+
+# In-process cache of tag/ingredient autocomplete results per user and prefix
+AUTOCOMPLETE_CACHE_SIZE = 10000
+AUTOCOMPLETE_CACHE_TTL = 30
+
+# In-process cache of authenticated tokens, revocations are shared through the cache above
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 300
+
+# Seconds an API token stays valid after it is issued or rotated
+AUTH_TOKEN_TTL = int(os.environ.get('AUTH_TOKEN_TTL', 60 * 60 * 24 * 30))
+# Valid tokens per user, signing in again revokes the oldest
+AUTH_TOKEN_MAX_PER_USER = int(os.environ.get('AUTH_TOKEN_MAX_PER_USER', 10))
 
 SPECTACULAR_SETTINGS = {
     "COMPONENT_SPLIT_REQUEST": True,
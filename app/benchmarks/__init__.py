@@ -0,0 +1,3 @@
+"""
+Performance benchmarks, run from the app directory with `python -m benchmarks.<name>`.
+"""
@@ -0,0 +1,74 @@
+"""
+Measure tag autocomplete latency for a user with many tags.
+
+    python -m benchmarks.autocomplete --tags 50000
+"""
+import argparse
+import random
+import string
+import time
+
+from benchmarks.utils import (benchmark_database, explain)
+
+
+def random_name():
+    """Return a random word-like tag name"""
+    return ''.join(random.choices(string.ascii_lowercase, k=random.randint(4, 12)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tags', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.db.models.functions import (Collate, Upper)
+    from rest_framework.test import (APIRequestFactory, force_authenticate)
+
+    from core.models import Tag
+    from recipe.search import has_trigram_support
+    from recipe.views import (TagViewSet, autocomplete_cache)
+
+    with benchmark_database():
+        user = get_user_model().objects.create_user('bench@example.com', 'benchpass123')
+        names = {random_name() for _ in range(args.tags)}
+        Tag.objects.bulk_create((Tag(user=user, name=name) for name in names), batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        view = TagViewSet.as_view({'get': 'autocomplete'})
+        prefixes = [name[:random.randint(1, 4)] for name in random.sample(sorted(names), args.requests)]
+
+        def run(prefix):
+            request = APIRequestFactory().get('/', {'q': prefix})
+            force_authenticate(request, user)
+            return view(request)
+
+        def latencies(clear_cache):
+            samples = []
+            for prefix in prefixes:
+                if clear_cache:
+                    autocomplete_cache.clear()
+                start = time.perf_counter()
+                run(prefix)
+                samples.append((time.perf_counter() - start) * 1000)
+            samples.sort()
+            return samples[len(samples) // 2], samples[int(len(samples) * 0.99) - 1]
+
+        print(f'{len(names)} tags, {args.requests} prefixes, pg_trgm: {has_trigram_support()}\n')
+        for label, clear_cache in (('uncached', True), ('cached', False)):
+            if not clear_cache:
+                for prefix in prefixes:
+                    run(prefix)
+            median, p99 = latencies(clear_cache)
+            print(f'{label:>8}: median {median:.3f} ms, p99 {p99:.3f} ms')
+        print()
+        print(explain(
+            Tag.objects.filter(user=user, name__istartswith='a').order_by(Collate(Upper('name'), 'C'))[:10]
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare the COPY and ORM paths of the import_recipes command.
+
+    python -m benchmarks.import_recipes --rows 10000 100000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+
+from benchmarks.utils import benchmark_database
+
+
+def write_file(rows, users):
+    """Write a JSONL file of rows recipes spread over the users"""
+    fd, path = tempfile.mkstemp(suffix='.jsonl')
+    with os.fdopen(fd, 'w') as file:
+        for i in range(rows):
+            file.write(json.dumps({
+                'user': users[i % len(users)],
+                'title': f'Recipe {i}',
+                'description': 'Imported recipe',
+                'time_minutes': 10,
+                'price': '5.50',
+                'tags': [f'Tag {i % 30}', 'Vegan'],
+                'ingredients': [f'Ingredient {(i + n) % 100}' for n in range(8)],
+            }) + '\n')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--users', type=int, default=10)
+    args = parser.parse_args()
+
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+
+    with benchmark_database():
+        for rows in args.rows:
+            for method in ('orm', 'copy'):
+                users = [f'{method}{rows}-{i}@example.com' for i in range(args.users)]
+                for email in users:
+                    get_user_model().objects.create_user(email, 'benchpass123')
+                path = write_file(rows, users)
+                try:
+                    start = time.perf_counter()
+                    call_command('import_recipes', path, method=method, stdout=StringIO())
+                    elapsed = time.perf_counter() - start
+                finally:
+                    os.remove(path)
+                print(f'{rows} rows {method:<5} {elapsed:8.2f} s  {rows / elapsed:10.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Compare creating recipes one request at a time with one bulk request.
+
+    python -m benchmarks.recipe_bulk --rows 100 1000
+"""
+import argparse
+import time
+
+from benchmarks.utils import benchmark_database
+
+
+def payload(rows, prefix):
+    return [
+        {
+            'title': f'{prefix} {i}',
+            'time_minutes': 10,
+            'price': '5.50',
+            'tags': [{'name': f'Tag {i % 30}'}, {'name': 'Vegan'}],
+            'ingredients': [{'name': f'Ingredient {(i + n) % 100}'} for n in range(8)],
+        }
+        for i in range(rows)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000])
+    args = parser.parse_args()
+
+    from django.contrib.auth import get_user_model
+    from django.test.utils import override_settings
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    with benchmark_database(), override_settings(ALLOWED_HOSTS=['testserver']):
+        for rows in args.rows:
+            user = get_user_model().objects.create_user(f'bench{rows}@example.com', 'benchpass123')
+            client = APIClient()
+            client.force_authenticate(user)
+
+            start = time.perf_counter()
+            for item in payload(rows, 'Single'):
+                assert client.post(reverse('recipe:recipe-list'), item, format='json').status_code == 201
+            single = time.perf_counter() - start
+
+            start = time.perf_counter()
+            assert client.post(reverse('recipe:recipe-bulk'), payload(rows, 'Bulk'), format='json').status_code == 201
+            many = time.perf_counter() - start
+
+            print(f'{rows} recipes: one by one {single * 1000:8.0f} ms  bulk {many * 1000:8.0f} ms  '
+                  f'({single / many:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
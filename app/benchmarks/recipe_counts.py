@@ -0,0 +1,43 @@
+"""
+Compare assigned_only through the links (join + DISTINCT) with the recipe_count counter.
+
+    python -m benchmarks.recipe_counts --recipes 100000
+"""
+import argparse
+
+from benchmarks.utils import (benchmark_database, explain, timeit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--explain', action='store_true', help='Print the query plans')
+    args = parser.parse_args()
+
+    from django.contrib.auth import get_user_model
+
+    from core.models import (Tag, Ingredient)
+    from benchmarks.recipe_list_serializer import seed
+
+    with benchmark_database():
+        user = get_user_model().objects.create_user('bench@example.com', 'benchpass123')
+        seed(user, args.recipes)
+        for model in (Tag, Ingredient):
+            model.objects.bulk_create(model(user=user, name=f'Unused {i}') for i in range(1000))
+        for model in (Tag, Ingredient):
+            queryset = model.objects.filter(user=user)
+            queries = {
+                'join + distinct': queryset.filter(recipe__isnull=False).distinct().order_by('-name', 'id')[:25],
+                'recipe_count > 0': queryset.filter(recipe_count__gt=0).order_by('-name', 'id')[:25],
+                'by recipe_count': queryset.order_by('-recipe_count', 'id')[:25],
+            }
+            print(model._meta.verbose_name_plural)
+            for name, page in queries.items():
+                median, p95 = timeit(lambda: list(page.all()))
+                print(f'  {name:<18} median {median:7.2f} ms  p95 {p95:7.2f} ms')
+                if args.explain:
+                    print(explain(page))
+
+
+if __name__ == '__main__':
+    main()
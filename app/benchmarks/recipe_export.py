@@ -0,0 +1,53 @@
+"""
+Measure time to first byte, total time and peak memory of the NDJSON export.
+
+    python -m benchmarks.recipe_export --rows 10000 100000
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.utils import benchmark_database
+from benchmarks.recipe_list_serializer import seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    from django.contrib.auth import get_user_model
+    from django.test.utils import override_settings
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    with benchmark_database(), override_settings(ALLOWED_HOSTS=['testserver']):
+        for rows in args.rows:
+            user = get_user_model().objects.create_user(f'bench{rows}@example.com', 'benchpass123')
+            seed(user, rows)
+            client = APIClient()
+            client.force_authenticate(user)
+
+            def export():
+                return iter(client.get(reverse('recipe:recipe-export')).streaming_content)
+
+            start = time.perf_counter()
+            content = export()
+            size = len(next(content))
+            first_byte = (time.perf_counter() - start) * 1000
+            size += sum(len(chunk) for chunk in content)
+            total = (time.perf_counter() - start) * 1000
+
+            # Separate pass, tracing allocations slows the export down too much to time it
+            tracemalloc.start()
+            for _ in export():
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            print(f'{rows} rows: first byte {first_byte:.1f} ms, total {total:.0f} ms, '
+                  f'{size / 1e6:.1f} MB streamed, peak {peak / 1e6:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
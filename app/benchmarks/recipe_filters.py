@@ -0,0 +1,76 @@
+"""
+Compare JOIN+DISTINCT recipe filtering with the EXISTS based filters.
+
+    python -m benchmarks.recipe_filters --recipes 100000
+"""
+import argparse
+import random
+from decimal import Decimal
+
+from benchmarks.utils import (benchmark_database, timeit, explain)
+
+
+def seed(user, recipes, tags_per_recipe):
+    """Create recipes each linked to a random sample of tags."""
+    from core.models import (Recipe, Tag)
+
+    tags = Tag.objects.bulk_create(Tag(user=user, name=f'Tag {i}') for i in range(50))
+    batch = 5000
+    for start in range(0, recipes, batch):
+        created = Recipe.objects.bulk_create(
+            Recipe(user=user, title=f'Recipe {i}', time_minutes=10, price=Decimal('5.00'))
+            for i in range(start, min(start + batch, recipes))
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe in created
+            for tag in random.sample(tags, tags_per_recipe)
+        )
+    return [tag.id for tag in tags]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--tags-per-recipe', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=25)
+    args = parser.parse_args()
+
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from core.models import Recipe
+    from recipe.views import RecipeViewSet
+
+    with benchmark_database():
+        user = get_user_model().objects.create_user('bench@example.com', 'benchpass123')
+        tag_ids = seed(user, args.recipes, args.tags_per_recipe)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        filter_ids = tag_ids[:3]
+
+        def view_queryset(params):
+            request = Request(APIRequestFactory().get('/', params))
+            request.user = user
+            return RecipeViewSet(request=request, action='list').get_queryset().prefetch_related(None)
+
+        cases = {
+            'join + distinct': Recipe.objects.filter(
+                user=user, tags__id__in=filter_ids).order_by('-id').distinct(),
+            'exists (match=any)': view_queryset({'tags': ','.join(map(str, filter_ids))}),
+            'grouped (match=all)': view_queryset({'tags': ','.join(map(str, filter_ids)), 'match': 'all'}),
+        }
+
+        print(f'{args.recipes} recipes, {args.tags_per_recipe} tags each, filtering on {len(filter_ids)} tags\n')
+        for name, queryset in cases.items():
+            page = queryset[:args.page_size]
+            median, p95 = timeit(lambda: list(page.all()))
+            print(f'== {name}: median {median:.2f} ms, p95 {p95:.2f} ms')
+            print(explain(page))
+            print()
+
+
+if __name__ == '__main__':
+    main()
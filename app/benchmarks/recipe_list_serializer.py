@@ -0,0 +1,69 @@
+"""
+Compare RecipeSerializer with RecipeListFastSerializer on recipe lists.
+
+    python -m benchmarks.recipe_list_serializer --rows 1000 10000
+"""
+import argparse
+import random
+from decimal import Decimal
+
+from benchmarks.utils import (benchmark_database, timeit)
+
+
+def seed(user, rows):
+    """Create rows recipes with a few tags and ingredients each"""
+    from core.models import (Recipe, Tag, Ingredient)
+
+    tags = Tag.objects.bulk_create(Tag(user=user, name=f'Tag {i}') for i in range(30))
+    ingredients = Ingredient.objects.bulk_create(Ingredient(user=user, name=f'Ingredient {i}') for i in range(100))
+    recipes = Recipe.objects.bulk_create(
+        Recipe(user=user, title=f'Recipe {i}', time_minutes=10, price=Decimal('5.50'), link='https://example.com')
+        for i in range(rows)
+    )
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+        for recipe in recipes for tag in random.sample(tags, 3)
+    )
+    Recipe.ingredients.through.objects.bulk_create(
+        Recipe.ingredients.through(recipe_id=recipe.id, ingredient_id=ingredient.id)
+        for recipe in recipes for ingredient in random.sample(ingredients, 8)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    args = parser.parse_args()
+
+    from django.contrib.auth import get_user_model
+    from django.db.models import Prefetch
+
+    from core.models import (Recipe, Tag, Ingredient)
+    from recipe.serializers import (RecipeSerializer, RecipeListFastSerializer)
+
+    with benchmark_database():
+        for rows in args.rows:
+            user = get_user_model().objects.create_user(f'bench{rows}@example.com', 'benchpass123')
+            seed(user, rows)
+            recipes = Recipe.objects.filter(user=user).order_by('-id')
+
+            def drf():
+                queryset = recipes.only(*RecipeSerializer.Meta.fields[:5]).prefetch_related(
+                    Prefetch('tags', queryset=Tag.objects.order_by('id')),
+                    Prefetch('ingredients', queryset=Ingredient.objects.order_by('id')),
+                )
+                return RecipeSerializer(queryset, many=True).data
+
+            def fast():
+                columns = [name for name in RecipeSerializer.Meta.fields if name not in ('tags', 'ingredients')]
+                return RecipeListFastSerializer(list(recipes.values(*columns))).data
+
+            assert drf() == fast()
+            print(f'{rows} rows')
+            for name, func in (('RecipeSerializer', drf), ('RecipeListFastSerializer', fast)):
+                median, _ = timeit(func, repeat=5)
+                print(f'  {name:<26} {median:8.1f} ms  {rows / median * 1000:10.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Compare DRF's JSONRenderer with the orjson and MessagePack renderers.
+
+Renders synthetic recipe list pages, so no database is needed.
+
+    python -m benchmarks.renderers --rows 100 1000 10000
+"""
+import argparse
+from decimal import Decimal
+
+from benchmarks.utils import timeit
+
+
+def recipes(rows):
+    """Build rows recipe dicts shaped like the list endpoint output"""
+    return [
+        {
+            'id': i,
+            'title': f'Recipe {i}',
+            'time_minutes': 10,
+            'price': Decimal('5.50'),
+            'link': 'https://example.com',
+            'tags': [{'id': t, 'name': f'Tag {t}'} for t in range(3)],
+            'ingredients': [{'id': n, 'name': f'Ingredient {n}'} for n in range(8)],
+        }
+        for i in range(rows)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    from rest_framework.renderers import JSONRenderer
+
+    from core.renderers import (ORJSONRenderer, MessagePackRenderer)
+
+    renderers = (
+        ('JSONRenderer', JSONRenderer()),
+        ('ORJSONRenderer', ORJSONRenderer()),
+        ('MessagePackRenderer', MessagePackRenderer()),
+    )
+    for rows in args.rows:
+        data = {'next': None, 'previous': None, 'results': recipes(rows)}
+        print(f'{rows} rows')
+        for name, renderer in renderers:
+            size = len(renderer.render(data))
+            median, _ = timeit(lambda: renderer.render(data), repeat=10)
+            print(f'  {name:<20} {median:8.2f} ms  {size:10d} bytes')
+
+
+if __name__ == '__main__':
+    main()
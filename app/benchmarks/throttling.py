@@ -0,0 +1,51 @@
+"""
+Measure what the token bucket throttle adds to a request.
+
+Times TokenBucketThrottle.allow_request for many clients on each backend,
+so no database is needed.
+
+    python -m benchmarks.throttling --clients 10000 --requests 100000
+"""
+import argparse
+import random
+
+from benchmarks.utils import timeit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=100000)
+    args = parser.parse_args()
+
+    from unittest.mock import patch
+
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import (RequestFactory, override_settings)
+    from rest_framework.request import Request
+    from rest_framework.settings import api_settings
+
+    from core.throttling import TokenBucketThrottle
+
+    factory = RequestFactory()
+    requests = []
+    for i in range(args.clients):
+        address = f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}'
+        request = Request(factory.get('/api/recipe/recipes/', REMOTE_ADDR=address))
+        request.user = AnonymousUser()
+        requests.append(request)
+    order = [random.choice(requests) for _ in range(args.requests)]
+    view = object()
+
+    for backend in ('core.throttling.LocalTokenBucketBackend', 'core.throttling.CacheTokenBucketBackend'):
+        # A budget no client runs out of, so every call takes the full path
+        with override_settings(THROTTLE_BACKEND=backend), \
+                patch.dict(api_settings.DEFAULT_THROTTLE_RATES, {'read': f'{args.requests}/s'}):
+            throttle = TokenBucketThrottle()
+            median, p95 = timeit(lambda: [throttle.allow_request(request, view) for request in order], repeat=5)
+        name = backend.rsplit('.', 1)[1]
+        print(f'{name:<26} {median * 1000 / args.requests:6.2f} us per request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Compare token authentication with and without the verification cache.
+
+    python -m benchmarks.token_auth --repeat 1000
+"""
+import argparse
+
+from benchmarks.utils import (benchmark_database, timeit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from core.authentication import (CachedTokenAuthentication, token_cache)
+    from core.models import AuthToken
+
+    with benchmark_database():
+        user = get_user_model().objects.create_user('bench@example.com', 'benchpass123')
+        token, key = AuthToken.objects.issue(user)
+        auth = CachedTokenAuthentication()
+
+        def uncached():
+            token_cache.clear()
+            auth.authenticate_credentials(key)
+
+        def cached():
+            auth.authenticate_credentials(key)
+
+        for name, func in (('database + hash', uncached), ('cached', cached)):
+            median, p95 = timeit(func, repeat=args.repeat)
+            with CaptureQueriesContext(connection) as queries:
+                func()
+            print(f'{name:<16} median {median * 1000:7.1f} us  p95 {p95 * 1000:7.1f} us  queries {len(queries)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Shared helpers for the benchmarks.
+
+Each benchmark runs against a throwaway test database so it never touches
+real data.
+"""
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+
+@contextmanager
+def benchmark_database():
+    """Create a test database for the duration of the benchmark."""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def timeit(func, repeat=20):
+    """Run func repeatedly and return (median, p95) in milliseconds."""
+    func()  # warm up caches and connections
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def explain(queryset):
+    """Return the EXPLAIN ANALYZE plan for a queryset."""
+    if connection.vendor == 'postgresql':
+        return queryset.explain(analyze=True, buffers=True)
+    return queryset.explain()
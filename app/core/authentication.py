@@ -0,0 +1,108 @@
+"""
+Authentication for the API.
+
+Tokens are stored as a SHA-256 digest and found by the first characters of
+their key (see core.models.AuthToken). CachedTokenAuthentication keeps the
+verified tokens in a bounded in-process LRU keyed by that prefix, so a known
+token costs neither a database query nor a hash, only a constant time
+comparison with the key that was verified.
+
+Every verified token has a generation in the shared cache which is bumped
+when the token is deleted or its user changes (deactivated, new password, any
+other save). A cached entry is only used while its generation is current, so
+revocations apply at once in every process.
+"""
+import copy
+import hmac
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.cache import LRUCache
+from core.models import AuthToken
+
+token_cache = LRUCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE, ttl=settings.AUTH_TOKEN_CACHE_TTL)
+# Generations outlive the cached tokens, one that expired only makes the token verified again
+GENERATION_TTL = 2 * settings.AUTH_TOKEN_CACHE_TTL
+
+
+def _generation_key(prefix):
+    return f'auth:token-generation:{prefix}'
+
+
+def get_token_generation(prefix):
+    """Return the current generation of the token with the given prefix, None if there is none yet"""
+    return cache.get(_generation_key(prefix))
+
+
+def _start_token_generation(prefix):
+    """Give a verified token a generation, return it or None if one appeared meanwhile"""
+    # Start from the clock so a generation that expired can never come back with an old value
+    generation = time.time_ns()
+    if cache.add(_generation_key(prefix), generation, timeout=GENERATION_TTL):
+        return generation
+    # A revocation may have set it since the token was read, so what was read must not be cached
+    return None
+
+
+def _bump_token_generation(prefix):
+    try:
+        cache.incr(_generation_key(prefix))
+    except ValueError:
+        cache.set(_generation_key(prefix), time.time_ns(), timeout=GENERATION_TTL)
+    token_cache.delete(prefix)
+
+
+def invalidate_token(prefix):
+    """Stop serving a token from the cache, in this and every other process"""
+    _bump_token_generation(prefix)
+    # A request that read the token before the commit may cache it under the new generation
+    transaction.on_commit(lambda: _bump_token_generation(prefix))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication against hashed, expiring AuthTokens, served from an in-process cache"""
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        if len(key) != AuthToken.KEY_LENGTH:
+            raise AuthenticationFailed(_('Invalid token.'))
+        prefix = key[:AuthToken.PREFIX_LENGTH]
+        # Read the generation before the database, a revocation in between then invalidates what we cache
+        generation = get_token_generation(prefix)
+        cached = token_cache.get(prefix)
+        if generation is None or cached is None or cached[0] != generation:
+            user, token = self.verify(key, prefix)
+            # Only verified tokens get a generation, made up keys must leave nothing in the shared cache
+            if generation is None:
+                generation = _start_token_generation(prefix)
+            cached = (generation, key, user, token)
+            if generation is not None:
+                token_cache.set(prefix, cached)
+        elif not hmac.compare_digest(cached[1], key):
+            raise AuthenticationFailed(_('Invalid token.'))
+
+        if cached[3].is_expired:
+            raise AuthenticationFailed(_('Token has expired.'))
+        # Requests get their own copies, views such as ManageUserView modify request.user
+        user = copy.copy(cached[2])
+        token = copy.copy(cached[3])
+        token.user = user
+        return user, token
+
+    def verify(self, key, prefix):
+        """Look the token up by prefix and check the key against its digest"""
+        try:
+            token = self.model.objects.select_related('user').get(prefix=prefix)
+        except self.model.DoesNotExist:
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not hmac.compare_digest(token.digest, self.model.hash_key(key)):
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return token.user, token
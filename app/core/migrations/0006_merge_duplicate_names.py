@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:17
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Fold tags/ingredients sharing (user, name) into the oldest row before adding the constraints."""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, relation in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, relation).through
+        column = f'{model_name.lower()}_id'
+        duplicates = model.objects.values('user_id', 'name').annotate(
+            keep=Min('id'), total=Count('id'),
+        ).filter(total__gt=1)
+        for dup in duplicates:
+            extra_ids = list(model.objects.filter(
+                user_id=dup['user_id'], name=dup['name'],
+            ).exclude(id=dup['keep']).values_list('id', flat=True))
+            recipe_ids = through.objects.filter(**{f'{column}__in': extra_ids}).values_list('recipe_id', flat=True)
+            through.objects.bulk_create(
+                [through(recipe_id=recipe_id, **{column: dup['keep']}) for recipe_id in set(recipe_ids)],
+                ignore_conflicts=True,
+            )
+            model.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
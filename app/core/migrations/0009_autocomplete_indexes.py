@@ -0,0 +1,39 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:02
+
+from django.db import migrations
+
+TABLES = ('core_tag', 'core_ingredient')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Add trigram indexes for typo tolerant autocomplete when pg_trgm is available"""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in TABLES:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {table}_name_trgm_idx ON {table} USING gin (name gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f'DROP INDEX IF EXISTS {table}_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_search_vector'),
+    ]
+
+    operations = [
+        # Case insensitive prefix matches (name__istartswith) within one user's names
+        migrations.RunSQL(
+            [f'CREATE INDEX {table}_user_name_prefix_idx ON {table} (user_id, UPPER(name::text) text_pattern_ops);'
+             for table in TABLES],
+            [f'DROP INDEX {table}_user_name_prefix_idx;' for table in TABLES],
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:03
+
+from django.db import migrations, models
+
+COUNT_TRIGGER_SQL = """
+CREATE FUNCTION core_recipe_{relation}_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        -- Never below zero, a drifted count must not fail the write, reconcile_recipe_counts fixes it
+        UPDATE core_{model} SET recipe_count = GREATEST(recipe_count - changed.n, 0)
+        FROM (SELECT {model}_id, count(*) AS n FROM old_rows GROUP BY {model}_id) changed
+        WHERE core_{model}.id = changed.{model}_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE core_{model} SET recipe_count = recipe_count + changed.n
+        FROM (SELECT {model}_id, count(*) AS n FROM new_rows GROUP BY {model}_id) changed
+        WHERE core_{model}.id = changed.{model}_id;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_recipe_{relation}_count_insert
+    AFTER INSERT ON core_recipe_{relation} REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_{relation}_count();
+CREATE TRIGGER core_recipe_{relation}_count_update
+    AFTER UPDATE ON core_recipe_{relation} REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_{relation}_count();
+CREATE TRIGGER core_recipe_{relation}_count_delete
+    AFTER DELETE ON core_recipe_{relation} REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_{relation}_count();
+
+UPDATE core_{model} SET recipe_count = counts.n
+FROM (SELECT {model}_id, count(*) AS n FROM core_recipe_{relation} GROUP BY {model}_id) counts
+WHERE core_{model}.id = counts.{model}_id;
+"""
+
+DROP_COUNT_TRIGGER_SQL = """
+DROP TRIGGER core_recipe_{relation}_count_insert ON core_recipe_{relation};
+DROP TRIGGER core_recipe_{relation}_count_update ON core_recipe_{relation};
+DROP TRIGGER core_recipe_{relation}_count_delete ON core_recipe_{relation};
+DROP FUNCTION core_recipe_{relation}_count();
+"""
+
+RELATIONS = {'tags': 'tag', 'ingredients': 'ingredient'}
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        *(
+            migrations.RunSQL(
+                COUNT_TRIGGER_SQL.format(relation=relation, model=model),
+                DROP_COUNT_TRIGGER_SQL.format(relation=relation),
+            )
+            for relation, model in RELATIONS.items()
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', '-name', 'id'], name='ingredient_assigned_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count', 'id'], name='ingredient_recipe_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', '-name', 'id'], name='tag_assigned_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count', 'id'], name='tag_recipe_count_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:20
+
+import datetime
+import hashlib
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+PREFIX_LENGTH = 12
+
+
+def hash_drf_tokens(apps, schema_editor):
+    """Replace the plaintext DRF tokens with hashed, expiring ones that accept the same keys."""
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('core', 'AuthToken')
+    # Existing clients get a full lifetime from the deploy rather than being expired at once
+    expires = timezone.now() + datetime.timedelta(seconds=settings.AUTH_TOKEN_TTL)
+    migrated = {}
+    for key, user_id in Token.objects.values_list('key', 'user_id').iterator():
+        # Two keys sharing a prefix are astronomically unlikely, the later one has to sign in again
+        migrated.setdefault(key[:PREFIX_LENGTH], AuthToken(
+            prefix=key[:PREFIX_LENGTH],
+            digest=hashlib.sha256(key.encode()).hexdigest(),
+            user_id=user_id,
+            expires=expires,
+        ))
+    AuthToken.objects.bulk_create(migrated.values(), batch_size=1000)
+    Token.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authtoken', '0003_tokenproxy'),
+        ('core', '0012_auth_token'),
+    ]
+
+    operations = [
+        # The plaintext keys are gone afterwards, so there is no reverse and Django refuses to unapply this
+        migrations.RunPython(hash_drf_tokens),
+    ]
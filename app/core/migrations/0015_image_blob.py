@@ -0,0 +1,76 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:35
+
+from django.db import migrations, models
+
+REF_COUNT_TRIGGER_SQL = """
+CREATE FUNCTION core_recipe_image_ref_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE core_imageblob SET ref_count = ref_count + changed.n
+        FROM (SELECT image, count(*) AS n FROM new_rows GROUP BY image) changed
+        WHERE core_imageblob.path = changed.image;
+    ELSIF TG_OP = 'DELETE' THEN
+        -- Never below zero, a drifted count must not fail the write
+        UPDATE core_imageblob SET ref_count = GREATEST(ref_count - changed.n, 0)
+        FROM (SELECT image, count(*) AS n FROM old_rows GROUP BY image) changed
+        WHERE core_imageblob.path = changed.image;
+    ELSE
+        -- Net change per image, so updates leaving the image alone write nothing
+        UPDATE core_imageblob SET ref_count = GREATEST(ref_count + changed.n, 0)
+        FROM (
+            SELECT image, sum(n) AS n FROM (
+                SELECT image, 1 AS n FROM new_rows UNION ALL SELECT image, -1 AS n FROM old_rows
+            ) images
+            GROUP BY image HAVING sum(n) <> 0
+        ) changed
+        WHERE core_imageblob.path = changed.image;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_recipe_image_ref_count_insert
+    AFTER INSERT ON core_recipe REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_image_ref_count();
+CREATE TRIGGER core_recipe_image_ref_count_update
+    AFTER UPDATE ON core_recipe REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_image_ref_count();
+CREATE TRIGGER core_recipe_image_ref_count_delete
+    AFTER DELETE ON core_recipe REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_recipe_image_ref_count();
+"""
+
+DROP_REF_COUNT_TRIGGER_SQL = """
+DROP TRIGGER core_recipe_image_ref_count_insert ON core_recipe;
+DROP TRIGGER core_recipe_image_ref_count_update ON core_recipe;
+DROP TRIGGER core_recipe_image_ref_count_delete ON core_recipe;
+DROP FUNCTION core_recipe_image_ref_count();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('path', models.CharField(max_length=100, unique=True)),
+                ('ref_count', models.PositiveIntegerField(default=0, editable=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunSQL(REF_COUNT_TRIGGER_SQL, DROP_REF_COUNT_TRIGGER_SQL),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['image'], name='recipe_image_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imageblob',
+            index=models.Index(condition=models.Q(('ref_count', 0)), fields=['digest'], name='imageblob_unreferenced_idx'),
+        ),
+    ]
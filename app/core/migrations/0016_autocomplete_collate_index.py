@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:10
+
+from django.db import migrations
+
+TABLES = ('core_tag', 'core_ingredient')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_image_blob'),
+    ]
+
+    operations = [
+        # Replaces the text_pattern_ops index of 0009. A "C" collated column serves the prefix match
+        # (name__istartswith) as a range scan just the same, and is also in the byte-wise order autocomplete
+        # sorts by, so a scan stops after limit rows instead of sorting every match.
+        migrations.RunSQL(
+            [
+                sql for table in TABLES for sql in (
+                    f'DROP INDEX {table}_user_name_prefix_idx;',
+                    f'CREATE INDEX {table}_user_name_prefix_idx ON {table} (user_id, (UPPER(name::text)) COLLATE "C");',
+                )
+            ],
+            [
+                sql for table in TABLES for sql in (
+                    f'DROP INDEX {table}_user_name_prefix_idx;',
+                    f'CREATE INDEX {table}_user_name_prefix_idx ON {table} (user_id, UPPER(name::text) text_pattern_ops);',
+                )
+            ],
+        ),
+    ]
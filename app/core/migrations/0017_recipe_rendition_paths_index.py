@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:15
+
+import core.models
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_autocomplete_collate_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(core.models.RenditionPaths(), name='recipe_rendition_paths_idx'),
+        ),
+    ]
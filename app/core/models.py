@@ -1,11 +1,17 @@
 """Database models. """
 
-from django.db import models
+from django.db import (IntegrityError, models, transaction)
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import (
     AbstractBaseUser, BaseUserManager, PermissionsMixin
 )
 from django.conf import settings
+from django.utils import timezone
 
+import datetime
+import hashlib
+import secrets
 import uuid
 import os
 
@@ -18,6 +24,11 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('uploads/recipe/', filename)
 
 
+def image_blob_path(digest, ext):
+    """Return the path of a content addressed recipe image"""
+    return os.path.join('uploads/recipe/', digest[:2], f'{digest}.{ext}')
+
+
 class UserManager(BaseUserManager):
     """Manager for the User model."""
 
@@ -52,6 +63,93 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+class AuthTokenManager(models.Manager):
+    """Manager for the AuthToken model."""
+
+    def issue(self, user):
+        """Create a token for the user and return it with its key, which is not stored anywhere"""
+        # Expired tokens are of no use to anyone, clear them out while we are here
+        self.filter(user=user, expires__lte=timezone.now()).delete()
+        for attempt in range(3):
+            key = secrets.token_hex(AuthToken.KEY_LENGTH // 2)
+            try:
+                with transaction.atomic(using=self._db):
+                    token = self.create(
+                        user=user,
+                        prefix=key[:AuthToken.PREFIX_LENGTH],
+                        digest=AuthToken.hash_key(key),
+                        expires=timezone.now() + datetime.timedelta(seconds=settings.AUTH_TOKEN_TTL),
+                    )
+                break
+            except IntegrityError:
+                # Another token already starts with the same characters
+                continue
+        else:
+            raise IntegrityError('Could not find an unused token prefix')
+        # Every sign in issues a token, only the newest few of a user stay valid
+        oldest = self.filter(user=user).order_by('-created', '-pk')[settings.AUTH_TOKEN_MAX_PER_USER:]
+        # post_delete is still sent per token, which revokes the cached copies too
+        self.filter(pk__in=list(oldest.values_list('pk', flat=True))).delete()
+        return token, key
+
+
+class AuthToken(models.Model):
+    """API token of a user, stored as a digest and found by the first characters of its key.
+
+    Keys are 160 random bits, so a plain SHA-256 digest is enough to make a
+    leaked table useless; slow password hashes only help low entropy secrets.
+    """
+    KEY_LENGTH = 40
+    PREFIX_LENGTH = 12
+
+    prefix = models.CharField(max_length=PREFIX_LENGTH, unique=True)
+    digest = models.CharField(max_length=64)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='auth_tokens')
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField()
+
+    objects = AuthTokenManager()
+
+    @staticmethod
+    def hash_key(key):
+        """Return the digest stored for a key"""
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @property
+    def is_expired(self):
+        return self.expires <= timezone.now()
+
+    def __str__(self):
+        return self.prefix
+
+
+class ImageBlob(models.Model):
+    """An image stored once under the hash of its content, shared by every recipe uploading it"""
+    digest = models.CharField(max_length=64, primary_key=True)  # sha256 hex
+    path = models.CharField(max_length=100, unique=True)
+    # Recipes whose image is path, kept up to date by a database trigger, see migration 0015
+    ref_count = models.PositiveIntegerField(default=0, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # collect_images walks the unreferenced blobs only
+            models.Index(fields=['digest'], condition=models.Q(ref_count=0), name='imageblob_unreferenced_idx'),
+        ]
+
+    def __str__(self):
+        return self.path
+
+
+class RenditionPaths(models.Func):
+    """The storage paths of a recipe's renditions, as a JSON array"""
+    function = 'jsonb_path_query_array'
+    output_field = models.JSONField()
+
+    def __init__(self, expression='renditions', **extra):
+        super().__init__(expression, models.Value('$.*'), **extra)
+
+
 class Recipe(models.Model):
     """Recipe model"""
     user = models.ForeignKey(
@@ -66,6 +164,23 @@ class Recipe(models.Model):
     tags = models.ManyToManyField('Tag', blank=True)
     ingredients = models.ManyToManyField('Ingredient', blank=True)
     image = models.ImageField(upload_to=recipe_image_file_path, null=True)
+    # {rendition name: storage path} of the resized copies of image, filled in by recipe.images
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    # Kept up to date from title and description by a database trigger, see migration 0008
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Also bumped when tags or ingredients are linked or unlinked, see recipe.signals
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Every recipe list filters by user and pages over -id
+            models.Index(fields=['user', '-id'], name='recipe_user_id_desc_idx'),
+            GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+            # Finding the recipes sharing an image, and whether a stored file is referenced
+            models.Index(fields=['image'], name='recipe_image_idx'),
+            # Whether a stored file is a rendition some recipe uses, RenditionPaths() filtered with has_any_keys
+            GinIndex(RenditionPaths(), name='recipe_rendition_paths_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -75,6 +190,22 @@ class Tag(models.Model):
     """Tag for filtering the recipies"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Number of linked recipes, kept up to date by database triggers on the through table, see migration 0011
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            # Also serves (user, name) lookups and name ordered lists as an index-only scan
+            models.UniqueConstraint(fields=['user', 'name'], include=['id'], name='unique_tag_name_per_user'),
+        ]
+        indexes = [
+            # assigned_only lists, in the list's name order
+            models.Index(
+                fields=['user', '-name', 'id'], condition=models.Q(recipe_count__gt=0), name='tag_assigned_name_idx',
+            ),
+            models.Index(fields=['user', '-recipe_count', 'id'], name='tag_recipe_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -84,6 +215,23 @@ class Ingredient(models.Model):
     """Ingredient model"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Number of linked recipes, kept up to date by database triggers on the through table, see migration 0011
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            # Also serves (user, name) lookups and name ordered lists as an index-only scan
+            models.UniqueConstraint(fields=['user', 'name'], include=['id'], name='unique_ingredient_name_per_user'),
+        ]
+        indexes = [
+            # assigned_only lists, in the list's name order
+            models.Index(
+                fields=['user', '-name', 'id'], condition=models.Q(recipe_count__gt=0),
+                name='ingredient_assigned_name_idx',
+            ),
+            models.Index(fields=['user', '-recipe_count', 'id'], name='ingredient_recipe_count_idx'),
+        ]
 
     def __str__(self):
         return self.name
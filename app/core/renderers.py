@@ -0,0 +1,69 @@
+"""
+Renderers for the API
+"""
+from decimal import Decimal
+
+import msgpack
+import orjson
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.renderers import (BaseRenderer, JSONRenderer)
+
+
+def encode_default(obj):
+    """Encode the types orjson and msgpack do not handle themselves"""
+    if isinstance(obj, Decimal):
+        # As a string, like DecimalField does, so prices keep their exact value
+        return str(obj)
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    if hasattr(obj, '__iter__'):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not serializable')
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON renderer built on orjson, which also encodes UUIDs and datetimes natively"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        option = orjson.OPT_NON_STR_KEYS
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=encode_default, option=option)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack renderer for internal service clients"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=True)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline delimited JSON, one object per line.
+
+    Streaming views write their own lines with render_line(), plain
+    responses such as errors come out as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    @staticmethod
+    def render_line(obj):
+        return orjson.dumps(obj, default=encode_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return self.render_line(data)
@@ -0,0 +1,23 @@
+"""
+Signal handlers for the core app
+"""
+from django.db.models.signals import (post_delete, post_save)
+from django.dispatch import receiver
+
+from core.authentication import invalidate_token
+from core.models import (AuthToken, User)
+
+
+@receiver(post_delete, sender=AuthToken)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Revoke a deleted token in every process's token cache"""
+    invalidate_token(instance.prefix)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Drop the cached snapshots of a user whose password, active flag or profile changed"""
+    if created:
+        return
+    for prefix in AuthToken.objects.filter(user=instance).values_list('prefix', flat=True):
+        invalidate_token(prefix)
@@ -0,0 +1,212 @@
+"""
+Tests for the cached token authentication
+"""
+import datetime
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from core.authentication import (CachedTokenAuthentication, get_token_generation, token_cache)
+from core.models import AuthToken
+
+ME_URL = reverse('user:me')
+
+
+class AuthTokenModelTests(TestCase):
+    """Test issuing tokens"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+
+    def test_issue_stores_only_a_digest(self):
+        """Test the key is not stored, only its prefix and digest"""
+        token, key = AuthToken.objects.issue(self.user)
+
+        self.assertEqual(len(key), AuthToken.KEY_LENGTH)
+        self.assertEqual(token.prefix, key[:AuthToken.PREFIX_LENGTH])
+        self.assertEqual(token.digest, AuthToken.hash_key(key))
+        self.assertNotIn(key, token.digest)
+        self.assertFalse(token.is_expired)
+
+    def test_issue_clears_expired_tokens(self):
+        """Test issuing a token deletes the user's expired ones"""
+        old, key = AuthToken.objects.issue(self.user)
+        AuthToken.objects.filter(pk=old.pk).update(expires=timezone.now())
+
+        AuthToken.objects.issue(self.user)
+
+        self.assertFalse(AuthToken.objects.filter(pk=old.pk).exists())
+
+    def test_issue_caps_tokens_per_user(self):
+        """Test signing in again revokes the oldest tokens beyond the per user limit"""
+        cache.clear()
+        token_cache.clear()
+        client = APIClient()
+        other = get_user_model().objects.create_user('other@example.com', 'testpass123')
+        AuthToken.objects.issue(other)
+        oldest, key = AuthToken.objects.issue(self.user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+        self.assertEqual(client.get(ME_URL).status_code, status.HTTP_200_OK)
+
+        with self.settings(AUTH_TOKEN_MAX_PER_USER=2):
+            newer = [AuthToken.objects.issue(self.user)[0] for _ in range(2)]
+
+        self.assertEqual(set(AuthToken.objects.filter(user=self.user)), set(newer))
+        self.assertEqual(AuthToken.objects.filter(user=other).count(), 1)
+        self.assertEqual(client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test tokens are served from the cache until revoked"""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.token, self.key = AuthToken.objects.issue(self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def test_known_token_runs_no_queries(self):
+        """Test a token is looked up and hashed only once"""
+        with self.assertNumQueries(1):
+            self.auth.authenticate_credentials(self.key)
+
+        with self.assertNumQueries(0), patch.object(AuthToken, 'hash_key') as hash_key:
+            user, token = self.auth.authenticate_credentials(self.key)
+
+        hash_key.assert_not_called()
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.pk, self.token.pk)
+
+    def test_request_with_cached_token(self):
+        """Test the API accepts a cached token without looking it up again"""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+        client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_wrong_key_with_known_prefix_rejected(self):
+        """Test a key is checked in full, not only by its prefix, also when the prefix is cached"""
+        forged = self.key[:AuthToken.PREFIX_LENGTH] + '0' * (AuthToken.KEY_LENGTH - AuthToken.PREFIX_LENGTH)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(forged)
+
+        self.auth.authenticate_credentials(self.key)
+        with self.assertNumQueries(0), self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(forged)
+
+    def test_unknown_and_malformed_keys_rejected(self):
+        """Test keys that were never issued are rejected"""
+        for key in ('0' * AuthToken.KEY_LENGTH, 'short'):
+            with self.subTest(key=key), self.assertRaises(AuthenticationFailed):
+                self.auth.authenticate_credentials(key)
+
+    def test_rejected_key_leaves_nothing_cached(self):
+        """Test made up keys add no entries to the shared cache, only verified tokens get a generation"""
+        made_up = 'f' * AuthToken.KEY_LENGTH
+
+        with patch.object(cache, 'add', wraps=cache.add) as add, self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(made_up)
+
+        add.assert_not_called()
+        self.assertIsNone(get_token_generation(made_up[:AuthToken.PREFIX_LENGTH]))
+        self.assertIsNone(token_cache.get(made_up[:AuthToken.PREFIX_LENGTH]))
+        self.auth.authenticate_credentials(self.key)
+        self.assertIsNotNone(get_token_generation(self.token.prefix))
+
+    def test_expired_token_rejected(self):
+        """Test a token stops working when it expires, also while cached"""
+        self.auth.authenticate_credentials(self.key)
+
+        later = timezone.now() + datetime.timedelta(days=365)
+        with patch('django.utils.timezone.now', return_value=later), self.assertRaises(AuthenticationFailed) as ctx:
+            self.auth.authenticate_credentials(self.key)
+
+        self.assertEqual(str(ctx.exception.detail), 'Token has expired.')
+
+    def test_deleted_token_rejected(self):
+        """Test a deleted token stops working at once"""
+        self.auth.authenticate_credentials(self.key)
+
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+    def test_deactivated_user_rejected(self):
+        """Test the token of a deactivated user stops working at once"""
+        self.auth.authenticate_credentials(self.key)
+
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+    def test_password_change_refreshes_user(self):
+        """Test a password change drops the cached user"""
+        self.auth.authenticate_credentials(self.key)
+
+        self.user.set_password('newpass123')
+        self.user.save()
+        user, token = self.auth.authenticate_credentials(self.key)
+
+        self.assertTrue(user.check_password('newpass123'))
+
+    def test_deleted_user_rejected(self):
+        """Test deleting a user revokes its token through the cascade"""
+        self.auth.authenticate_credentials(self.key)
+
+        self.user.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+    def test_revoked_during_lookup_not_cached(self):
+        """Test a token revoked while it is being looked up is not cached as valid"""
+        verify = CachedTokenAuthentication.verify
+
+        def revoke_during_lookup(auth, key, prefix):
+            found = verify(auth, key, prefix)
+            AuthToken.objects.get(prefix=prefix).delete()
+            return found
+
+        with patch.object(CachedTokenAuthentication, 'verify', revoke_during_lookup):
+            self.auth.authenticate_credentials(self.key)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+    def test_read_before_commit_not_cached(self):
+        """Test a lookup that still saw the token before the revocation committed is invalidated"""
+        with self.captureOnCommitCallbacks(execute=True):
+            AuthToken.objects.get(pk=self.token.pk).delete()
+            # Another request reads the old row, the delete is not committed yet
+            with patch.object(CachedTokenAuthentication, 'verify', return_value=(self.user, self.token)):
+                self.auth.authenticate_credentials(self.key)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.key)
+
+    def test_requests_get_their_own_user(self):
+        """Test changes to request.user do not leak into the cache"""
+        user, token = self.auth.authenticate_credentials(self.key)
+        user.name = 'Changed'
+
+        user, token = self.auth.authenticate_credentials(self.key)
+
+        self.assertEqual(user.name, '')
+        self.assertIs(token.user, user)
@@ -0,0 +1,58 @@
+"""
+Tests for the in-process caches
+"""
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from core.cache import LRUCache
+
+
+class LRUCacheTests(SimpleTestCase):
+    """Test the LRU cache"""
+
+    def test_get_and_set(self):
+        """Test values can be stored and read back"""
+        cache = LRUCache()
+        cache.set('key', 'value')
+
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.get('missing', 'default'), 'default')
+
+    def test_evicts_least_recently_used(self):
+        """Test the oldest unused entry is evicted when the cache is full"""
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    @patch('core.cache.time.monotonic')
+    def test_entries_expire(self, patched_monotonic):
+        """Test entries are dropped after the ttl"""
+        patched_monotonic.return_value = 100
+        cache = LRUCache(ttl=10)
+        cache.set('key', 'value')
+
+        patched_monotonic.return_value = 109
+        self.assertEqual(cache.get('key'), 'value')
+        patched_monotonic.return_value = 110
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(len(cache), 0)
+
+    def test_delete_and_clear(self):
+        """Test removing entries"""
+        cache = LRUCache()
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        cache.delete('a')
+        self.assertIsNone(cache.get('a'))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
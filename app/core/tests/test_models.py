@@ -4,6 +4,7 @@ Test for models
 
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from decimal import Decimal
 
 from unittest.mock import patch
@@ -89,6 +90,31 @@ class TestModels(TestCase):
         ingredient = models.Ingredient.objects.create(user=user, name="Salt")
         self.assertEqual(str(ingredient), ingredient.name)
 
+    def test_tag_name_unique_per_user(self):
+        """Test a user cannot have two tags with the same name"""
+        user = create_user()
+        models.Tag.objects.create(user=user, name="Vegan")
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name="Vegan")
+
+    def test_ingredient_name_unique_per_user(self):
+        """Test a user cannot have two ingredients with the same name"""
+        user = create_user()
+        models.Ingredient.objects.create(user=user, name="Salt")
+        with self.assertRaises(IntegrityError):
+            models.Ingredient.objects.create(user=user, name="Salt")
+
+    def test_same_name_allowed_for_different_users(self):
+        """Test different users can use the same tag and ingredient names"""
+        user1 = create_user()
+        user2 = create_user(email='other@example.com')
+        for user in (user1, user2):
+            models.Tag.objects.create(user=user, name="Vegan")
+            models.Ingredient.objects.create(user=user, name="Salt")
+
+        self.assertEqual(models.Tag.objects.filter(name="Vegan").count(), 2)
+        self.assertEqual(models.Ingredient.objects.filter(name="Salt").count(), 2)
+
     @patch("core.models.uuid.uuid4")
     def test_recipe_file_name_uuid(self, mock_uuid):
         """Test generating image path"""
@@ -97,3 +123,92 @@ class TestModels(TestCase):
         file_path = models.recipe_image_file_path(None, 'example.jpg')
 
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+
+
+class RecipeCountTests(TestCase):
+    """Test the trigger maintained recipe counts of tags and ingredients"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.tag = models.Tag.objects.create(user=self.user, name="Vegan")
+        self.ingredient = models.Ingredient.objects.create(user=self.user, name="Salt")
+
+    def create_recipe(self):
+        return models.Recipe.objects.create(user=self.user, title="Soup", time_minutes=5, price=Decimal('1.00'))
+
+    def assertCounts(self, tag_count, ingredient_count):
+        self.tag.refresh_from_db()
+        self.ingredient.refresh_from_db()
+        self.assertEqual((self.tag.recipe_count, self.ingredient.recipe_count), (tag_count, ingredient_count))
+
+    def test_counts_follow_links(self):
+        """Test linking, unlinking and deleting recipes updates the counts"""
+        recipes = [self.create_recipe() for _ in range(3)]
+        for recipe in recipes:
+            recipe.tags.add(self.tag)
+        recipes[0].ingredients.add(self.ingredient)
+        self.assertCounts(3, 1)
+
+        recipes[0].tags.remove(self.tag)
+        recipes[1].tags.clear()
+        self.assertCounts(1, 1)
+
+        recipes[0].delete()
+        recipes[2].delete()
+        self.assertCounts(0, 0)
+
+    def test_counts_follow_bulk_inserts(self):
+        """Test through rows inserted in bulk are counted"""
+        recipes = [self.create_recipe() for _ in range(4)]
+        models.Recipe.tags.through.objects.bulk_create(
+            models.Recipe.tags.through(recipe_id=recipe.id, tag_id=self.tag.id) for recipe in recipes
+        )
+        self.assertCounts(4, 0)
+
+        self.tag.recipe_set.through.objects.filter(recipe_id__in=[r.id for r in recipes[:2]]).delete()
+        self.assertCounts(2, 0)
+
+
+class ImageRefCountTests(TestCase):
+    """Test the trigger maintained ref_count of content addressed images"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.blobs = [
+            models.ImageBlob.objects.create(digest=digest, path=models.image_blob_path(digest, 'jpg'))
+            for digest in ('a' * 64, 'b' * 64)
+        ]
+
+    def create_recipe(self, image=None):
+        return models.Recipe.objects.create(
+            user=self.user, title="Soup", time_minutes=5, price=Decimal('1.00'), image=image,
+        )
+
+    def assertRefCounts(self, *counts):
+        for blob in self.blobs:
+            blob.refresh_from_db()
+        self.assertEqual(tuple(blob.ref_count for blob in self.blobs), counts)
+
+    def test_image_blob_path(self):
+        """Test content addressed images are spread over directories by their hash"""
+        self.assertEqual(models.image_blob_path('ab12' + 'c' * 60, 'png'), f'uploads/recipe/ab/ab12{"c" * 60}.png')
+
+    def test_ref_counts_follow_recipes(self):
+        """Test creating, repointing and deleting recipes updates the counts"""
+        first, second = self.blobs
+        recipes = [self.create_recipe(first.path) for _ in range(3)]
+        self.create_recipe('uploads/recipe/legacy.jpg')
+        self.create_recipe()
+        self.assertRefCounts(3, 0)
+
+        recipes[0].image = second.path
+        recipes[0].save()
+        models.Recipe.objects.filter(pk=recipes[1].pk).update(title="Stew")
+        self.assertRefCounts(2, 1)
+
+        models.Recipe.objects.filter(image=first.path).update(image=second.path)
+        self.assertRefCounts(0, 3)
+
+        recipes[0].delete()
+        self.user.delete()
+        self.assertRefCounts(0, 0)
@@ -0,0 +1,95 @@
+"""
+Tests for the API renderers and parsers
+"""
+import io
+import json
+import uuid
+from decimal import Decimal
+
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import (SimpleTestCase, TestCase)
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.parsers import (MessagePackParser, ORJSONParser)
+from core.renderers import (MessagePackRenderer, ORJSONRenderer)
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RendererTests(SimpleTestCase):
+    """Test rendering and parsing"""
+
+    def test_json_renders_special_types(self):
+        """Test Decimal, UUID and lazy strings are rendered"""
+        image = uuid.uuid4()
+        data = {'price': Decimal('10.20'), 'image': image, 'detail': gettext_lazy('Not found.')}
+
+        rendered = json.loads(ORJSONRenderer().render(data))
+
+        self.assertEqual(rendered, {'price': '10.20', 'image': str(image), 'detail': 'Not found.'})
+
+    def test_json_indent(self):
+        """Test the indent media type parameter is honoured"""
+        rendered = ORJSONRenderer().render({'a': 1}, 'application/json; indent=4')
+
+        self.assertIn(b'\n', rendered)
+
+    def test_render_none(self):
+        """Test empty responses render to no bytes"""
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        self.assertEqual(MessagePackRenderer().render(None), b'')
+
+    def test_msgpack_round_trip(self):
+        """Test msgpack output parses back to the same data"""
+        data = {'id': 1, 'price': Decimal('5.50'), 'tags': [{'id': 2, 'name': 'Vegan'}]}
+
+        rendered = MessagePackRenderer().render(data)
+        parsed = MessagePackParser().parse(io.BytesIO(rendered))
+
+        self.assertEqual(parsed, {'id': 1, 'price': '5.50', 'tags': [{'id': 2, 'name': 'Vegan'}]})
+
+    def test_invalid_payloads(self):
+        """Test malformed bodies raise a parse error"""
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"a":'))
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(b'\xc1'))
+
+
+class ContentNegotiationTests(TestCase):
+    """Test picking the renderer and parser from the request headers"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(user=self.user, title='Curry', time_minutes=10, price=Decimal('5.50'))
+
+    def test_json_by_default(self):
+        """Test JSON is returned when the client accepts anything"""
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='*/*')
+
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertEqual(res.json()['results'][0]['price'], '5.50')
+
+    def test_msgpack_response(self):
+        """Test msgpack is returned when asked for"""
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(res.content)['results'][0]['title'], 'Curry')
+
+    def test_msgpack_request(self):
+        """Test a recipe can be created from a msgpack body"""
+        payload = {'title': 'Salad', 'time_minutes': 5, 'price': '2.50', 'tags': [{'name': 'Vegan'}]}
+
+        res = self.client.post(RECIPES_URL, msgpack.packb(payload), content_type='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Recipe.objects.filter(user=self.user, title='Salad', tags__name='Vegan').exists())
@@ -0,0 +1,181 @@
+"""
+Tests for request throttling
+"""
+import threading
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import (SimpleTestCase, TestCase)
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from core.throttling import (
+    CacheTokenBucketBackend, LocalTokenBucketBackend, TokenBucketBackend, get_backend, parse_rate,
+)
+
+TOKEN_URL = reverse('user:token')
+ME_URL = reverse('user:me')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketBackendTests(SimpleTestCase):
+    """Test the token bucket backends"""
+
+    def setUp(self):
+        cache.clear()
+
+    def backends(self):
+        for backend_class in (LocalTokenBucketBackend, CacheTokenBucketBackend):
+            backend = backend_class()
+            backend.clock = FakeClock()
+            yield backend
+
+    def test_burst_then_refill(self):
+        """Test a full bucket allows a burst of capacity requests, then one per interval"""
+        for backend in self.backends():
+            with self.subTest(backend=type(backend).__name__):
+                self.assertEqual([backend.consume('key', 3, 2) for i in range(3)], [0, 0, 0])
+                self.assertAlmostEqual(backend.consume('key', 3, 2), 2)
+
+                backend.clock.now += 1
+                self.assertAlmostEqual(backend.consume('key', 3, 2), 1)
+
+                backend.clock.now += 1
+                self.assertEqual(backend.consume('key', 3, 2), 0)
+                self.assertGreater(backend.consume('key', 3, 2), 0)
+
+    def test_idle_bucket_refills_to_capacity_only(self):
+        """Test a long idle bucket holds no more than its capacity"""
+        for backend in self.backends():
+            with self.subTest(backend=type(backend).__name__):
+                backend.consume('key', 2, 1)
+                backend.clock.now += 100
+
+                self.assertEqual([backend.consume('key', 2, 1) for i in range(2)], [0, 0])
+                self.assertGreater(backend.consume('key', 2, 1), 0)
+
+    def test_buckets_are_separate(self):
+        """Test each key has its own bucket"""
+        for backend in self.backends():
+            with self.subTest(backend=type(backend).__name__):
+                backend.consume('a', 1, 60)
+
+                self.assertGreater(backend.consume('a', 1, 60), 0)
+                self.assertEqual(backend.consume('b', 1, 60), 0)
+
+    def test_shared_buckets_hold_under_concurrency(self):
+        """Test workers racing on a shared bucket let no more than its capacity through"""
+        class SlowCacheBackend(CacheTokenBucketBackend):
+            def get(self, key):
+                full_at = super().get(key)
+                # Every racer reads before any of them writes, unless the lock serializes them
+                time.sleep(0.01)
+                return full_at
+
+        backend = SlowCacheBackend()
+        barrier = threading.Barrier(8)
+        results = []
+
+        def consume():
+            barrier.wait()
+            results.append(backend.consume('key', 3, 60))
+
+        threads = [threading.Thread(target=consume) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(0), 3)
+        self.assertFalse(cache.get('key:lock'))
+
+    def test_busy_shared_bucket_turns_request_away(self):
+        """Test a request that cannot lock its bucket in time is throttled, not let through"""
+        backend = CacheTokenBucketBackend()
+        backend.lock_wait = 0.01
+        cache.add('key:lock', 1)
+
+        self.assertEqual(backend.consume('key', 3, 20), 20)
+        self.assertIsNone(cache.get('key'))
+
+    def test_backends_implement_storage(self):
+        """Test a backend without get and set cannot be created"""
+        with self.assertRaises(TypeError):
+            TokenBucketBackend()
+
+    def test_parse_rate(self):
+        """Test rates are read like DRF's, by the first letter of the period"""
+        self.assertEqual(parse_rate('100/min'), (100, 60))
+        self.assertEqual(parse_rate('5/hour'), (5, 3600))
+        self.assertEqual(parse_rate('10/s'), (10, 1))
+
+
+class TokenBucketThrottleTests(TestCase):
+    """Test the API throttles per scope and client"""
+
+    def setUp(self):
+        get_backend(settings.THROTTLE_BACKEND).clear()
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+
+    def rates(self, **rates):
+        return patch.dict(api_settings.DEFAULT_THROTTLE_RATES, rates)
+
+    def test_login_throttled_per_ip(self):
+        """Test failed logins run out of budget and are told when to retry"""
+        payload = {'email': 'user@example.com', 'password': 'wrong'}
+        with self.rates(login='2/min'):
+            for i in range(2):
+                res = self.client.post(TOKEN_URL, payload)
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+            res = self.client.post(TOKEN_URL, payload)
+            self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(res['Retry-After'], '30')
+
+            res = self.client.post(TOKEN_URL, payload, REMOTE_ADDR='10.0.0.2')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reads_and_writes_have_separate_budgets(self):
+        """Test running out of reads leaves writes and other users alone"""
+        self.client.force_authenticate(self.user)
+        payload = {'title': 'Soup', 'time_minutes': 5, 'price': '2.00'}
+        with self.rates(read='1/min', write='1/min'):
+            self.assertEqual(self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get(RECIPES_URL).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(self.client.post(RECIPES_URL, payload).status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.client.post(RECIPES_URL, payload).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+            other = get_user_model().objects.create_user('other@example.com', 'testpass123')
+            self.client.force_authenticate(other)
+            self.assertEqual(self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK)
+
+    def test_upload_has_its_own_budget(self):
+        """Test image uploads count against the upload scope, not writes"""
+        self.client.force_authenticate(self.user)
+        url = reverse('recipe:recipe-upload-image', args=[1])
+        with self.rates(upload='1/min'):
+            self.assertEqual(self.client.post(url, {}).status_code, status.HTTP_404_NOT_FOUND)
+            self.assertEqual(self.client.post(url, {}).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            res = self.client.post(RECIPES_URL, {'title': 'Soup', 'time_minutes': 5, 'price': '2.00'})
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_scope_without_rate_not_throttled(self):
+        """Test scopes missing from DEFAULT_THROTTLE_RATES are not limited"""
+        self.client.force_authenticate(self.user)
+        with patch.dict(api_settings.DEFAULT_THROTTLE_RATES, clear=True):
+            for i in range(3):
+                self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
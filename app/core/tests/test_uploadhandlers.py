@@ -0,0 +1,109 @@
+"""
+Tests for the upload handlers
+"""
+import hashlib
+import io
+import os
+
+from PIL import Image
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ValidationError
+
+from core.uploadhandlers import (ImageUploadHandler, RequestEntityTooLarge)
+
+
+def encode(size, format='JPEG', **params):
+    """Return an encoded image of the given size"""
+    output = io.BytesIO()
+    Image.new('L', size).save(output, format, **params)
+    return output.getvalue()
+
+
+class ImageUploadHandlerTests(SimpleTestCase):
+    """Test image uploads are checked as they stream in"""
+
+    def handler(self, max_bytes=2 ** 20, max_pixels=10 ** 6):
+        handler = ImageUploadHandler(max_bytes=max_bytes, max_pixels=max_pixels)
+        handler.new_file('image', 'photo.jpg', 'image/jpeg', None)
+        self.addCleanup(handler.file.close)
+        return handler
+
+    def stream(self, handler, data):
+        """Feed data in chunks like MultiPartParser, return how many chunks were taken"""
+        chunks = [data[i:i + handler.chunk_size] for i in range(0, len(data), handler.chunk_size)]
+        for count, chunk in enumerate(chunks, 1):
+            handler.receive_data_chunk(chunk, (count - 1) * handler.chunk_size)
+        handler.file_complete(len(data))
+        return len(chunks)
+
+    def test_accepts_image(self):
+        """Test a valid image ends up in a temporary file, hashed on the way"""
+        for format in ('JPEG', 'PNG'):
+            with self.subTest(format=format):
+                data = encode((100, 80), format)
+                handler = self.handler()
+
+                self.stream(handler, data)
+
+                self.assertEqual(handler.file.sha256, hashlib.sha256(data).hexdigest())
+                self.assertEqual(handler.file.image_format, format)
+                with open(handler.file.temporary_file_path(), 'rb') as file:
+                    self.assertEqual(file.read(), data)
+
+    def test_header_split_across_chunks(self):
+        """Test a header arriving in pieces is read once complete"""
+        handler = self.handler()
+        data = encode((100, 80))
+
+        handler.receive_data_chunk(data[:10], 0)
+        self.assertFalse(handler.checked)
+        handler.receive_data_chunk(data[10:], 10)
+
+        self.assertTrue(handler.checked)
+
+    def test_rejects_other_content_on_first_chunk(self):
+        """Test files that are not JPEG or PNG are rejected without reading further"""
+        handler = self.handler()
+        path = handler.file.temporary_file_path()
+
+        for data in (b'GIF89a' + bytes(100), b'<?php echo 1; ?>' + bytes(100)):
+            with self.subTest(data=data[:8]), self.assertRaises(ValidationError):
+                handler.receive_data_chunk(data, 0)
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_rejects_too_many_pixels_from_header(self):
+        """Test an image with too many pixels is rejected from its header, before the rest is read"""
+        data = encode((2000, 1000), 'PNG', compress_level=0)
+        handler = self.handler(max_bytes=10 * 2 ** 20)
+        self.assertGreater(len(data), handler.chunk_size)
+
+        with self.assertRaises(ValidationError) as ctx:
+            handler.receive_data_chunk(data[:handler.chunk_size], 0)
+
+        self.assertEqual(ctx.exception.detail, {'image': ['Image larger than 1 megapixels.']})
+
+    def test_rejects_too_many_bytes_while_streaming(self):
+        """Test an upload stops as soon as it passes the size limit"""
+        handler = self.handler(max_bytes=100 * 2 ** 10)
+        data = encode((1000, 1000), 'PNG', compress_level=0)
+
+        with self.assertRaises(RequestEntityTooLarge):
+            self.stream(handler, data)
+
+        self.assertEqual(handler.received, 2 * handler.chunk_size)
+
+    def test_rejects_declared_length_up_front(self):
+        """Test a request declaring a body over the limit is rejected before any of it is read"""
+        handler = ImageUploadHandler(max_bytes=2 ** 20, max_pixels=10 ** 6)
+
+        with self.assertRaises(RequestEntityTooLarge):
+            handler.handle_raw_input(None, {}, 10 * 2 ** 20, b'boundary')
+
+    def test_rejects_truncated_header(self):
+        """Test a file ending before its header is complete is rejected"""
+        handler = self.handler()
+
+        with self.assertRaises(ValidationError):
+            self.stream(handler, encode((100, 80))[:20])
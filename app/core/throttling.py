@@ -0,0 +1,166 @@
+"""
+Request throttling.
+
+Every client gets a token bucket per scope: read, write, login and upload.
+Clients are authenticated users, or the client IP for anonymous requests. A
+bucket holds as many tokens as the scope's rate allows per period, refills
+at that rate and every request takes one token. A bucket is stored as the
+single timestamp at which it will be full again (GCRA), so a check is one
+read and one write.
+
+The default backend keeps the buckets in process, which limits each worker
+on its own. CacheTokenBucketBackend keeps them in the shared cache so the
+budget holds across workers. Each check holds a per-bucket lock taken with
+cache.add, which is atomic on every cache backend, so requests racing on
+the same bucket cannot each see it full.
+"""
+import abc
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from core.cache import LRUCache
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+class TokenBucketBackend(abc.ABC):
+    """Storage independent token bucket algorithm"""
+    clock = staticmethod(time.monotonic)
+
+    def consume(self, key, capacity, interval):
+        """Take a token from a bucket refilled every interval seconds.
+
+        Return 0 if the request may proceed, otherwise the seconds until a
+        token is available.
+        """
+        with self.lock(key) as locked:
+            if not locked:
+                # Too busy to tell, better to turn one request away than to let a burst through
+                return interval
+            now = self.clock()
+            full_at = max(self.get(key) or now, now) + interval
+            wait = full_at - capacity * interval - now
+            if wait > 0:
+                return wait
+            self.set(key, full_at, full_at - now)
+            return 0
+
+    @contextmanager
+    def lock(self, key):
+        """Hold the bucket during the read and write of consume, yield whether it could be held"""
+        yield True
+
+    @abc.abstractmethod
+    def get(self, key):
+        """Return the time the bucket is full again, or None for a full bucket"""
+
+    @abc.abstractmethod
+    def set(self, key, full_at, timeout):
+        """Store the time the bucket is full again, it may be dropped after timeout seconds"""
+
+
+class LocalTokenBucketBackend(TokenBucketBackend):
+    """Buckets in a bounded in-process LRU, each worker throttles on its own"""
+
+    def __init__(self):
+        self.mutex = threading.Lock()
+        # A bucket that is evicted or expires starts out full, as it would be after a day idle anyway
+        self.buckets = LRUCache(maxsize=settings.THROTTLE_LOCAL_MAX_KEYS, ttl=PERIODS['d'])
+
+    @contextmanager
+    def lock(self, key):
+        with self.mutex:
+            yield True
+
+    def get(self, key):
+        return self.buckets.get(key)
+
+    def set(self, key, full_at, timeout):
+        self.buckets.set(key, full_at)
+
+    def clear(self):
+        self.buckets.clear()
+
+
+class CacheTokenBucketBackend(TokenBucketBackend):
+    """Buckets in the shared cache, the budget holds across workers"""
+    # Timestamps are compared between processes
+    clock = staticmethod(time.time)
+    # Seconds a lock is held at most, should its holder die before releasing it
+    lock_timeout = 1
+    # Seconds to wait for a lock before turning the request away
+    lock_wait = 0.2
+
+    @contextmanager
+    def lock(self, key):
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + self.lock_wait
+        while not cache.add(lock_key, 1, timeout=self.lock_timeout):
+            if time.monotonic() >= deadline:
+                yield False
+                return
+            time.sleep(0.001)
+        try:
+            yield True
+        finally:
+            cache.delete(lock_key)
+
+    def get(self, key):
+        return cache.get(key)
+
+    def set(self, key, full_at, timeout):
+        cache.set(key, full_at, timeout=max(1, int(timeout) + 1))
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend(path):
+    """Return the shared instance of a backend class"""
+    return import_string(path)()
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    """Turn a rate such as '100/min' into (requests, seconds)"""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Token bucket throttle with a budget per scope, taken from DEFAULT_THROTTLE_RATES.
+
+    The scope is the view's throttle_scope (actions may set their own),
+    otherwise read for safe methods and write for everything else. Scopes
+    without a rate are not throttled.
+    """
+    wait_seconds = None
+
+    def get_scope(self, request, view):
+        return getattr(view, 'throttle_scope', None) or ('read' if request.method in SAFE_METHODS else 'write')
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return f'throttle:{self.get_scope(request, view)}:{ident}'
+
+    def allow_request(self, request, view):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.get_scope(request, view))
+        if rate is None:
+            return True
+        capacity, period = parse_rate(rate)
+        backend = get_backend(settings.THROTTLE_BACKEND)
+        self.wait_seconds = backend.consume(self.get_cache_key(request, view), capacity, period / capacity)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,119 @@
+"""
+Upload handlers.
+
+ImageUploadHandler checks an image upload while it streams in, instead of
+after Django has received all of it: the size as the bytes arrive, the
+format from the magic bytes of the first chunk and the pixel dimensions from
+the header, read with Pillow's lazy open. The upload goes to a temporary
+file, so memory stays flat however many large uploads run at once, and is
+hashed on the way for content addressed storage (recipe.images.store_image).
+"""
+import hashlib
+import io
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+from rest_framework import status
+from rest_framework.exceptions import (APIException, ValidationError)
+
+SIGNATURES = {
+    'JPEG': b'\xff\xd8\xff',
+    'PNG': b'\x89PNG\r\n\x1a\n',
+}
+
+
+class RequestEntityTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Request body too large.'
+    default_code = 'too_large'
+
+
+def sniff(header):
+    """Return the image format the header starts with, or None"""
+    return next((name for name, signature in SIGNATURES.items() if header.startswith(signature)), None)
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Stream image uploads to disk, rejecting them as soon as they are too large or not a usable image"""
+    chunk_size = 64 * 2 ** 10
+    # JPEG dimensions come after the EXIF block, which can hold a large embedded thumbnail
+    max_header_bytes = 256 * 2 ** 10
+
+    def __init__(self, request=None, *, max_bytes, max_pixels, field_name='image'):
+        super().__init__(request)
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.image_field = field_name
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Allow for the multipart boundaries and headers around the file
+        if content_length and content_length > self.max_bytes + self.chunk_size:
+            raise RequestEntityTooLarge({self.image_field: [self.too_large_message()]})
+
+    def new_file(self, field_name, *args, **kwargs):
+        if field_name != self.image_field:
+            raise ValidationError({field_name: ['Unexpected file.']})
+        super().new_file(field_name, *args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.checked = False
+        self.image_format = None
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.reject(RequestEntityTooLarge({self.image_field: [self.too_large_message()]}))
+        if not self.checked:
+            self.check_header(raw_data)
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if not self.checked:
+            # Too short to hold a whole header
+            self.reject(self.invalid())
+        file = super().file_complete(file_size)
+        file.sha256 = self.hasher.hexdigest()
+        file.image_format = self.image_format
+        return file
+
+    def check_header(self, raw_data):
+        """Check the format and dimensions once enough of the file has arrived to read its header"""
+        self.header += raw_data
+        image_format = sniff(self.header)
+        if image_format is None:
+            if len(self.header) >= max(map(len, SIGNATURES.values())):
+                self.reject(self.invalid())
+            return
+        try:
+            # Only parses the header, the pixels are never decoded here
+            with Image.open(io.BytesIO(self.header), formats=[image_format]) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            self.reject(self.too_many_pixels())
+        except OSError:
+            # Not all of the header is here yet
+            if len(self.header) >= self.max_header_bytes:
+                self.reject(self.invalid())
+            return
+        if width * height > self.max_pixels:
+            self.reject(self.too_many_pixels())
+        self.checked = True
+        self.image_format = image_format
+        self.header = b''
+
+    def reject(self, exc):
+        """Drop what was received so far and fail the upload"""
+        # Deletes the temporary file
+        self.file.close()
+        raise exc
+
+    def too_large_message(self):
+        return f'Image larger than {self.max_bytes // 2 ** 20} MB.'
+
+    def invalid(self):
+        return ValidationError({self.image_field: [f'Upload a valid image ({", ".join(SIGNATURES)}).']})
+
+    def too_many_pixels(self):
+        return ValidationError({self.image_field: [f'Image larger than {self.max_pixels // 10 ** 6} megapixels.']})
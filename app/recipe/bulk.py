@@ -0,0 +1,211 @@
+"""
+Bulk writes of recipes, tags and ingredients for the bulk endpoints.
+
+Every item is validated on its own so errors can be reported per item,
+then all valid items are written together: one insert or update per set
+of changed columns for the recipes, one name lookup per tag/ingredient
+model and one insert (and delete) per through table, however many items
+there are.
+
+Bulk writes do not send model signals, the caller bumps the user's data
+version itself.
+"""
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from core.models import (Recipe, Tag, Ingredient)
+
+RELATIONS = {'tags': Tag, 'ingredients': Ingredient}
+
+
+def check_items(items):
+    """Check a bulk request body is a list of at most RECIPE_BULK_MAX_ITEMS items"""
+    if not isinstance(items, list):
+        raise ValidationError({'non_field_errors': [
+            f'Expected a list of items but got type "{type(items).__name__}".']})
+    if len(items) > settings.RECIPE_BULK_MAX_ITEMS:
+        raise ValidationError({'non_field_errors': [
+            f'Ensure there are no more than {settings.RECIPE_BULK_MAX_ITEMS} items.']})
+    return items
+
+
+def is_id(value):
+    """Whether a bulk item is an id, JSON true and false parse to bools, which are ints too"""
+    return type(value) is int
+
+
+def find_ids(queryset, ids):
+    """Return {index: id} of the given ids in the queryset, and the errors of the other items by index"""
+    found = set(queryset.filter(id__in=[pk for pk in ids if is_id(pk)]).values_list('id', flat=True))
+    valid, errors = {}, []
+    for index, pk in enumerate(ids):
+        if not is_id(pk):
+            errors.append({'index': index, 'errors': {'id': ['A valid integer is required.']}})
+        elif pk not in found:
+            errors.append({'index': index, 'errors': {'id': ['Not found.']}})
+        else:
+            valid[index] = pk
+    return valid, errors
+
+
+def get_or_create_by_name(model, user, names):
+    """Return {name: object} for the user's objects with the given names, creating the missing ones in bulk"""
+    names = set(names)
+    if not names:
+        return {}
+    found = {obj.name: obj for obj in model.objects.filter(user=user, name__in=names)}
+    missing = names - found.keys()
+    if missing:
+        # ON CONFLICT DO NOTHING, then re-select, so a concurrent create of the same name is not an error
+        model.objects.bulk_create([model(user=user, name=name) for name in missing], ignore_conflicts=True)
+        found.update((obj.name, obj) for obj in model.objects.filter(user=user, name__in=missing))
+    return found
+
+
+def _get_instance(item, instances, seen):
+    """Return the recipe an update item points at with its id"""
+    pk = item.get('id') if isinstance(item, dict) else None
+    if pk is None:
+        raise ValidationError({'id': ['This field is required.']})
+    if not is_id(pk):
+        raise ValidationError({'id': ['A valid integer is required.']})
+    if pk not in instances:
+        raise ValidationError({'id': ['Not found.']})
+    if pk in seen:
+        raise ValidationError({'id': ['Duplicate id.']})
+    seen.add(pk)
+    return instances[pk]
+
+
+def validate(serializer, items, instances=None):
+    """Validate each item with serializer, collecting errors instead of stopping at the first one.
+
+    Returns ({index: (instance, validated data)}, [{'index': ..., 'errors': ...}]).
+    With instances ({id: recipe}) the items are updates, each naming one of
+    the instances by id.
+    """
+    valid, errors, seen = {}, [], set()
+    for index, item in enumerate(items):
+        try:
+            instance = _get_instance(item, instances, seen) if instances is not None else None
+            valid[index] = (instance, serializer.run_validation(item))
+        except ValidationError as exc:
+            errors.append({'index': index, 'errors': exc.detail})
+    return valid, errors
+
+
+def _resolve(user, items):
+    """Look up (or create) every tag and ingredient named in items, one pass per model"""
+    return {
+        relation: get_or_create_by_name(model, user, (
+            related['name'] for data in items for related in data.get(relation, ())
+        ))
+        for relation, model in RELATIONS.items()
+    }
+
+
+def _through(relation):
+    """Return the through model of a relation and the name of its column pointing at the tag/ingredient"""
+    descriptor = getattr(Recipe, relation)
+    return descriptor.through, f'{descriptor.field.m2m_reverse_field_name()}_id'
+
+
+def create_recipes(user, items):
+    """Create recipes with their tags and ingredients from validated data, returning the recipes"""
+    resolved = _resolve(user, items)
+    recipes = Recipe.objects.bulk_create([
+        Recipe(user=user, **{attr: value for attr, value in data.items() if attr not in RELATIONS})
+        for data in items
+    ])
+    for relation, by_name in resolved.items():
+        through, column = _through(relation)
+        through.objects.bulk_create([
+            through(recipe_id=recipe.pk, **{column: pk})
+            for recipe, data in zip(recipes, items)
+            for pk in {by_name[related['name']].pk for related in data.get(relation, ())}
+        ])
+    return recipes
+
+
+def update_recipes(user, pairs):
+    """Apply validated partial data to (recipe, data) pairs.
+
+    Tags and ingredients are replaced by the given ones when present,
+    writing only the through rows that change. Recipes are saved grouped
+    by the columns that changed, and every recipe that changed in any way
+    gets a new updated_at, like a single update does.
+    """
+    resolved = _resolve(user, [data for _, data in pairs])
+    touched = set()
+    for relation, by_name in resolved.items():
+        wanted = {
+            recipe.pk: {by_name[related['name']].pk for related in data[relation]}
+            for recipe, data in pairs if relation in data
+        }
+        if not wanted:
+            continue
+        through, column = _through(relation)
+        current, stale = {}, []
+        links = through.objects.filter(recipe_id__in=wanted).values_list('id', 'recipe_id', column)
+        for link_id, recipe_id, pk in links:
+            if pk in wanted[recipe_id]:
+                current.setdefault(recipe_id, set()).add(pk)
+            else:
+                stale.append(link_id)
+                touched.add(recipe_id)
+        if stale:
+            through.objects.filter(id__in=stale).delete()
+        new = [
+            through(recipe_id=recipe_id, **{column: pk})
+            for recipe_id, pks in wanted.items() for pk in pks - current.get(recipe_id, set())
+        ]
+        through.objects.bulk_create(new)
+        touched.update(link.recipe_id for link in new)
+
+    now = timezone.now()
+    groups = {}
+    for recipe, data in pairs:
+        changed = sorted(
+            attr for attr, value in data.items() if attr not in RELATIONS and getattr(recipe, attr) != value
+        )
+        for attr in changed:
+            setattr(recipe, attr, data[attr])
+        if changed or recipe.pk in touched:
+            # bulk_update does not run auto_now
+            recipe.updated_at = now
+            groups.setdefault(tuple(changed), []).append(recipe)
+    for changed, recipes in groups.items():
+        Recipe.objects.bulk_update(recipes, [*changed, 'updated_at'])
+    return [recipe for recipe, _ in pairs]
+
+
+def relation_for(model):
+    """Return the name of the Recipe relation to a tag or ingredient model"""
+    return next(relation for relation, related in RELATIONS.items() if related is model)
+
+
+def touch_linked_recipes(model, ids):
+    """Bump updated_at of the recipes linked to the given tags or ingredients"""
+    through, column = _through(relation_for(model))
+    linked = through.objects.filter(**{f'{column}__in': ids}).values('recipe_id')
+    Recipe.objects.filter(id__in=linked).update(updated_at=timezone.now())
+
+
+def merge(model, target, ids):
+    """Link the recipes of the ids' tags or ingredients to target instead, and delete them.
+
+    The links are rewired with one INSERT ... SELECT, skipping recipes
+    already linked to target, and the old links go with the items.
+    """
+    field = getattr(Recipe, relation_for(model)).field
+    table, recipe_column, column = field.m2m_db_table(), field.m2m_column_name(), field.m2m_reverse_name()
+    touch_linked_recipes(model, ids)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {table} ({recipe_column}, {column})
+            SELECT DISTINCT {recipe_column}, %s FROM {table} WHERE {column} = ANY(%s)
+            ON CONFLICT ({recipe_column}, {column}) DO NOTHING
+        """, [target.pk, list(ids)])
+    model.objects.filter(id__in=ids).delete()
@@ -0,0 +1,131 @@
+"""
+Per-user versioned caching of recipe API responses.
+
+Every user has a data version that is bumped on any write to their recipes,
+tags or ingredients. The version is part of every cache key, so a write
+invalidates all of the user's cached responses at once and stale entries
+simply expire.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class CacheStats:
+    """Hit and miss counters for this process"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+stats = CacheStats()
+
+
+def _version_key(user_id):
+    return f'recipe:data-version:{user_id}'
+
+
+def get_data_version(user_id):
+    """Return the user's current data version"""
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        # Start from the clock so a version that was evicted can never come back with an old value
+        cache.add(_version_key(user_id), time.time_ns(), timeout=None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def _incr_data_version(user_id):
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def bump_data_version(user_id):
+    """Invalidate every cached response of the user"""
+    _incr_data_version(user_id)
+    # Requests running before the commit may still cache the old rows under the new version
+    transaction.on_commit(lambda: _incr_data_version(user_id))
+
+
+def _request_digest(request, *extra):
+    params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+    return hashlib.md5(repr((request.get_host(), params) + extra).encode()).hexdigest()
+
+
+def response_cache_key(request, name):
+    """Build the cache key for a response from the user, endpoint and query params"""
+    return f'recipe:response:{request.user.pk}:{get_data_version(request.user.pk)}:{name}:{_request_digest(request)}'
+
+
+def filter_cache_key(user_id, name, signature):
+    """Build the cache key for a result that depends only on normalised filters, not on the raw query string"""
+    digest = hashlib.md5(repr(sorted(signature.items())).encode()).hexdigest()
+    return f'recipe:{name}:{user_id}:{get_data_version(user_id)}:{digest}'
+
+
+def response_etag(request):
+    """Weak ETag for a GET, derived from the user's data version without rendering the body"""
+    digest = _request_digest(request, request.path, request.accepted_media_type)
+    return f'W/"{get_data_version(request.user.pk)}-{digest[:16]}"'
+
+
+class ConditionalGetMixin:
+    """Answer GETs whose If-None-Match still matches with 304 before touching the database"""
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(super().list, request, *args, **kwargs)
+
+    def conditional_get(self, handler, request, *args, **kwargs):
+        """Return 304 if the client's ETag is current, otherwise call handler and tag its response"""
+        etag = response_etag(request)
+        client_etags = parse_etags(request.headers.get('If-None-Match', ''))
+        if '*' in client_etags or _strip_weak(etag) in {_strip_weak(tag) for tag in client_etags}:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+class CachedListMixin:
+    """Serve list responses from the cache until the user's data changes"""
+
+    def list(self, request, *args, **kwargs):
+        key = response_cache_key(request, self.basename)
+        data = cache.get(key)
+        stats.record(hit=data is not None)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
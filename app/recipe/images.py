@@ -0,0 +1,204 @@
+"""
+Renditions of recipe images.
+
+Uploads are stored as sent. After the upload commits, the configured
+renditions (RECIPE_IMAGE_RENDITIONS) are rendered in a pool of worker
+processes, saved next to the original and recorded on the recipe. Until then
+the API serves the original in place of every rendition.
+
+With RECIPE_IMAGE_CONTENT_ADDRESSED, uploads are stored under the hash of
+their content instead (see store_image), so identical uploads share one file
+and its renditions. Files no recipe uses any more are removed by the
+collect_images command.
+"""
+import logging
+import multiprocessing
+import os
+import tempfile
+import hashlib
+import threading
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor)
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import (close_old_connections, transaction)
+from django.utils import timezone
+
+from core.models import (ImageBlob, Recipe, image_blob_path)
+from recipe.cache import bump_data_version
+from recipe.renditions import render
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png'}
+
+_lock = threading.Lock()
+_pools = {}
+
+
+def _get_pool(name):
+    """Return the process pool rendering images, or the thread pool handing them to it"""
+    with _lock:
+        if name not in _pools:
+            workers = settings.RECIPE_IMAGE_WORKERS
+            if name == 'render':
+                # Spawned, forking a process with threads and open database connections is unsafe
+                _pools[name] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                _pools[name] = ThreadPoolExecutor(workers, thread_name_prefix='recipe-images')
+        return _pools[name]
+
+
+def image_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def rendition_path(source, name, spec):
+    """Return where a rendition of the source image is stored"""
+    root, _ = os.path.splitext(source)
+    return f'{root}-{name}.{EXTENSIONS[spec["format"]]}'
+
+
+def rendition_root(path):
+    """Return the root of the original a stored rendition was made from, or None if path is no rendition"""
+    for name, spec in settings.RECIPE_IMAGE_RENDITIONS.items():
+        suffix = f'-{name}.{EXTENSIONS[spec["format"]]}'
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return None
+
+
+def rendition_urls(image, renditions, request=None):
+    """Return {rendition: url} for a recipe image, the original standing in for missing renditions"""
+    if not image:
+        return None
+    storage = image_storage()
+    urls = {}
+    for name in settings.RECIPE_IMAGE_RENDITIONS:
+        url = storage.url(renditions.get(name) or str(image))
+        urls[name] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def start_rendering(source):
+    """Read a recipe image and render its renditions in a worker process, return the future"""
+    with image_storage().open(source) as original:
+        data = original.read()
+    return _get_pool('render').submit(render, data, settings.RECIPE_IMAGE_RENDITIONS)
+
+
+def write_rendition(storage, path, content):
+    """Write a rendition under exactly path, replacing any earlier rendering in one step.
+
+    Content addressed renditions are shared, other recipes keep serving the
+    file while it is written again.
+    """
+    try:
+        full_path = storage.path(path)
+    except NotImplementedError:
+        # Remote storages replace an object in place when they are configured to overwrite
+        return storage.save(path, ContentFile(content))
+    directory = os.path.dirname(full_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix='.rendition-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.chmod(temporary, storage.file_permissions_mode or 0o644)
+        os.replace(temporary, full_path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return path
+
+
+def save_renditions(recipe_id, user_id, source, rendered):
+    """Store rendered renditions and record them on the recipe.
+
+    Returns whether they were recorded, which they are not if the recipe's
+    image changed in the meantime.
+    """
+    storage = image_storage()
+    specs = settings.RECIPE_IMAGE_RENDITIONS
+    paths = {
+        name: write_rendition(storage, rendition_path(source, name, specs[name]), content)
+        for name, content in rendered.items()
+    }
+
+    with transaction.atomic():
+        # Only if the image is still the one we rendered, a newer upload schedules its own renditions
+        updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+            renditions=paths, updated_at=timezone.now(),
+        )
+        if updated:
+            # update() skips the signals that invalidate the cached responses
+            bump_data_version(user_id)
+    # Renditions of a content addressed image belong to every recipe using it, collect_images removes them with it
+    if not updated and not ImageBlob.objects.filter(path=source).exists():
+        for path in paths.values():
+            storage.delete(path)
+    return bool(updated)
+
+
+def generate_renditions(recipe_id, user_id, source):
+    """Render, store and record the renditions of a recipe's image"""
+    return save_renditions(recipe_id, user_id, source, start_rendering(source).result())
+
+
+def _generate_in_background(recipe_id, user_id, source):
+    try:
+        return generate_renditions(recipe_id, user_id, source)
+    except Exception:
+        logger.exception('Could not render the renditions of %s for recipe %s', source, recipe_id)
+        raise
+    finally:
+        # This thread's connection would otherwise stay open until the process exits
+        close_old_connections()
+
+
+def schedule_renditions(recipe):
+    """Render the renditions of the recipe's current image off the request thread, return the future"""
+    return _get_pool('dispatch').submit(_generate_in_background, recipe.pk, recipe.user_id, recipe.image.name)
+
+
+def file_digest(file):
+    """Return the sha256 of a file, unless the upload handler already computed it"""
+    if getattr(file, 'sha256', None):
+        return file.sha256
+    hasher = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def store_image(file):
+    """Store an uploaded image under the hash of its content and return its path.
+
+    Identical uploads share one file. The ImageBlob's ref_count counts the
+    recipes using it, collect_images removes it once there are none. Must be
+    called in the transaction pointing the recipe at the path: the blob stays
+    locked until then, so collect_images cannot remove it in between.
+    """
+    digest = file_digest(file)
+    image_format = getattr(file, 'image_format', None)
+    ext = EXTENSIONS[image_format] if image_format else os.path.splitext(file.name)[1][1:].lower()
+    blob, _ = ImageBlob.objects.select_for_update().get_or_create(
+        digest=digest, defaults={'path': image_blob_path(digest, ext)},
+    )
+    storage = image_storage()
+    # Also when the blob survived a failed collect_images that already removed the file
+    if not storage.exists(blob.path):
+        file.seek(0)
+        storage.save(blob.path, file)
+    return blob.path
+
+
+def shared_renditions(source):
+    """Return the renditions another recipe already has for the same stored image, or {}"""
+    renditions = (
+        Recipe.objects.filter(image=source, renditions__has_keys=list(settings.RECIPE_IMAGE_RENDITIONS))
+        .values_list('renditions', flat=True)
+        .first()
+    )
+    return renditions or {}
@@ -0,0 +1,116 @@
+"""
+Django command for removing recipe image files no recipe uses any more.
+
+Content addressed images (see recipe.images.store_image) are removed once
+their ImageBlob's ref_count drops to zero. Everything else under the upload
+directory, such as images replaced before content addressing or renditions
+of a removed original, is removed when neither a recipe nor a blob refers to
+it. Renditions recorded on a recipe are always kept. Files younger than
+--min-age are kept, uploads in progress have written theirs before the
+recipe refers to it.
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import (Exists, OuterRef)
+from django.utils import timezone
+
+from core.models import (ImageBlob, Recipe, RenditionPaths)
+from recipe import images
+
+# Where recipe_image_file_path and image_blob_path store the images
+UPLOAD_DIR = 'uploads/recipe'
+
+
+class Command(BaseCommand):
+    help = 'Remove recipe image files that no recipe uses any more.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Files checked and removed at a time')
+        parser.add_argument('--min-age', type=int, default=3600, help='Seconds before an unused file is removed')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+
+    def handle(self, *args, **options):
+        """Entry point for the management command."""
+        self.storage = images.image_storage()
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        self.cutoff = timezone.now() - timedelta(seconds=options['min_age'])
+
+        blobs = self.collect_blobs()
+        files = self.collect_files()
+
+        verb = 'Would remove' if self.dry_run else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {blobs} unused images and {files} other unused files.'))
+
+    def collect_blobs(self):
+        """Remove the blobs no recipe refers to, with their files, a batch per transaction"""
+        removed, last = 0, ''
+        while True:
+            with transaction.atomic():
+                # Skipping the blobs an upload has locked, it is about to refer to them
+                blobs = list(
+                    ImageBlob.objects.select_for_update(skip_locked=True)
+                    .filter(ref_count=0, digest__gt=last, created__lt=self.cutoff)
+                    # A drifted count must never cost an image that is still used
+                    .filter(~Exists(Recipe.objects.filter(image=OuterRef('path'))))
+                    .order_by('digest')[:self.batch_size]
+                )
+                if not blobs:
+                    return removed
+                last = blobs[-1].digest
+                if not self.dry_run:
+                    # While the rows are locked, an upload of the same image waits and then stores it again
+                    for blob in blobs:
+                        self.delete(blob.path)
+                        for name, spec in settings.RECIPE_IMAGE_RENDITIONS.items():
+                            self.delete(images.rendition_path(blob.path, name, spec))
+                    ImageBlob.objects.filter(pk__in=[blob.pk for blob in blobs]).delete()
+                removed += len(blobs)
+
+    def collect_files(self):
+        """Remove the files under the upload directory that neither a recipe nor a blob refers to"""
+        removed = 0
+        for directory, names in self.walk(UPLOAD_DIR):
+            paths = [os.path.join(directory, name) for name in names]
+            # A rendition is used as long as its original is, which is stored in the same directory
+            originals = {}
+            for path in paths:
+                if images.rendition_root(path) is None:
+                    originals.setdefault(os.path.splitext(path)[0], []).append(path)
+
+            for start in range(0, len(paths), self.batch_size):
+                batch = paths[start:start + self.batch_size]
+                owners = {
+                    path: [path] if root is None else originals.get(root, [])
+                    for path, root in ((path, images.rendition_root(path)) for path in batch)
+                }
+                candidates = {owner for owned in owners.values() for owner in owned}
+                used = set(Recipe.objects.filter(image__in=candidates).values_list('image', flat=True))
+                used.update(ImageBlob.objects.filter(path__in=candidates).values_list('path', flat=True))
+                # Renditions recorded on a recipe are used whatever their name, e.g. one saved under a suffixed name
+                rendered = Recipe.objects.annotate(paths=RenditionPaths()).filter(paths__has_any_keys=batch)
+                used.update(path for recorded in rendered.values_list('paths', flat=True) for path in recorded)
+                for path, owned in owners.items():
+                    unused = path not in used and used.isdisjoint(owned)
+                    if unused and self.storage.get_modified_time(path) < self.cutoff:
+                        if not self.dry_run:
+                            self.delete(path)
+                        removed += 1
+        return removed
+
+    def walk(self, directory):
+        """Yield (directory, file names) for the directory and every directory below it"""
+        if not self.storage.exists(directory):
+            return
+        directories, files = self.storage.listdir(directory)
+        yield directory, files
+        for name in directories:
+            yield from self.walk(os.path.join(directory, name))
+
+    def delete(self, path):
+        # Missing files are fine, a previous run may have been interrupted after removing them
+        self.storage.delete(path)
@@ -0,0 +1,60 @@
+"""
+Django command for rendering the renditions of existing recipe images.
+
+Uploads get their renditions in the background, this fills them in for
+images uploaded before renditions existed or after RECIPE_IMAGE_RENDITIONS
+changed.
+"""
+from concurrent.futures import (FIRST_COMPLETED, wait)
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from recipe import images
+
+
+class Command(BaseCommand):
+    help = 'Render the missing renditions of recipe images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Render every image again, not only the incomplete')
+
+    def handle(self, *args, **options):
+        """Entry point for the management command."""
+        recipes = Recipe.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            recipes = recipes.exclude(renditions__has_keys=list(settings.RECIPE_IMAGE_RENDITIONS))
+        rows = list(recipes.order_by('id').values_list('id', 'user_id', 'image'))
+
+        self.rendered = self.failed = 0
+        # Enough work queued to keep every worker busy while the results are saved
+        window = settings.RECIPE_IMAGE_WORKERS * 2
+        pending = {}
+        for row in rows:
+            try:
+                pending[images.start_rendering(row[2])] = row
+            except Exception as exc:
+                self.fail(row, exc)
+            if len(pending) >= window:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                self.save(pending, done)
+        self.save(pending, list(pending))
+
+        self.stdout.write(self.style.SUCCESS(f'Rendered {self.rendered} of {len(rows)} images.'))
+        if self.failed:
+            self.stdout.write(self.style.WARNING(f'{self.failed} images could not be rendered.'))
+
+    def save(self, pending, done):
+        for future in done:
+            row = pending.pop(future)
+            # Any image, e.g. a decompression bomb uploaded before the size checks, fails on its own
+            try:
+                if images.save_renditions(*row, future.result()):
+                    self.rendered += 1
+            except Exception as exc:
+                self.fail(row, exc)
+
+    def fail(self, row, exc):
+        self.failed += 1
+        self.stderr.write(f'Recipe {row[0]}: {exc}')
@@ -0,0 +1,272 @@
+"""
+Django command for importing recipes in bulk from a CSV or JSONL file.
+
+Every record names its user by email (or all of them belong to --user),
+and carries the recipe fields plus its tag and ingredient names. In CSV
+files tags and ingredients are '|' separated, in JSONL files they are
+lists of names or of {"name": ...} objects, so the output of the export
+endpoint can be imported as is.
+
+On Postgres the rows are streamed with COPY into temporary staging tables
+and merged into the real tables with a handful of set based statements.
+Other databases go through the ORM in batches.
+"""
+import csv
+import io
+import json
+import time
+from decimal import (Decimal, InvalidOperation)
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import (BaseCommand, CommandError)
+from django.db import (connection, transaction)
+
+from core.models import (Recipe, Tag, Ingredient)
+from recipe.bulk import create_recipes
+from recipe.cache import bump_data_version
+
+RELATIONS = {'tags': Tag, 'ingredients': Ingredient}
+MAX_LENGTH = 255
+MAX_PRICE = Decimal('1000')
+
+
+def read_records(path, fmt):
+    """Yield the records of the file as dicts"""
+    with open(path, newline='', encoding='utf-8') as file:
+        if fmt == 'csv':
+            for record in csv.DictReader(file):
+                yield record
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def clean_names(relation, values):
+    """Return the distinct, non blank names of a tag or ingredient list"""
+    if isinstance(values, str):
+        values = values.split('|')
+    elif not isinstance(values, (list, type(None))):
+        raise ValueError(f'{relation} must be a list of names')
+    names = {}
+    for value in values or ():
+        name = (value.get('name') if isinstance(value, dict) else value) or ''
+        name = str(name).strip()
+        if len(name) > MAX_LENGTH:
+            raise ValueError(f'name "{name[:20]}..." is longer than {MAX_LENGTH} characters')
+        if name:
+            names[name] = None
+    return list(names)
+
+
+def clean(record, user):
+    """Validate a record, returning the recipe fields and relation names or raising ValueError"""
+    if not isinstance(record, dict):
+        raise ValueError('expected an object')
+    email = user or record.get('user')
+    if not email:
+        raise ValueError('user is required')
+    title = str(record.get('title') or '').strip()
+    if not title or len(title) > MAX_LENGTH:
+        raise ValueError(f'title is required and at most {MAX_LENGTH} characters')
+    link = str(record.get('link') or '')
+    if len(link) > MAX_LENGTH:
+        raise ValueError(f'link is longer than {MAX_LENGTH} characters')
+    try:
+        time_minutes = Decimal(str(record.get('time_minutes')))
+        price = Decimal(str(record.get('price')))
+    except InvalidOperation:
+        raise ValueError('time_minutes and price must be numbers')
+    if not (time_minutes.is_finite() and price.is_finite()):
+        raise ValueError('time_minutes and price must be finite')
+    if time_minutes != time_minutes.to_integral_value():
+        raise ValueError('time_minutes must be a whole number')
+    # Out of range values would only fail the whole COPY
+    low, high = connection.ops.integer_field_range(Recipe._meta.get_field('time_minutes').get_internal_type())
+    if not low <= time_minutes <= high:
+        raise ValueError(f'time_minutes must be between {low} and {high}')
+    # Checked before rounding too, quantize fails on numbers beyond the decimal precision
+    if abs(price) >= MAX_PRICE or abs(price.quantize(Decimal('0.01'))) >= MAX_PRICE:
+        raise ValueError(f'price must be less than {MAX_PRICE}')
+    price = price.quantize(Decimal('0.01'))
+    time_minutes = int(time_minutes)
+    return {
+        'user': email,
+        'title': title,
+        'description': str(record.get('description') or ''),
+        'time_minutes': time_minutes,
+        'price': price,
+        'link': link,
+        **{relation: clean_names(relation, record.get(relation)) for relation in RELATIONS},
+    }
+
+
+class Command(BaseCommand):
+    help = 'Import recipes with their tags and ingredients from a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL (.jsonl, .ndjson) file to import')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='File format, guessed from the extension')
+        parser.add_argument('--user', help='Email of the user owning every imported recipe')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows sent to the database at once')
+        parser.add_argument(
+            '--method', choices=['auto', 'copy', 'orm'], default='auto',
+            help='Load with COPY (Postgres only) or through the ORM, auto picks COPY on Postgres',
+        )
+
+    def handle(self, *args, **options):
+        """Entry point for the management command."""
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        method = options['method']
+        if method == 'auto':
+            method = 'copy' if connection.vendor == 'postgresql' else 'orm'
+        if method == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError('--method copy needs a PostgreSQL database.')
+
+        self.invalid = 0
+        self.started = time.perf_counter()
+        try:
+            records = read_records(path, fmt)
+            batches = self.batches(records, options['user'], options['batch_size'])
+            with transaction.atomic():
+                imported, skipped, users = (self.copy if method == 'copy' else self.orm)(batches)
+                for user_id in users:
+                    bump_data_version(user_id)
+        except OSError as exc:
+            raise CommandError(f'Cannot read {path}: {exc}')
+        except (ValueError, csv.Error) as exc:
+            raise CommandError(f'Cannot parse {path}: {exc}')
+
+        elapsed = time.perf_counter() - self.started
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'Skipped {skipped} rows of unknown users.'))
+        if self.invalid:
+            self.stdout.write(self.style.WARNING(f'Skipped {self.invalid} invalid rows.'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes in {elapsed:.1f}s ({imported / max(elapsed, 1e-9):.0f} rows/s).'
+        ))
+
+    def batches(self, records, user, size):
+        """Yield lists of (line, cleaned record), reporting invalid rows as they are read"""
+        numbered = enumerate(records, start=1)
+        while True:
+            chunk = list(islice(numbered, size))
+            if not chunk:
+                return
+            batch = []
+            for line, record in chunk:
+                try:
+                    batch.append((line, clean(record, user)))
+                except ValueError as exc:
+                    self.invalid += 1
+                    if self.invalid <= 10:
+                        self.stderr.write(f'Row {line}: {exc}')
+            yield batch
+
+    def progress(self, rows):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f'{rows} rows loaded ({rows / max(elapsed, 1e-9):.0f} rows/s)')
+
+    def copy(self, batches):
+        """Load the batches into staging tables with COPY, then merge them set based"""
+        fields = {relation: getattr(Recipe, relation).field for relation in RELATIONS}
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                CREATE TEMPORARY TABLE import_recipe (
+                    line bigint, email text, title text, description text, time_minutes integer,
+                    price numeric(5, 2), link text, user_id bigint, recipe_id bigint
+                )
+            """)
+            for relation in RELATIONS:
+                cursor.execute(f'CREATE TEMPORARY TABLE import_{relation} (line bigint, name text)')
+
+            rows = 0
+            for batch in batches:
+                recipes, related = io.StringIO(), {relation: io.StringIO() for relation in RELATIONS}
+                writer = csv.writer(recipes)
+                for line, data in batch:
+                    writer.writerow([
+                        line, data['user'], data['title'], data['description'],
+                        data['time_minutes'], data['price'], data['link'],
+                    ])
+                    for relation, buffer in related.items():
+                        csv.writer(buffer).writerows((line, name) for name in data[relation])
+                recipes.seek(0)
+                cursor.copy_expert(
+                    'COPY import_recipe (line, email, title, description, time_minutes, price, link) '
+                    'FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (description, link))',
+                    recipes,
+                )
+                for relation, buffer in related.items():
+                    buffer.seek(0)
+                    cursor.copy_expert(f'COPY import_{relation} (line, name) FROM STDIN WITH (FORMAT csv)', buffer)
+                rows += len(batch)
+                self.progress(rows)
+
+            started = time.perf_counter()
+            cursor.execute(f"""
+                UPDATE import_recipe SET user_id = u.id
+                FROM {get_user_model()._meta.db_table} u WHERE u.email = import_recipe.email
+            """)
+            cursor.execute('DELETE FROM import_recipe WHERE user_id IS NULL')
+            skipped = cursor.rowcount
+            # Take the ids up front, so the links can be inserted by joining on the staging rows
+            cursor.execute(f"""
+                UPDATE import_recipe SET recipe_id = nextval(pg_get_serial_sequence('{Recipe._meta.db_table}', 'id'))
+            """)
+            cursor.execute('ANALYZE import_recipe, import_tags, import_ingredients')
+            for relation, model in RELATIONS.items():
+                cursor.execute(f"""
+                    INSERT INTO {model._meta.db_table} (user_id, name, updated_at, recipe_count)
+                    SELECT DISTINCT r.user_id, s.name, now(), 0
+                    FROM import_{relation} s JOIN import_recipe r USING (line)
+                    ON CONFLICT (user_id, name) DO NOTHING
+                """)
+                self.stdout.write(f'{cursor.rowcount} new {relation}')
+            # Fresh statistics for the names just added, or the planner joins every recipe to every name of its user
+            cursor.execute(f'ANALYZE {Tag._meta.db_table}, {Ingredient._meta.db_table}')
+            cursor.execute(f"""
+                INSERT INTO {Recipe._meta.db_table}
+                    (id, user_id, title, description, time_minutes, price, link, updated_at, renditions)
+                SELECT recipe_id, user_id, title, description, time_minutes, price, link, now(), '{{}}'::jsonb
+                FROM import_recipe ORDER BY line
+            """)
+            imported = cursor.rowcount
+            for relation, model in RELATIONS.items():
+                cursor.execute(f"""
+                    INSERT INTO {fields[relation].m2m_db_table()}
+                        ({fields[relation].m2m_column_name()}, {fields[relation].m2m_reverse_name()})
+                    SELECT DISTINCT r.recipe_id, t.id
+                    FROM import_{relation} s
+                    JOIN import_recipe r USING (line)
+                    JOIN {model._meta.db_table} t ON t.user_id = r.user_id AND t.name = s.name
+                    ORDER BY r.recipe_id, t.id
+                """)
+            cursor.execute('SELECT DISTINCT user_id FROM import_recipe')
+            users = [user_id for user_id, in cursor.fetchall()]
+            cursor.execute('DROP TABLE import_recipe, import_tags, import_ingredients')
+            self.stdout.write(f'Merged in {time.perf_counter() - started:.1f}s')
+        return imported, skipped, users
+
+    def orm(self, batches):
+        """Create the recipes of each batch with bulk inserts through the ORM"""
+        users, imported, skipped, rows = {}, 0, 0, 0
+        for batch in batches:
+            emails = {data['user'] for _, data in batch} - users.keys()
+            users.update((user.email, user) for user in get_user_model().objects.filter(email__in=emails))
+            by_user = {}
+            for _, data in batch:
+                if data['user'] not in users:
+                    skipped += 1
+                    continue
+                item = {attr: value for attr, value in data.items() if attr not in RELATIONS and attr != 'user'}
+                for relation in RELATIONS:
+                    item[relation] = [{'name': name} for name in data[relation]]
+                by_user.setdefault(users[data['user']], []).append(item)
+            for user, items in by_user.items():
+                imported += len(create_recipes(user, items))
+            rows += len(batch)
+            self.progress(rows)
+        return imported, skipped, [user.pk for user in users.values()]
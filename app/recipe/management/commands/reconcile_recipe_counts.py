@@ -0,0 +1,34 @@
+"""
+Django command for recomputing the recipe counts of tags and ingredients.
+
+The counts are kept up to date by triggers on the through tables, this
+repairs them if they ever drift, e.g. after a load with triggers disabled.
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import (Count, F, OuterRef, Subquery)
+from django.db.models.functions import Coalesce
+
+from core.models import Recipe
+from recipe.bulk import RELATIONS
+
+
+class Command(BaseCommand):
+    help = 'Recompute recipe_count of tags and ingredients from the recipe links.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many counts are off')
+
+    def handle(self, *args, **options):
+        """Entry point for the management command."""
+        for relation, model in RELATIONS.items():
+            field = getattr(Recipe, relation).field
+            column = field.m2m_reverse_name()
+            links = field.remote_field.through.objects.filter(**{column: OuterRef('pk')}).order_by()
+            actual = Coalesce(Subquery(links.values(column).annotate(n=Count('*')).values('n')), 0)
+            drifted = model.objects.annotate(actual=actual).exclude(recipe_count=F('actual'))
+            name = model._meta.verbose_name
+            if options['dry_run']:
+                self.stdout.write(f'{drifted.count()} {name} counts are off.')
+            else:
+                fixed = model.objects.filter(pk__in=drifted.values('pk')).update(recipe_count=actual)
+                self.stdout.write(self.style.SUCCESS(f'Fixed {fixed} {name} counts.'))
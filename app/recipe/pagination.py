@@ -0,0 +1,34 @@
+"""
+Pagination for the recipe API
+"""
+from django.conf import settings
+from rest_framework.pagination import (CursorPagination, LimitOffsetPagination)
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination for recipes, newest first"""
+    ordering = '-id'
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        """Use the view's ordering for this request when it has one, e.g. relevance for searches"""
+        get_pagination_ordering = getattr(view, 'get_pagination_ordering', None)
+        ordering = get_pagination_ordering() if get_pagination_ordering else None
+        return ordering or super().get_ordering(request, queryset, view)
+
+
+class RecipeAttrCursorPagination(RecipeCursorPagination):
+    """Keyset pagination for tags and ingredients, ordered by name"""
+    ordering = ('-name', 'id')
+
+
+class RecipeAttrCountPagination(LimitOffsetPagination):
+    """Offset pagination for tags and ingredients ordered by recipe count.
+
+    A cursor needs a unique position that does not move, counts tie and
+    change whenever recipes are linked.
+    """
+    default_limit = settings.API_PAGE_SIZE
+    max_limit = 100
@@ -0,0 +1,33 @@
+"""
+Rendering of recipe image renditions with Pillow.
+
+Runs in the image worker processes, so it must not import Django: the
+workers are spawned, not forked, and only import this module.
+"""
+import io
+
+from PIL import (Image, ImageOps)
+
+
+def render(data, specs):
+    """Render an encoded image at every spec and return {name: encoded bytes}.
+
+    A spec is {'size': longest side in pixels, 'format': Pillow format name,
+    'quality': encoder quality}. Images are never scaled up.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        # Let the JPEG decoder scale down while decoding, up to 8x less work for large photos
+        largest = max(spec['size'] for spec in specs.values())
+        original.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+
+        rendered = {}
+        # Largest first, so each rendition is resampled from the previous one rather than the original
+        for name, spec in sorted(specs.items(), key=lambda item: -item[1]['size']):
+            image.thumbnail((spec['size'], spec['size']), Image.LANCZOS)
+            mode = 'RGBA' if has_alpha and spec['format'] != 'JPEG' else 'RGB'
+            output = io.BytesIO()
+            image.convert(mode).save(output, spec['format'], quality=spec.get('quality', 80))
+            rendered[name] = output.getvalue()
+        return rendered
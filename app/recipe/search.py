@@ -0,0 +1,28 @@
+"""
+Database helpers for searching recipe attributes by name
+"""
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import (BooleanField, FloatField, Func)
+
+
+class TrigramWordSimilar(Func):
+    """`text <% name`: name has a word similar to text. Served by the pg_trgm GIN index."""
+    arg_joiner = ' <%% '
+    template = '(%(expressions)s)'
+    output_field = BooleanField()
+
+
+class TrigramWordSimilarity(Func):
+    """How closely text matches the best word in name, between 0 and 1"""
+    function = 'word_similarity'
+    output_field = FloatField()
+
+
+@lru_cache(maxsize=None)
+def has_trigram_support():
+    """Return whether the pg_trgm extension is installed in the database"""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
@@ -1,11 +1,16 @@
 """
 Serializers for recipe API
 """
+from django.conf import settings
+from django.db import transaction
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
 from core.models import (Recipe,
                          Tag,
                          Ingredient)
+from recipe.bulk import get_or_create_by_name
+from recipe.images import rendition_urls
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -26,36 +31,120 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeAttrUpdateMixin:
+    """Write only the given fields on update, recipe_count belongs to the database triggers and may be stale"""
+
+    def update(self, instance, validated_data):
+        for name, value in validated_data.items():
+            setattr(instance, name, value)
+        instance.save(update_fields=list(validated_data) + ['updated_at'])
+        return instance
+
+
+class TagDetailSerializer(RecipeAttrUpdateMixin, TagSerializer):
+    """Serializer for the tags endpoint, with the number of recipes using the tag"""
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ('recipe_count',)
+        read_only_fields = ('id', 'recipe_count')
+
+
+class IngredientDetailSerializer(RecipeAttrUpdateMixin, IngredientSerializer):
+    """Serializer for the ingredients endpoint, with the number of recipes using the ingredient"""
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ('recipe_count',)
+        read_only_fields = ('id', 'recipe_count')
+
+
+class RecipeAttrMergeSerializer(serializers.Serializer):
+    """Serializer for merging tags or ingredients into one"""
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    into = serializers.IntegerField()
+
+
+class FacetSerializer(serializers.Serializer):
+    """Serializer for the number of matching recipes with a tag or ingredient"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    count = serializers.IntegerField()
+
+
+class RecipeFacetsSerializer(serializers.Serializer):
+    """Serializer for the per tag and per ingredient counts of the filtered recipes"""
+    tags = FacetSerializer(many=True)
+    ingredients = FacetSerializer(many=True)
+
+
+def get_requested_fields(query_params, available):
+    """Return the field names kept by the ?fields= and ?omit= query params, in declaration order"""
+    fields = query_params.get('fields')
+    omit = query_params.get('omit')
+    wanted = {name.strip() for name in fields.split(',')} if fields else set(available)
+    if omit:
+        wanted -= {name.strip() for name in omit.split(',')}
+    return [name for name in available if name in wanted]
+
+
+class SparseFieldsMixin:
+    """Trim the fields of GET responses with ?fields= and ?omit="""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        keep = set(get_requested_fields(request.query_params, list(self.fields)))
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+
+# Columns read for fields that are not a column of their own
+FIELD_COLUMNS = {'images': ('image', 'renditions')}
+
+
+@extend_schema_field({
+    'type': 'object',
+    'nullable': True,
+    'properties': {name: {'type': 'string', 'format': 'uri'} for name in settings.RECIPE_IMAGE_RENDITIONS},
+})
+class ImageRenditionsField(serializers.Field):
+    """URL of every rendition of the recipe image, the original's while they are still being rendered"""
+
+    def __init__(self, **kwargs):
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return rendition_urls(recipe.image, recipe.renditions, self.context.get('request'))
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Recipe model"""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
+    images = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ['id', 'title', 'time_minutes', 'price', 'link', 'tags', "ingredients"]
+        fields = ['id', 'title', 'time_minutes', 'price', 'link', 'tags', "ingredients", 'images']
         read_only_fields = ('id',)
 
+    def _get_or_create(self, model, items):
+        """Return the user's objects for the given names, creating the missing ones in bulk"""
+        auth_user = self.context['request'].user
+        return list(get_or_create_by_name(model, auth_user, (item['name'] for item in items)).values())
+
     def _get_or_create_tags(self, tags, recipe):
         """Handling getting or creating tags as needed"""
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+        recipe.tags.add(*self._get_or_create(Tag, tags))
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handling getting or creating ingredients as needed"""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ing_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ing_obj)
+        recipe.ingredients.add(*self._get_or_create(Ingredient, ingredients))
 
+    @transaction.atomic
     def create(self, validated_data):
         """Create a new recipe"""
         tags = validated_data.pop('tags', [])
@@ -65,25 +154,79 @@ class RecipeSerializer(serializers.ModelSerializer):
         self._get_or_create_ingredients(ingredients, recipe)
         return recipe
 
+    def _set_related(self, manager, model, items):
+        """Link exactly the given items, writing only the through rows that change"""
+        wanted = {obj.pk: obj for obj in self._get_or_create(model, items)}
+        current = {obj.pk for obj in manager.all()}
+        manager.remove(*(current - wanted.keys()))
+        manager.add(*(wanted[pk] for pk in wanted.keys() - current))
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update a recipe"""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
 
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._set_related(instance.tags, Tag, tags)
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            self._set_related(instance.ingredients, Ingredient, ingredients)
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+        changed = [attr for attr, value in validated_data.items() if getattr(instance, attr) != value]
+        for attr in changed:
+            setattr(instance, attr, validated_data[attr])
 
-        instance.save()
+        if changed:
+            instance.save(update_fields=changed + ['updated_at'])
         return instance
 
 
+class RecipeListFastSerializer:
+    """Read only stand in for RecipeSerializer(many=True) on the recipe list.
+
+    Renders values() rows and one (recipe, id, name) query per relation
+    directly into dicts, skipping DRF's per-object field machinery. The
+    output must stay identical to RecipeSerializer, see the parity test.
+    """
+
+    def __init__(self, rows, many=True, fields=RecipeSerializer.Meta.fields, request=None):
+        self.rows = rows
+        self.fields = fields
+        self.request = request
+
+    @staticmethod
+    def _related(relation, recipe_ids):
+        """Return {recipe id: [{'id', 'name'}, ...]} for a relation, in id order"""
+        descriptor = getattr(Recipe, relation)
+        target = descriptor.field.m2m_reverse_field_name()
+        links = descriptor.through.objects.filter(recipe_id__in=recipe_ids).order_by(f'{target}_id').values_list(
+            'recipe_id', f'{target}_id', f'{target}__name')
+        related = {}
+        for recipe_id, item_id, name in links:
+            related.setdefault(recipe_id, []).append({'id': item_id, 'name': name})
+        return related
+
+    @property
+    def data(self):
+        recipe_ids = [row['id'] for row in self.rows]
+        related = {name: self._related(name, recipe_ids) for name in ('tags', 'ingredients') if name in self.fields}
+        data = []
+        for row in self.rows:
+            item = {}
+            for name in self.fields:
+                if name in related:
+                    item[name] = related[name].get(row['id'], [])
+                elif name == 'price':
+                    # Matches DecimalField(coerce_to_string=True) for values already at the column's scale
+                    item[name] = '{:f}'.format(row[name])
+                elif name == 'images':
+                    item[name] = rendition_urls(row['image'], row['renditions'], self.request)
+                else:
+                    item[name] = row[name]
+            data.append(item)
+        return data
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for Recipe detail view"""
 
@@ -91,12 +234,20 @@ class RecipeDetailSerializer(RecipeSerializer):
         fields = RecipeSerializer.Meta.fields + ['description', 'image']
 
 
+class RecipeBulkSerializer(RecipeSerializer):
+    """Serializer for the recipes of the bulk and export endpoints, everything but the image"""
+
+    class Meta(RecipeSerializer.Meta):
+        fields = [name for name in RecipeSerializer.Meta.fields if name != 'images'] + ['description']
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for Recipe image view"""
+    images = ImageRenditionsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'images')
         read_only_fields = ('id',)
         extra_kwargs = {'image': {'required': "True"}}
 
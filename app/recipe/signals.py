@@ -0,0 +1,33 @@
+"""
+Signal handlers for the recipe app
+"""
+from django.db.models.signals import (m2m_changed, post_delete, post_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import (Recipe, Tag, Ingredient)
+from recipe.cache import bump_data_version
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_on_write(sender, instance, **kwargs):
+    """Invalidate the owner's cached responses when a recipe, tag or ingredient changes"""
+    bump_data_version(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_on_link_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Touch the affected recipes and invalidate the owner's cached responses when recipe links change"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        Recipe.objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+    elif pk_set:
+        Recipe.objects.filter(pk__in=pk_set).update(updated_at=timezone.now())
+    bump_data_version(instance.user_id)
@@ -0,0 +1,327 @@
+"""
+Test the recipe management commands.
+"""
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+from io import (BytesIO, StringIO)
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import (TestCase, override_settings)
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import (ImageBlob, Recipe, Tag, Ingredient, image_blob_path)
+from recipe import images
+from recipe.cache import get_data_version
+
+CSV = """user,title,description,time_minutes,price,link,tags,ingredients
+user@example.com,Curry,Spicy,30,12.50,,Vegan|Dinner,Rice|Chili|Rice
+other@example.com,Salad,,5,3,https://example.com,Vegan,Lettuce
+user@example.com,Soup,,twenty,1,,,
+nobody@example.com,Stew,,60,9.99,,Dinner,
+"""
+
+
+class ImportRecipesTests(TestCase):
+    """Test the import_recipes command."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.other = get_user_model().objects.create_user('other@example.com', 'testpass123')
+        self.existing = Tag.objects.create(user=self.user, name='Vegan')
+
+    def write(self, content, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def call(self, *args, **options):
+        out = StringIO()
+        call_command('import_recipes', *args, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_import_csv(self):
+        """Test recipes are imported with deduplicated tags and ingredients, with COPY and with the ORM."""
+        path = self.write(CSV, '.csv')
+        for method in ('copy', 'orm'):
+            with self.subTest(method=method):
+                Recipe.objects.all().delete()
+                version = get_data_version(self.user.pk)
+
+                out = self.call(path, method=method)
+
+                self.assertIn('Imported 2 recipes', out)
+                self.assertIn('Skipped 1 rows of unknown users', out)
+                self.assertIn('Skipped 1 invalid rows', out)
+                curry = Recipe.objects.get(user=self.user)
+                self.assertEqual((curry.title, curry.description, curry.time_minutes), ('Curry', 'Spicy', 30))
+                self.assertEqual((curry.price, curry.link), (Decimal('12.50'), ''))
+                self.assertEqual(sorted(tag.name for tag in curry.tags.all()), ['Dinner', 'Vegan'])
+                self.assertIn(self.existing, curry.tags.all())
+                self.assertEqual(sorted(i.name for i in curry.ingredients.all()), ['Chili', 'Rice'])
+                salad = Recipe.objects.get(user=self.other)
+                self.assertEqual([tag.name for tag in salad.tags.all()], ['Vegan'])
+                self.assertEqual(Tag.objects.filter(name='Vegan').count(), 2)
+                self.assertEqual(Tag.objects.get(user=self.user, name='Vegan').recipe_count, 1)
+                self.assertEqual(Ingredient.objects.filter(name='Rice').count(), 1)
+                self.assertNotEqual(get_data_version(self.user.pk), version)
+
+    def test_import_export_round_trip(self):
+        """Test an NDJSON export can be imported for another user."""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=30, price=Decimal('12.50'), description='Spicy')
+        recipe.tags.add(self.existing)
+        recipe.ingredients.add(Ingredient.objects.create(user=self.user, name='Rice'))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        exported = b''.join(client.get(reverse('recipe:recipe-export')).streaming_content).decode()
+        path = self.write(exported, '.ndjson')
+
+        self.call(path, user='other@example.com')
+
+        imported = Recipe.objects.get(user=self.other)
+        self.assertEqual((imported.title, imported.description), ('Curry', 'Spicy'))
+        self.assertEqual([tag.name for tag in imported.tags.all()], ['Vegan'])
+        self.assertEqual(imported.tags.get().user, self.other)
+        self.assertEqual([i.name for i in imported.ingredients.all()], ['Rice'])
+        self.assertTrue(Recipe.objects.filter(user=self.other, search_vector='curry').exists())
+
+    def test_import_bad_file(self):
+        """Test unreadable and malformed files fail with a command error."""
+        with self.assertRaises(CommandError):
+            self.call('/does/not/exist.csv')
+        with self.assertRaises(CommandError):
+            self.call(self.write('{"title": \n', '.jsonl'))
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_import_jsonl_lists(self):
+        """Test JSONL records take tags and ingredients as lists of names."""
+        record = {'title': 'Toast', 'time_minutes': 2, 'price': '1.00', 'tags': ['Breakfast'], 'ingredients': []}
+        path = self.write(json.dumps(record) + '\n', '.jsonl')
+
+        self.call(path, user='user@example.com', batch_size=1)
+
+        self.assertEqual([tag.name for tag in Recipe.objects.get().tags.all()], ['Breakfast'])
+
+    def test_import_out_of_range_numbers(self):
+        """Test numbers the columns cannot hold are skipped per row, with COPY and with the ORM."""
+        base = {'title': 'Toast', 'time_minutes': 2, 'price': '1.00'}
+        records = [
+            {**base, 'price': 'NaN'},
+            {**base, 'price': 'Infinity'},
+            {**base, 'price': '1e40'},
+            {**base, 'price': '999.999'},
+            {**base, 'time_minutes': 2 ** 31},
+            {**base, 'time_minutes': 12.7},
+            {**base, 'time_minutes': True},
+            {**base, 'time_minutes': 12.0, 'price': 999.99},
+        ]
+        path = self.write(''.join(json.dumps(record) + '\n' for record in records), '.jsonl')
+        for method in ('copy', 'orm'):
+            with self.subTest(method=method):
+                Recipe.objects.all().delete()
+
+                out = self.call(path, user='user@example.com', method=method)
+
+                self.assertIn('Imported 1 recipes', out)
+                self.assertIn('Skipped 7 invalid rows', out)
+                recipe = Recipe.objects.get()
+                self.assertEqual((recipe.time_minutes, recipe.price), (12, Decimal('999.99')))
+
+    def test_import_scalar_relations(self):
+        """Test tags and ingredients that are not lists are skipped per row, with COPY and with the ORM."""
+        base = {'title': 'Toast', 'time_minutes': 2, 'price': '1.00'}
+        records = [
+            {**base, 'tags': 5},
+            {**base, 'ingredients': {'name': 'Bread'}},
+            {**base, 'tags': True},
+            {**base, 'tags': 'Breakfast|Quick', 'ingredients': None},
+        ]
+        path = self.write(''.join(json.dumps(record) + '\n' for record in records), '.jsonl')
+        for method in ('copy', 'orm'):
+            with self.subTest(method=method):
+                Recipe.objects.all().delete()
+
+                out = self.call(path, user='user@example.com', method=method)
+
+                self.assertIn('Imported 1 recipes', out)
+                self.assertIn('Skipped 3 invalid rows', out)
+                self.assertEqual(sorted(tag.name for tag in Recipe.objects.get().tags.all()), ['Breakfast', 'Quick'])
+
+
+class ReconcileRecipeCountsTests(TestCase):
+    """Test the reconcile_recipe_counts command."""
+
+    def test_reconcile(self):
+        """Test drifted counts are recomputed from the links."""
+        user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        tag = Tag.objects.create(user=user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=user, name='Salt')
+        Recipe.objects.create(user=user, title='Soup', time_minutes=5, price=Decimal('1.00')).tags.add(tag)
+        Tag.objects.filter(id=tag.id).update(recipe_count=7)
+        Ingredient.objects.filter(id=ingredient.id).update(recipe_count=2)
+
+        out = StringIO()
+        call_command('reconcile_recipe_counts', '--dry-run', stdout=out)
+        self.assertIn('1 tag counts are off', out.getvalue())
+        self.assertEqual(Tag.objects.get(id=tag.id).recipe_count, 7)
+
+        out = StringIO()
+        call_command('reconcile_recipe_counts', stdout=out)
+
+        self.assertIn('Fixed 1 tag counts', out.getvalue())
+        self.assertIn('Fixed 1 ingredient counts', out.getvalue())
+        self.assertEqual(Tag.objects.get(id=tag.id).recipe_count, 1)
+        self.assertEqual(Ingredient.objects.get(id=ingredient.id).recipe_count, 0)
+
+
+@override_settings(RECIPE_IMAGE_RENDITIONS={'thumbnail': {'size': 16, 'format': 'WEBP'}})
+class GenerateRenditionsTests(TestCase):
+    """Test the generate_renditions command."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+
+    def create_recipe(self, image=None, renditions=None):
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=Decimal('2.00'), renditions=renditions or {},
+        )
+        if image is not None:
+            recipe.image.save('soup.jpg', ContentFile(image))
+        return recipe
+
+    def decompression_bomb(self):
+        """Return a PNG declaring more pixels than Pillow opens, its pixel data is never read"""
+        side = int((Image.MAX_IMAGE_PIXELS * 2) ** 0.5) + 1
+        chunks = [(b'IHDR', struct.pack('>IIBBBBB', side, side, 1, 0, 0, 0, 0)), (b'IDAT', b''), (b'IEND', b'')]
+        return b'\x89PNG\r\n\x1a\n' + b''.join(
+            struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+            for kind, data in chunks
+        )
+
+    def test_backfill_missing_renditions(self):
+        """Test images without renditions get them, rendered ones and broken images are left alone."""
+        output = BytesIO()
+        Image.new('RGB', (64, 64)).save(output, 'JPEG')
+        missing = [self.create_recipe(output.getvalue()) for i in range(3)]
+        done = self.create_recipe(output.getvalue(), renditions={'thumbnail': 'done.webp'})
+        self.create_recipe(b'not an image')
+        bomb = self.create_recipe(self.decompression_bomb())
+        self.create_recipe()
+
+        out, err = StringIO(), StringIO()
+        call_command('generate_renditions', stdout=out, stderr=err)
+
+        self.assertIn('Rendered 3 of 5 images.', out.getvalue())
+        self.assertIn('2 images could not be rendered.', out.getvalue())
+        self.assertIn(f'Recipe {bomb.id}: Image size', err.getvalue())
+        for recipe in missing:
+            recipe.refresh_from_db()
+            self.assertEqual(list(recipe.renditions), ['thumbnail'])
+        done.refresh_from_db()
+        self.assertEqual(done.renditions, {'thumbnail': 'done.webp'})
+
+        call_command('generate_renditions', '--all', stdout=out, stderr=err)
+        done.refresh_from_db()
+        self.assertNotEqual(done.renditions, {'thumbnail': 'done.webp'})
+
+
+@override_settings(RECIPE_IMAGE_RENDITIONS={'thumbnail': {'size': 16, 'format': 'WEBP'}})
+class CollectImagesTests(TestCase):
+    """Test the collect_images command."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.storage = images.image_storage()
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+
+    def store(self, *paths, age=7200):
+        """Write files that are age seconds old"""
+        for path in paths:
+            self.storage.save(path, ContentFile(b'image'))
+            mtime = time.time() - age
+            os.utime(self.storage.path(path), (mtime, mtime))
+
+    def blob(self, digest, age=7200):
+        path = image_blob_path(digest, 'jpg')
+        self.store(path, path.replace('.jpg', '-thumbnail.webp'), age=age)
+        ImageBlob.objects.create(digest=digest, path=path)
+        ImageBlob.objects.filter(pk=digest).update(created=timezone.now() - timedelta(seconds=age))
+        return path
+
+    def use(self, path):
+        Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=Decimal('2.00'), image=path)
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command('collect_images', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def assertStored(self, paths, stored=True):
+        for path in paths:
+            self.assertEqual(self.storage.exists(path), stored, path)
+
+    def test_collect(self):
+        """Test unused blobs and files are removed with their renditions, used and recent ones are kept"""
+        used_blob = self.blob('a' * 64)
+        self.use(used_blob)
+        unused_blobs = [self.blob(digest) for digest in ('b' * 64, 'c' * 64, 'd' * 64)]
+        new_blob = self.blob('e' * 64, age=60)
+        self.store('uploads/recipe/used.jpg', 'uploads/recipe/used-thumbnail.webp')
+        self.use('uploads/recipe/used.jpg')
+        replaced = ['uploads/recipe/old.png', 'uploads/recipe/old-thumbnail.webp', 'uploads/recipe/stray-large.jpg']
+        self.store(*replaced)
+        self.store('uploads/recipe/uploading.jpg', age=60)
+        # Saved under a suffixed name, only its recipe knows it is a rendition
+        self.store('uploads/recipe/used-thumbnail_AbC12.webp')
+        Recipe.objects.filter(image='uploads/recipe/used.jpg').update(
+            renditions={'thumbnail': 'uploads/recipe/used-thumbnail_AbC12.webp'},
+        )
+
+        self.assertIn('Would remove 3 unused images and 3 other unused files.', self.collect('--dry-run'))
+        self.assertEqual(ImageBlob.objects.count(), 5)
+        self.assertStored(replaced)
+
+        self.assertIn('Removed 3 unused images and 3 other unused files.', self.collect())
+
+        self.assertEqual(set(ImageBlob.objects.values_list('digest', flat=True)), {'a' * 64, 'e' * 64})
+        self.assertStored(replaced + unused_blobs + [path.replace('.jpg', '-thumbnail.webp') for path in unused_blobs],
+                          stored=False)
+        self.assertStored([
+            used_blob, used_blob.replace('.jpg', '-thumbnail.webp'), new_blob,
+            'uploads/recipe/used.jpg', 'uploads/recipe/used-thumbnail.webp', 'uploads/recipe/uploading.jpg',
+            'uploads/recipe/used-thumbnail_AbC12.webp',
+        ])
+
+    def test_keeps_used_blob_with_drifted_count(self):
+        """Test a blob whose count drifted to zero is kept while a recipe still uses it"""
+        path = self.blob('a' * 64)
+        self.use(path)
+        ImageBlob.objects.update(ref_count=0)
+
+        self.assertIn('Removed 0 unused images and 0 other unused files.', self.collect())
+        self.assertStored([path])
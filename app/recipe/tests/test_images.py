@@ -0,0 +1,275 @@
+"""
+Tests for the recipe image renditions
+"""
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase, override_settings)
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (ImageBlob, Recipe)
+from recipe import images
+from recipe.cache import get_data_version
+from recipe.renditions import render
+
+RENDITIONS = {
+    'thumbnail': {'size': 16, 'format': 'WEBP'},
+    'large': {'size': 64, 'format': 'JPEG', 'quality': 90},
+}
+
+
+def encode(size, mode='RGB', format='JPEG'):
+    """Return an encoded image of the given size"""
+    output = io.BytesIO()
+    Image.new(mode, size).save(output, format)
+    return output.getvalue()
+
+
+class RenderTests(SimpleTestCase):
+    """Test rendering renditions with Pillow"""
+
+    def test_render_sizes_and_formats(self):
+        """Test every rendition fits its size, keeps the aspect ratio and has its format"""
+        rendered = render(encode((200, 100)), RENDITIONS)
+
+        with Image.open(io.BytesIO(rendered['thumbnail'])) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ('WEBP', (16, 8)))
+        with Image.open(io.BytesIO(rendered['large'])) as large:
+            self.assertEqual((large.format, large.size), ('JPEG', (64, 32)))
+
+    def test_render_never_scales_up(self):
+        """Test images smaller than a rendition keep their size"""
+        rendered = render(encode((10, 20)), RENDITIONS)
+
+        with Image.open(io.BytesIO(rendered['large'])) as large:
+            self.assertEqual(large.size, (10, 20))
+
+    def test_render_transparent_png(self):
+        """Test transparency is kept for WebP and flattened for JPEG"""
+        rendered = render(encode((32, 32), mode='RGBA', format='PNG'), RENDITIONS)
+
+        with Image.open(io.BytesIO(rendered['thumbnail'])) as thumbnail:
+            self.assertEqual(thumbnail.mode, 'RGBA')
+        with Image.open(io.BytesIO(rendered['large'])) as large:
+            self.assertEqual(large.mode, 'RGB')
+
+
+@override_settings(RECIPE_IMAGE_RENDITIONS=RENDITIONS)
+class RecipeRenditionsTests(TestCase):
+    """Test storing renditions and serving their URLs"""
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=Decimal('2.00'))
+        self.recipe.image.save('soup.jpg', ContentFile(encode((200, 100))))
+
+    def test_generate_renditions(self):
+        """Test renditions are stored next to the original and recorded on the recipe"""
+        version = get_data_version(self.user.pk)
+
+        self.assertTrue(images.generate_renditions(self.recipe.pk, self.user.pk, self.recipe.image.name))
+
+        self.recipe.refresh_from_db()
+        storage = images.image_storage()
+        self.assertEqual(set(self.recipe.renditions), {'thumbnail', 'large'})
+        self.assertTrue(self.recipe.renditions['thumbnail'].endswith('-thumbnail.webp'))
+        self.assertTrue(all(storage.exists(path) for path in self.recipe.renditions.values()))
+        self.assertNotEqual(get_data_version(self.user.pk), version)
+
+    def test_replaced_image_discards_renditions(self):
+        """Test renditions of an image replaced while rendering are thrown away"""
+        source = self.recipe.image.name
+        self.recipe.image.save('other.jpg', ContentFile(encode((10, 10))))
+
+        self.assertFalse(images.generate_renditions(self.recipe.pk, self.user.pk, source))
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.renditions, {})
+        self.assertFalse(images.image_storage().exists(images.rendition_path(source, 'large', RENDITIONS['large'])))
+
+    def test_urls_fall_back_to_original(self):
+        """Test the list and detail serve the original until the renditions exist, then the renditions"""
+        detail_url = reverse('recipe:recipe-detail', args=[self.recipe.pk])
+        original = f'http://testserver{self.recipe.image.url}'
+
+        res = self.client.get(reverse('recipe:recipe-list'))
+        self.assertEqual(res.data['results'][0]['images'], {'thumbnail': original, 'large': original})
+
+        images.generate_renditions(self.recipe.pk, self.user.pk, self.recipe.image.name)
+        self.recipe.refresh_from_db()
+
+        res = self.client.get(detail_url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['images'], {
+            name: f'http://testserver{images.image_storage().url(path)}'
+            for name, path in self.recipe.renditions.items()
+        })
+        res = self.client.get(reverse('recipe:recipe-list'))
+        self.assertEqual(res.data['results'][0]['images'], self.client.get(detail_url).data['images'])
+
+    def test_no_image(self):
+        """Test recipes without an image have no renditions"""
+        Recipe.objects.filter(pk=self.recipe.pk).update(image=None)
+
+        res = self.client.get(reverse('recipe:recipe-list'))
+
+        self.assertIsNone(res.data['results'][0]['images'])
+
+    def test_upload_schedules_renditions_after_commit(self):
+        """Test uploading an image clears the old renditions and renders new ones once committed"""
+        Recipe.objects.filter(pk=self.recipe.pk).update(renditions={'large': 'old.jpg'})
+        url = reverse('recipe:recipe-upload-image', args=[self.recipe.pk])
+
+        with patch.object(images, 'schedule_renditions') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(url, {'image': ContentFile(encode((20, 20)), name='new.jpg')})
+                schedule.assert_not_called()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.renditions, {})
+        self.assertEqual(schedule.call_args.args[0].image.name, self.recipe.image.name)
+
+
+@override_settings(RECIPE_IMAGE_RENDITIONS=RENDITIONS)
+class BackgroundRenditionsTests(TransactionTestCase):
+    """Test renditions are rendered off the request thread"""
+
+    def test_schedule_renditions(self):
+        """Test a scheduled recipe gets its renditions from the background workers"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+            recipe = Recipe.objects.create(user=user, title='Soup', time_minutes=5, price=Decimal('2.00'))
+            recipe.image.save('soup.jpg', ContentFile(encode((200, 100))))
+
+            self.assertTrue(images.schedule_renditions(recipe).result(timeout=60))
+
+        recipe.refresh_from_db()
+        self.assertEqual(set(recipe.renditions), {'thumbnail', 'large'})
+
+
+@override_settings(RECIPE_IMAGE_RENDITIONS=RENDITIONS, RECIPE_IMAGE_CONTENT_ADDRESSED=True)
+class ContentAddressedImagesTests(TestCase):
+    """Test identical uploads share one stored file"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = get_user_model().objects.create_user('user@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipes = [
+            Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=Decimal('2.00'))
+            for _ in range(3)
+        ]
+
+    def upload(self, recipe, data, name='photo.jpg'):
+        url = reverse('recipe:recipe-upload-image', args=[recipe.pk])
+        with patch.object(images, 'schedule_renditions') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(url, {'image': ContentFile(data, name=name)})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        return schedule
+
+    def test_identical_uploads_share_file(self):
+        """Test identical uploads are stored once under their hash and counted, different ones apart"""
+        data = encode((20, 20))
+        digest = hashlib.sha256(data).hexdigest()
+        for recipe, name in zip(self.recipes[:2], ('a.jpg', 'b.JPEG')):
+            self.upload(recipe, data, name)
+        self.upload(self.recipes[2], encode((10, 10), format='PNG'), 'c.png')
+
+        first, second, third = self.recipes
+        self.assertEqual(first.image.name, f'uploads/recipe/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertTrue(third.image.name.endswith('.png'))
+        self.assertEqual(ImageBlob.objects.get(digest=digest).ref_count, 2)
+        with images.image_storage().open(first.image.name) as stored:
+            self.assertEqual(stored.read(), data)
+
+        self.upload(second, encode((30, 30)))
+        self.assertEqual(ImageBlob.objects.get(digest=digest).ref_count, 1)
+
+    def test_identical_upload_shares_renditions(self):
+        """Test an upload of an image already rendered for another recipe reuses its renditions"""
+        data = encode((20, 20))
+        self.assertTrue(self.upload(self.recipes[0], data).called)
+        images.generate_renditions(self.recipes[0].pk, self.user.pk, self.recipes[0].image.name)
+        self.recipes[0].refresh_from_db()
+
+        schedule = self.upload(self.recipes[1], data)
+
+        schedule.assert_not_called()
+        self.assertEqual(self.recipes[1].renditions, self.recipes[0].renditions)
+
+    def test_replaced_image_keeps_shared_renditions(self):
+        """Test renditions discarded for a recipe whose image changed stay for the recipes sharing them"""
+        data = encode((20, 20))
+        for recipe in self.recipes[:2]:
+            self.upload(recipe, data)
+        source = self.recipes[0].image.name
+        images.generate_renditions(self.recipes[0].pk, self.user.pk, source)
+        self.recipes[0].refresh_from_db()
+        self.upload(self.recipes[1], encode((30, 30)))
+
+        self.assertFalse(images.generate_renditions(self.recipes[1].pk, self.user.pk, source))
+
+        storage = images.image_storage()
+        self.assertTrue(all(storage.exists(path) for path in self.recipes[0].renditions.values()))
+
+    def test_render_again_replaces_files_in_place(self):
+        """Test rendering an image again rewrites its renditions under the same names"""
+        self.upload(self.recipes[0], encode((200, 100)))
+        source = self.recipes[0].image.name
+        images.generate_renditions(self.recipes[0].pk, self.user.pk, source)
+        self.recipes[0].refresh_from_db()
+        first = self.recipes[0].renditions
+
+        with override_settings(RECIPE_IMAGE_RENDITIONS={**RENDITIONS, 'large': {'size': 32, 'format': 'JPEG'}}):
+            images.generate_renditions(self.recipes[0].pk, self.user.pk, source)
+
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].renditions, first)
+        storage = images.image_storage()
+        _, files = storage.listdir(os.path.dirname(source))
+        self.assertEqual(len(files), 1 + len(RENDITIONS))
+        with Image.open(storage.path(first['large'])) as large:
+            self.assertEqual(large.size, (32, 16))
+
+    def test_store_image_restores_missing_file(self):
+        """Test a blob whose file went missing gets it written again"""
+        data = encode((20, 20))
+        self.upload(self.recipes[0], data)
+        images.image_storage().delete(self.recipes[0].image.name)
+
+        self.upload(self.recipes[1], data)
+
+        self.assertTrue(images.image_storage().exists(self.recipes[1].image.name))
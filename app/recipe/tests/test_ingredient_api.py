@@ -10,10 +10,12 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from core.models import (Ingredient, Recipe)
-from recipe.serializers import IngredientSerializer
+from core.models import (Ingredient, Recipe, Tag)
+from recipe.serializers import IngredientDetailSerializer
+from recipe.views import autocomplete_cache
 
 INGREDIENT_URL = reverse('recipe:ingredient-list')
+AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
 
 
 def detail_url(ingredient_id):
@@ -45,6 +47,7 @@ class PrivateIngredientApiTests(TestCase):
         self.client = APIClient()
         self.user = create_user()
         self.client.force_authenticate(self.user)
+        autocomplete_cache.clear()
 
     def test_retrieve_ingredient_list(self):
         """Test retrieving a list of ingredients."""
@@ -54,10 +57,10 @@ class PrivateIngredientApiTests(TestCase):
         res = self.client.get(INGREDIENT_URL)
 
         ingredients = Ingredient.objects.all().order_by('-name')
-        serializer = IngredientSerializer(ingredients, many=True)
+        serializer = IngredientDetailSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredient_limited_to_user(self):
         """Test retrieving ingredients for authenticated user."""
@@ -66,9 +69,9 @@ class PrivateIngredientApiTests(TestCase):
         ingredient = Ingredient.objects.create(user=self.user, name='Salt')
         res = self.client.get(INGREDIENT_URL)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
-        self.assertEqual(res.data[0]['id'], ingredient.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
+        self.assertEqual(res.data['results'][0]['id'], ingredient.id)
 
     def test_update_ingredient_successful(self):
         """Test updating an ingredient is successful."""
@@ -104,13 +107,13 @@ class PrivateIngredientApiTests(TestCase):
 
         res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
 
-        s1 = IngredientSerializer(ingredient1)
-        s2 = IngredientSerializer(ingredient2)
-        s3 = IngredientSerializer(ingredient3)
+        s1 = IngredientDetailSerializer(Ingredient.objects.get(id=ingredient1.id))
+        s2 = IngredientDetailSerializer(Ingredient.objects.get(id=ingredient2.id))
+        s3 = IngredientDetailSerializer(Ingredient.objects.get(id=ingredient3.id))
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filtered_ingredients_unique(self):
         """Test filtering ingredients assigned to recipes list is unique."""
@@ -125,4 +128,37 @@ class PrivateIngredientApiTests(TestCase):
 
         res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_autocomplete_ingredients(self):
+        """Test autocomplete returns the user's ingredients starting with the prefix."""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        Ingredient.objects.create(user=self.user, name='Pepper')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'sa'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{'id': salt.id, 'name': 'Salt'}])
+
+    def test_autocomplete_cache_separates_models(self):
+        """Test ingredient completions are not served from cached tag results."""
+        Tag.objects.create(user=self.user, name='Salty')
+        self.client.get(reverse('recipe:tag-autocomplete'), {'q': 'sa'})
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'sa'})
+
+        self.assertEqual(res.data, [])
+
+    def test_merge_ingredients(self):
+        """Test merging ingredients links their recipes to the target instead."""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        sea_salt = Ingredient.objects.create(user=self.user, name='Sea salt')
+        recipe = Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=Decimal('2.00'))
+        recipe.ingredients.add(salt, sea_salt)
+
+        payload = {'ids': [sea_salt.id], 'into': salt.id}
+        res = self.client.post(reverse('recipe:ingredient-merge'), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(recipe.ingredients.all()), [salt])
+        self.assertFalse(Ingredient.objects.filter(id=sea_salt.id).exists())
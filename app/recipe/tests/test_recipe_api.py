@@ -1,21 +1,32 @@
 """Test for recipe API."""
+import json
 import tempfile
 import os
+from io import BytesIO
 
 from PIL import Image
 from decimal import Decimal
 
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import (connection, transaction)
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
 from core.models import (Recipe, Tag, Ingredient)
-from recipe.serializers import (RecipeSerializer, RecipeDetailSerializer, )
+from recipe.cache import (get_data_version, stats as response_cache_stats)
+from recipe.pagination import RecipeCursorPagination
+from recipe.serializers import (RecipeSerializer, RecipeDetailSerializer, RecipeBulkSerializer, )
 
 RECIPES_URL = reverse('recipe:recipe-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+BULK_URL = reverse('recipe:recipe-bulk')
+FACETS_URL = reverse('recipe:recipe-facets')
 
 
 def detail_url(recipe_id):
@@ -47,6 +58,14 @@ def create_user(**params):
     return get_user_model().objects.create_user(**params)
 
 
+def recipes_in_id_order(user):
+    """Return the user's recipes with tags and ingredients in the id order the API renders them in"""
+    return Recipe.objects.filter(user=user).order_by('id').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.order_by('id')),
+        Prefetch('ingredients', queryset=Ingredient.objects.order_by('id')),
+    )
+
+
 class PublicRecipeApiTests(TestCase):
     """Test unauthenticated recipe API access."""
 
@@ -75,7 +94,7 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipes_limited_to_user(self):
         """Test retrieving recipes for user."""
@@ -87,7 +106,7 @@ class PrivateRecipeApiTests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_get_recipe_detail(self):
         """Test retrieving recipe detail."""
@@ -400,9 +419,9 @@ class PrivateRecipeApiTests(TestCase):
         s2 = RecipeSerializer(recipe2)
         s3 = RecipeSerializer(recipe3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filter_by_ingredients(self):
         """Test filtering recipes by ingredients."""
@@ -421,9 +440,644 @@ class PrivateRecipeApiTests(TestCase):
         s2 = RecipeSerializer(recipe2)
         s3 = RecipeSerializer(recipe3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    def test_filter_by_tags_match_all(self):
+        """Test filtering recipes that have every requested tag."""
+        recipe1 = create_recipe(user=self.user, title="Vegan curry")
+        recipe2 = create_recipe(user=self.user, title="Vegan salad")
+        recipe3 = create_recipe(user=self.user, title="Spicy chicken")
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Spicy")
+        recipe1.tags.add(tag1, tag2)
+        recipe2.tags.add(tag1)
+        recipe3.tags.add(tag2)
+
+        params = {"tags": f"{tag1.id},{tag2.id}", "match": "all"}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data['results']], [recipe1.id])
+
+    def test_filter_by_ingredients_match_all(self):
+        """Test filtering recipes that have every requested ingredient."""
+        recipe1 = create_recipe(user=self.user, title="Salted pepper steak")
+        recipe2 = create_recipe(user=self.user, title="Salted fish")
+        ingredient1 = Ingredient.objects.create(user=self.user, name="Salt")
+        ingredient2 = Ingredient.objects.create(user=self.user, name="Pepper")
+        recipe1.ingredients.add(ingredient1, ingredient2)
+        recipe2.ingredients.add(ingredient1)
+
+        params = {"ingredients": f"{ingredient1.id},{ingredient2.id},{ingredient2.id}", "match": "all"}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([item['id'] for item in res.data['results']], [recipe1.id])
+
+    def test_filter_by_tags_and_ingredients(self):
+        """Test combining tag and ingredient filters."""
+        recipe1 = create_recipe(user=self.user, title="Vegan curry")
+        recipe2 = create_recipe(user=self.user, title="Vegan salad")
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        ingredient = Ingredient.objects.create(user=self.user, name="Curry paste")
+        recipe1.tags.add(tag)
+        recipe1.ingredients.add(ingredient)
+        recipe2.tags.add(tag)
+
+        params = {"tags": f"{tag.id}", "ingredients": f"{ingredient.id}"}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([item['id'] for item in res.data['results']], [recipe1.id])
+
+    def test_filter_results_unique_without_distinct(self):
+        """Test a recipe matching several tags is returned once, without DISTINCT."""
+        recipe = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Spicy")
+        recipe.tags.add(tag1, tag2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {"tags": f"{tag1.id},{tag2.id}"})
+
+        self.assertEqual([item['id'] for item in res.data['results']], [recipe.id])
+        self.assertNotIn('DISTINCT', ctx.captured_queries[0]['sql'])
+        self.assertIn('EXISTS', ctx.captured_queries[0]['sql'])
+
+    def test_filter_invalid_match(self):
+        """Test an unknown match mode returns an error."""
+        res = self.client.get(RECIPES_URL, {"tags": "1", "match": "some"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def count_writes(self, ctx, statement, table):
+        """Count captured statements of one kind against a table."""
+        return sum(
+            1 for query in ctx.captured_queries
+            if query['sql'].startswith(statement) and f'"{table}"' in query['sql'].split(' WHERE ')[0]
+        )
+
+    def test_update_writes_only_changed_links(self):
+        """Test changing one tag does not rewrite the other links."""
+        recipe = create_recipe(user=self.user)
+        tag_keep = Tag.objects.create(user=self.user, name="Keep")
+        tag_drop = Tag.objects.create(user=self.user, name="Drop")
+        recipe.tags.add(tag_keep, tag_drop)
+        recipe.ingredients.add(*(
+            Ingredient.objects.create(user=self.user, name=f"Ingredient {i}") for i in range(40)
+        ))
+        payload = {
+            "tags": [{"name": "Keep"}, {"name": "New"}],
+            "ingredients": [{"name": f"Ingredient {i}"} for i in range(40)],
+        }
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.count_writes(ctx, 'DELETE', 'core_recipe_tags'), 1)
+        self.assertEqual(self.count_writes(ctx, 'INSERT', 'core_recipe_tags'), 1)
+        self.assertEqual(self.count_writes(ctx, 'DELETE', 'core_recipe_ingredients'), 0)
+        self.assertEqual(self.count_writes(ctx, 'INSERT', 'core_recipe_ingredients'), 0)
+        self.assertEqual(set(recipe.tags.values_list('name', flat=True)), {"Keep", "New"})
+        self.assertEqual(recipe.ingredients.count(), 40)
+
+    def test_update_saves_only_changed_columns(self):
+        """Test a partial update writes only the modified columns."""
+        recipe = create_recipe(user=self.user, title="Old title", time_minutes=10)
+        payload = {"title": "New title", "time_minutes": 10}
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(detail_url(recipe.id), payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "core_recipe"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"title"', updates[0])
+        for column in ('"time_minutes"', '"description"', '"price"', '"link"'):
+            self.assertNotIn(column, updates[0])
+
+    def test_update_unchanged_skips_write(self):
+        """Test an update with no changes does not write the recipe row."""
+        recipe = create_recipe(user=self.user, title="Same title")
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(detail_url(recipe.id), {"title": "Same title"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(any(q['sql'].startswith('UPDATE') for q in ctx.captured_queries))
+
+    def test_search_recipes(self):
+        """Test searching recipes by title and description."""
+        recipe1 = create_recipe(user=self.user, title="Thai green curry", description="Spicy")
+        recipe2 = create_recipe(user=self.user, title="Rice", description="Goes well with a curry")
+        create_recipe(user=self.user, title="Salad", description="Fresh greens")
+        other_user = create_user(email="other@example.com", password="testpass123")
+        create_recipe(user=other_user, title="Other curry")
+
+        res = self.client.get(RECIPES_URL, {"search": "curries"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data['results']], [recipe1.id, recipe2.id])
+
+    def test_search_vector_follows_updates(self):
+        """Test the search vector is refreshed when the title changes."""
+        recipe = create_recipe(user=self.user, title="Pancakes", description="")
+        self.client.patch(detail_url(recipe.id), {"title": "Waffles"})
+
+        res = self.client.get(RECIPES_URL, {"search": "waffles"})
+        self.assertEqual([item['id'] for item in res.data['results']], [recipe.id])
+        res = self.client.get(RECIPES_URL, {"search": "pancakes"})
+        self.assertEqual(res.data['results'], [])
+
+    def test_search_combined_with_tags(self):
+        """Test search combines with the tag filter."""
+        recipe1 = create_recipe(user=self.user, title="Vegan curry")
+        create_recipe(user=self.user, title="Chicken curry")
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe1.tags.add(tag)
+
+        res = self.client.get(RECIPES_URL, {"search": "curry", "tags": f"{tag.id}"})
+
+        self.assertEqual([item['id'] for item in res.data['results']], [recipe1.id])
+
+    def test_search_paginates_by_rank(self):
+        """Test following cursors over search results returns each match once in rank order."""
+        best = create_recipe(user=self.user, title="Curry curry curry", description="curry")
+        middle = create_recipe(user=self.user, title="Curry", description="")
+        tied = [create_recipe(user=self.user, title="Rice", description=f"Serve with curry {i}") for i in range(3)]
+
+        ids = []
+        res = self.client.get(RECIPES_URL, {"search": "curry", "page_size": 2})
+        while True:
+            ids.extend(item['id'] for item in res.data['results'])
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(ids[:2], [best.id, middle.id])
+        self.assertEqual(sorted(ids[2:]), sorted(r.id for r in tied))
+
+
+class RecipeQueryCountTests(TestCase):
+    """Test that recipe endpoints run a fixed number of queries."""
+
+    def setUp(self):
+        self.user = create_user(email="user@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipes_with_relations(self, count):
+        """Create recipes that each have a tag and an ingredient."""
+        start = Recipe.objects.count()
+        for i in range(start, start + count):
+            recipe = create_recipe(user=self.user, title=f"Recipe {i}")
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f"Tag {i}"))
+            recipe.ingredients.add(Ingredient.objects.create(user=self.user, name=f"Ingredient {i}"))
+
+    def count_queries(self, method, *args, **kwargs):
+        """Return the number of queries run by a client call."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = method(*args, **kwargs)
+        self.assertLess(res.status_code, 400)
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        """Test listing recipes does not run queries per recipe."""
+        self.create_recipes_with_relations(2)
+        small = self.count_queries(self.client.get, RECIPES_URL)
+        self.create_recipes_with_relations(10)
+        large = self.count_queries(self.client.get, RECIPES_URL)
+
+        self.assertEqual(small, large)
+
+    def test_list_prefetches_relations(self):
+        """Test listing recipes loads tags and ingredients in bulk."""
+        self.create_recipes_with_relations(5)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 5)
+        self.assertEqual(len(res.data['results'][0]['tags']), 1)
+        self.assertEqual(len(res.data['results'][0]['ingredients']), 1)
+
+    def test_list_defers_detail_columns(self):
+        """Test listing recipes does not select description, only the image behind the renditions."""
+        self.create_recipes_with_relations(1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(RECIPES_URL)
+
+        recipe_sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('"description"', recipe_sql)
+        self.assertNotIn('"search_vector"', recipe_sql)
+
+    def test_retrieve_query_count_is_constant(self):
+        """Test retrieving a recipe does not depend on the number of recipes."""
+        self.create_recipes_with_relations(1)
+        recipe = Recipe.objects.filter(user=self.user).first()
+        small = self.count_queries(self.client.get, detail_url(recipe.id))
+        self.create_recipes_with_relations(10)
+        large = self.count_queries(self.client.get, detail_url(recipe.id))
+
+        self.assertEqual(small, large)
+
+    def test_create_query_count_is_constant(self):
+        """Test creating a recipe does not depend on the number of recipes."""
+        def payload(suffix):
+            return {
+                "title": "New recipe",
+                "time_minutes": 10,
+                "price": "5.00",
+                "tags": [{"name": f"Vegan {suffix}"}],
+                "ingredients": [{"name": f"Salt {suffix}"}],
+            }
+
+        self.create_recipes_with_relations(1)
+        small = self.count_queries(self.client.post, RECIPES_URL, payload(1), format='json')
+        self.create_recipes_with_relations(10)
+        large = self.count_queries(self.client.post, RECIPES_URL, payload(2), format='json')
+
+        self.assertEqual(small, large)
+
+    def test_create_query_count_independent_of_ingredients(self):
+        """Test creating a recipe costs the same with 2 or 30 new ingredients and tags."""
+        def payload(count, prefix):
+            return {
+                "title": "New recipe",
+                "time_minutes": 10,
+                "price": "5.00",
+                "tags": [{"name": f"{prefix} tag {i}"} for i in range(count)],
+                "ingredients": [{"name": f"{prefix} ingredient {i}"} for i in range(count)],
+            }
+
+        small = self.count_queries(self.client.post, RECIPES_URL, payload(2, "small"), format='json')
+        large = self.count_queries(self.client.post, RECIPES_URL, payload(30, "large"), format='json')
+
+        self.assertEqual(small, large)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 32)
+
+    def test_create_mixes_existing_and_repeated_names(self):
+        """Test existing and repeated names resolve to a single object each."""
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        payload = {
+            "title": "New recipe",
+            "time_minutes": 10,
+            "price": "5.00",
+            "ingredients": [{"name": "Salt"}, {"name": "Pepper"}, {"name": "Pepper"}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.ingredients.count(), 2)
+        self.assertIn(salt, recipe.ingredients.all())
+        self.assertEqual(Ingredient.objects.filter(user=self.user, name="Pepper").count(), 1)
+
+    def test_update_query_count_is_constant(self):
+        """Test updating a recipe does not depend on the number of recipes."""
+        self.create_recipes_with_relations(1)
+        recipe = Recipe.objects.filter(user=self.user).first()
+        small = self.count_queries(
+            self.client.patch, detail_url(recipe.id), {"title": "Updated", "tags": [{"name": "Tag 0"}]}, format='json')
+        self.create_recipes_with_relations(10)
+        large = self.count_queries(
+            self.client.patch, detail_url(recipe.id), {"title": "Updated again", "tags": [{"name": "Tag 0"}]},
+            format='json')
+
+        self.assertEqual(small, large)
+
+
+class RecipePaginationTests(TestCase):
+    """Test cursor pagination of the recipe list."""
+
+    def setUp(self):
+        self.user = create_user(email="user@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def collect_ids(self, url, params=None):
+        """Follow next links and return every recipe id seen."""
+        ids = []
+        res = self.client.get(url, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in res.data['results'])
+            if not res.data['next']:
+                return ids
+            res = self.client.get(res.data['next'])
+
+    def test_page_size_param(self):
+        """Test limiting the number of recipes per page."""
+        for i in range(5):
+            create_recipe(user=self.user, title=f"Recipe {i}")
+
+        res = self.client.get(RECIPES_URL, {"page_size": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
+        self.assertIsNone(res.data['previous'])
+
+    def test_page_size_is_capped(self):
+        """Test page size cannot exceed the maximum."""
+        for i in range(RecipeCursorPagination.max_page_size + 1):
+            create_recipe(user=self.user, title=f"Recipe {i}")
+
+        res = self.client.get(RECIPES_URL, {"page_size": 10000})
+
+        self.assertEqual(len(res.data['results']), RecipeCursorPagination.max_page_size)
+
+    def test_pages_cover_all_recipes_in_order(self):
+        """Test following cursors returns every recipe once, newest first."""
+        recipes = [create_recipe(user=self.user, title=f"Recipe {i}") for i in range(7)]
+
+        ids = self.collect_ids(RECIPES_URL, {"page_size": 3})
+
+        self.assertEqual(ids, sorted((r.id for r in recipes), reverse=True))
+
+    def test_pages_stable_under_inserts(self):
+        """Test recipes created while paging do not shift later pages."""
+        recipes = [create_recipe(user=self.user, title=f"Recipe {i}") for i in range(6)]
+
+        res = self.client.get(RECIPES_URL, {"page_size": 3})
+        first_page = [item['id'] for item in res.data['results']]
+        create_recipe(user=self.user, title="Inserted while paging")
+        res = self.client.get(res.data['next'])
+        second_page = [item['id'] for item in res.data['results']]
+
+        self.assertEqual(first_page + second_page, sorted((r.id for r in recipes), reverse=True))
+
+    def test_invalid_cursor(self):
+        """Test a tampered cursor is rejected."""
+        res = self.client.get(RECIPES_URL, {"cursor": "not-a-cursor"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeResponseCacheTests(TestCase):
+    """Test caching of recipe list responses."""
+
+    def setUp(self):
+        cache.clear()
+        response_cache_stats.reset()
+        self.user = create_user(email="user@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_list_served_from_cache(self):
+        """Test a repeated list request runs no queries."""
+        create_recipe(user=self.user)
+        first = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(RECIPES_URL)
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual((response_cache_stats.hits, response_cache_stats.misses), (1, 1))
+
+    def test_query_params_cached_separately(self):
+        """Test different filters are cached under different keys."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe.tags.add(tag)
+        create_recipe(user=self.user)
+
+        all_res = self.client.get(RECIPES_URL)
+        filtered_res = self.client.get(RECIPES_URL, {"tags": f"{tag.id}"})
+
+        self.assertEqual(filtered_res['X-Cache'], 'MISS')
+        self.assertEqual(len(all_res.data['results']), 2)
+        self.assertEqual(len(filtered_res.data['results']), 1)
+
+    def test_write_invalidates_cache(self):
+        """Test creating, updating and deleting recipes invalidates the list."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        self.client.patch(detail_url(recipe.id), {"title": "Changed"})
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['title'], "Changed")
+
+        self.client.delete(detail_url(recipe.id))
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data['results'], [])
+
+    def test_tag_change_invalidates_recipe_list(self):
+        """Test renaming a tag invalidates recipes that show it."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe.tags.add(tag)
+        self.client.get(RECIPES_URL)
+
+        self.client.patch(reverse('recipe:tag-detail', args=[tag.id]), {"name": "Vegetarian"})
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data['results'][0]['tags'][0]['name'], "Vegetarian")
+
+    def test_link_change_invalidates_cache(self):
+        """Test adding a tag to a recipe invalidates the list."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data['results'][0]['tags']), 1)
+
+    def test_version_bumped_again_on_commit(self):
+        """Test responses cached before a write commits are invalidated by the commit."""
+        recipe = create_recipe(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                recipe.title = "Changed"
+                recipe.save()
+                version = get_data_version(self.user.id)
+
+        self.assertGreater(get_data_version(self.user.id), version)
+
+    def test_cache_is_per_user(self):
+        """Test users never see each other's cached responses."""
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        other_user = create_user(email="other@example.com", password="testpass123")
+        self.client.force_authenticate(other_user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+
+class RecipeConditionalGetTests(TestCase):
+    """Test ETag / If-None-Match handling on recipe endpoints."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(email="user@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def test_list_not_modified(self):
+        """Test a list request with a current ETag returns 304 without queries."""
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+        self.assertTrue(etag.startswith('W/'))
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_detail_not_modified(self):
+        """Test a detail request with a current ETag returns 304 without queries."""
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=f'"other", {etag}')
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_after_write(self):
+        """Test a write makes earlier ETags stale."""
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data['tags']), 1)
+
+    def test_etag_differs_per_url_and_params(self):
+        """Test each URL and filter gets its own ETag."""
+        list_etag = self.client.get(RECIPES_URL)['ETag']
+        filtered_etag = self.client.get(RECIPES_URL, {"search": "test"})['ETag']
+        detail_etag = self.client.get(detail_url(self.recipe.id))['ETag']
+
+        self.assertEqual(len({list_etag, filtered_etag, detail_etag}), 3)
+
+    def test_link_change_touches_updated_at(self):
+        """Test linking a tag bumps the recipe's updated_at."""
+        before = Recipe.objects.get(id=self.recipe.id).updated_at
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+
+        self.assertGreater(Recipe.objects.get(id=self.recipe.id).updated_at, before)
+
+
+class RecipeSparseFieldsTests(TestCase):
+    """Test trimming recipe responses with fields and omit."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(email="user@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="Vegan"))
+
+    def test_list_fields(self):
+        """Test listing only the requested fields skips relations and columns."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {"fields": "id,title,time_minutes"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(res.data['results'][0]), ['id', 'title', 'time_minutes'])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        for column in ('"price"', '"link"', '"description"', '"search_vector"'):
+            self.assertNotIn(column, ctx.captured_queries[0]['sql'])
+
+    def test_list_omit(self):
+        """Test omitting nested fields skips their prefetch."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {"omit": "ingredients"})
+
+        self.assertNotIn('ingredients', res.data['results'][0])
+        self.assertEqual(res.data['results'][0]['tags'][0]['name'], "Vegan")
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    def test_detail_fields(self):
+        """Test trimming a detail response."""
+        res = self.client.get(detail_url(self.recipe.id), {"fields": "description,tags"})
+
+        self.assertEqual(res.data, {"tags": [{"id": self.recipe.tags.get().id, "name": "Vegan"}],
+                                    "description": self.recipe.description})
+
+    def test_full_response_by_default(self):
+        """Test responses are unchanged without fields or omit."""
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res.data, RecipeDetailSerializer(self.recipe).data)
+
+    def test_fields_ignored_on_writes(self):
+        """Test write responses always include every field."""
+        res = self.client.patch(detail_url(self.recipe.id) + '?fields=id', {"title": "Changed"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('title', res.data)
+
+
+class RecipeListFastSerializerTests(TestCase):
+    """Test the fast list serializer renders exactly what RecipeSerializer does."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(email="user@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        tags = [Tag.objects.create(user=self.user, name=f"Tag {i}") for i in range(3)]
+        ingredients = [Ingredient.objects.create(user=self.user, name=f"Ingredient {i}") for i in range(3)]
+        for i, price in enumerate(("1.00", "10.20", "999.99")):
+            recipe = create_recipe(user=self.user, title=f"Recipe {i}", price=Decimal(price), link="")
+            recipe.tags.add(*reversed(tags[i:]))
+            recipe.ingredients.add(*ingredients[:i])
+
+    def get_rendered(self, params=None):
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.content
+
+    def test_schema_documents_recipe_list(self):
+        """Test schema generation still sees RecipeSerializer for the list."""
+        res = self.client.get(reverse('api-schema'), {'format': 'json'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('PaginatedRecipeList', res.json()['components']['schemas'])
+
+    def test_parity_with_recipe_serializer(self):
+        """Test the fast path and RecipeSerializer produce identical responses."""
+        with self.settings(RECIPE_FAST_LIST_SERIALIZER=False):
+            expected = self.get_rendered()
+        cache.clear()
+
+        self.assertEqual(self.get_rendered(), expected)
+
+    def test_parity_with_fields_and_search(self):
+        """Test parity holds for sparse fieldsets and searches."""
+        for params in ({"fields": "price,title,tags"}, {"omit": "tags,link"}, {"search": "recipe"}):
+            with self.subTest(params=params):
+                with self.settings(RECIPE_FAST_LIST_SERIALIZER=False):
+                    expected = self.get_rendered(params)
+                cache.clear()
+                self.assertEqual(self.get_rendered(params), expected)
+                cache.clear()
+
+    def test_fast_path_query_count(self):
+        """Test the fast path runs one query for recipes and one per relation."""
+        with self.assertNumQueries(3):
+            self.client.get(RECIPES_URL)
 
 
 class ImageUploadTest(TestCase):
@@ -463,3 +1117,344 @@ class ImageUploadTest(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def upload(self, data, name='photo.jpg'):
+        with tempfile.NamedTemporaryFile(suffix=name) as image_file:
+            image_file.write(data)
+            image_file.seek(0)
+            return self.client.post(image_upload_url(self.recipe.id), {"image": image_file}, format='multipart')
+
+    def test_upload_not_an_image(self):
+        """Test files that only claim to be images are rejected"""
+        res = self.upload(b'<html>' * 100)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_too_many_pixels(self):
+        """Test images over the pixel limit are rejected"""
+        output = BytesIO()
+        Image.new('L', (3000, 2000)).save(output, format='PNG')
+
+        with self.settings(RECIPE_IMAGE_MAX_PIXELS=5 * 10 ** 6):
+            res = self.upload(output.getvalue(), name='photo.png')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data, {'image': ['Image larger than 5 megapixels.']})
+
+    def test_upload_too_large(self):
+        """Test uploads over the size limit are rejected"""
+        output = BytesIO()
+        Image.frombytes('L', (1000, 1000), os.urandom(10 ** 6)).save(output, format='PNG')
+
+        with self.settings(RECIPE_IMAGE_MAX_BYTES=100 * 2 ** 10):
+            res = self.upload(output.getvalue(), name='photo.png')
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+
+class RecipeExportTests(TestCase):
+    """Test the streaming NDJSON export."""
+
+    def setUp(self):
+        self.user = create_user(email="user@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, params=None):
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(res.streaming_content).splitlines()]
+
+    def test_export_all_recipes(self):
+        """Test every recipe of the user is exported, oldest first, with its relations."""
+        other = create_user(email="other@example.com", password="testpass123")
+        create_recipe(user=other)
+        recipes = [create_recipe(user=self.user, title=f"Recipe {i}") for i in range(3)]
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipes[1].tags.add(tag)
+
+        lines = self.export()
+
+        expected = RecipeBulkSerializer(recipes_in_id_order(self.user), many=True).data
+        self.assertEqual(lines, json.loads(json.dumps(expected)))
+        self.assertEqual([line['id'] for line in lines], [recipe.id for recipe in recipes])
+        self.assertEqual(lines[1]['tags'], [{'id': tag.id, 'name': 'Vegan'}])
+
+    def test_export_fields(self):
+        """Test the export can be trimmed with ?fields=."""
+        create_recipe(user=self.user)
+
+        lines = self.export({'fields': 'id,title'})
+
+        self.assertEqual(list(lines[0]), ['id', 'title'])
+
+    def test_export_queries_per_batch(self):
+        """Test tags and ingredients are read once per batch, not once per recipe."""
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f"Recipe {i}")
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f"Tag {i}"))
+
+        with self.settings(RECIPE_EXPORT_CHUNK_SIZE=2):
+            with CaptureQueriesContext(connection) as queries:
+                lines = self.export()
+
+        self.assertEqual(len(lines), 5)
+        # Batches of 2, 2 and 1, each with one query per relation
+        self.assertEqual(len([q for q in queries if 'recipe_tags' in q['sql']]), 3)
+        self.assertEqual(len([q for q in queries if 'recipe_ingredients' in q['sql']]), 3)
+
+    def test_export_requires_auth(self):
+        """Test the export is not available anonymously."""
+        res = APIClient().get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class RecipeBulkTests(TestCase):
+    """Test creating, updating and deleting recipes in bulk."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(email="user@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def payload(self, count, start=0):
+        return [
+            {
+                "title": f"Recipe {i}",
+                "time_minutes": 10,
+                "price": "5.50",
+                "description": f"Description {i}",
+                "tags": [{"name": "Vegan"}, {"name": f"Tag {i}"}],
+                "ingredients": [{"name": "Salt"}, {"name": f"Ingredient {i}"}],
+            }
+            for i in range(start, start + count)
+        ]
+
+    def test_bulk_create(self):
+        """Test recipes are created with their tags and ingredients, resolved once per name."""
+        Tag.objects.create(user=self.user, name="Vegan")
+
+        res = self.client.post(BULK_URL, self.payload(3), format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['errors'], [])
+        self.assertEqual([recipe['title'] for recipe in res.data['results']], ["Recipe 0", "Recipe 1", "Recipe 2"])
+        recipes = recipes_in_id_order(self.user)
+        self.assertEqual(res.data['results'], RecipeBulkSerializer(recipes, many=True).data)
+        self.assertEqual(Tag.objects.filter(user=self.user, name="Vegan").count(), 1)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 4)
+        for i, recipe in enumerate(recipes):
+            self.assertEqual(sorted(tag.name for tag in recipe.tags.all()), [f"Tag {i}", "Vegan"])
+            self.assertEqual(recipe.description, f"Description {i}")
+
+    def test_bulk_create_query_count_is_constant(self):
+        """Test the number of queries does not grow with the number of recipes."""
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(BULK_URL, self.payload(2), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(BULK_URL, self.payload(40, start=2), format='json')
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 42)
+        self.assertEqual(len(small), len(large))
+
+    def test_bulk_create_atomic_rejects_all(self):
+        """Test one invalid item rejects the whole request by default."""
+        payload = self.payload(3)
+        payload[1]['time_minutes'] = 'soon'
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data['errors']), 1)
+        self.assertEqual(res.data['errors'][0]['index'], 1)
+        self.assertIn('time_minutes', res.data['errors'][0]['errors'])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_partial(self):
+        """Test ?atomic=false writes the valid items and reports the others."""
+        payload = self.payload(3) + ['not a recipe']
+        payload[0]['price'] = 'free'
+
+        res = self.client.post(BULK_URL + '?atomic=false', payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([error['index'] for error in res.data['errors']], [0, 3])
+        self.assertEqual([recipe['title'] for recipe in res.data['results']], ["Recipe 1", "Recipe 2"])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_update(self):
+        """Test recipes are partially updated, touching only the ones that change."""
+        recipes = [create_recipe(user=self.user, title=f"Recipe {i}") for i in range(3)]
+        recipes[1].tags.add(Tag.objects.create(user=self.user, name="Old"))
+        before = {recipe.id: Recipe.objects.get(id=recipe.id).updated_at for recipe in recipes}
+        payload = [
+            {"id": recipes[0].id, "title": "Renamed"},
+            {"id": recipes[1].id, "tags": [{"name": "New"}]},
+            {"id": recipes[2].id, "title": "Recipe 2"},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'][0]['title'], "Renamed")
+        self.assertEqual([tag['name'] for tag in res.data['results'][1]['tags']], ["New"])
+        after = {recipe.id: recipe.updated_at for recipe in Recipe.objects.filter(user=self.user)}
+        self.assertGreater(after[recipes[0].id], before[recipes[0].id])
+        self.assertGreater(after[recipes[1].id], before[recipes[1].id])
+        self.assertEqual(after[recipes[2].id], before[recipes[2].id])
+        self.assertEqual(Recipe.objects.get(id=recipes[1].id).title, "Recipe 1")
+
+    def test_bulk_update_errors(self):
+        """Test updates must name one of the user's recipes, once."""
+        other = create_recipe(user=create_user(email="other@example.com", password="testpass123"))
+        recipe = create_recipe(user=self.user)
+        payload = [
+            {"title": "No id"},
+            {"id": other.id, "title": "Not mine"},
+            {"id": recipe.id, "title": "Mine"},
+            {"id": recipe.id, "title": "Again"},
+        ]
+
+        res = self.client.patch(BULK_URL + '?atomic=false', payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([error['index'] for error in res.data['errors']], [0, 1, 3])
+        other.refresh_from_db()
+        recipe.refresh_from_db()
+        self.assertEqual(other.title, "Test Recipe")
+        self.assertEqual(recipe.title, "Mine")
+
+    def test_bulk_delete(self):
+        """Test deleting the user's recipes by id."""
+        other = create_recipe(user=create_user(email="other@example.com", password="testpass123"))
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+
+        res = self.client.delete(BULK_URL, [recipes[0].id, other.id], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Recipe.objects.count(), 4)
+
+        res = self.client.delete(BULK_URL, [recipes[0].id, recipes[1].id], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [recipes[0].id, recipes[1].id])
+        self.assertEqual(list(Recipe.objects.filter(user=self.user)), [recipes[2]])
+        self.assertTrue(Recipe.objects.filter(id=other.id).exists())
+
+    def test_bulk_malformed_ids(self):
+        """Test ids that are not integers are reported per item, true is no id."""
+        recipe = create_recipe(user=self.user)
+        Recipe.objects.filter(id=recipe.id).update(id=1)
+
+        res = self.client.delete(BULK_URL + '?atomic=false', [{"id": 1}, [1], True, "1", 1], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([error['index'] for error in res.data['errors']], [0, 1, 2, 3])
+        self.assertEqual(res.data['errors'][2], {'index': 2, 'errors': {'id': ['A valid integer is required.']}})
+        self.assertEqual(res.data['results'], [1])
+
+        recipe = create_recipe(user=self.user)
+        Recipe.objects.filter(id=recipe.id).update(id=1)
+        res = self.client.patch(BULK_URL + '?atomic=false', [{"id": True, "title": "Bool"}], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['errors'], [{'index': 0, 'errors': {'id': ['A valid integer is required.']}}])
+        self.assertEqual(Recipe.objects.get(id=1).title, "Test Recipe")
+
+    def test_bulk_requires_list(self):
+        """Test the body must be a list of at most RECIPE_BULK_MAX_ITEMS items."""
+        res = self.client.post(BULK_URL, self.payload(1)[0], format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.settings(RECIPE_BULK_MAX_ITEMS=2):
+            res = self.client.post(BULK_URL, self.payload(3), format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_invalidates_cached_list(self):
+        """Test bulk writes invalidate the cached recipe list."""
+        self.client.get(RECIPES_URL)
+
+        self.client.post(BULK_URL, self.payload(2), format='json')
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data['results']), 2)
+
+
+class RecipeFacetsTests(TestCase):
+    """Test the per tag and ingredient counts of the filtered recipes."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(email="user@example.com", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name="Vegan")
+        self.quick = Tag.objects.create(user=self.user, name="Quick")
+        self.salt = Ingredient.objects.create(user=self.user, name="Salt")
+        self.soup = create_recipe(user=self.user, title="Tomato soup", description="A warm soup")
+        self.soup.tags.add(self.vegan, self.quick)
+        self.soup.ingredients.add(self.salt)
+        self.salad = create_recipe(user=self.user, title="Salad")
+        self.salad.tags.add(self.vegan)
+        self.salad.ingredients.add(self.salt)
+        create_recipe(user=self.user, title="Toast").tags.add(self.quick)
+
+    def facet(self, item, count):
+        return {'id': item.id, 'name': item.name, 'count': count}
+
+    def test_facets_of_all_recipes(self):
+        """Test every tag and ingredient is counted, most used first, in a single query."""
+        other = create_user(email="other@example.com", password="testpass123")
+        create_recipe(user=other).tags.add(Tag.objects.create(user=other, name="Vegan"))
+
+        with self.assertNumQueries(1):
+            res = self.client.get(FACETS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'tags': [self.facet(self.quick, 2), self.facet(self.vegan, 2)],
+            'ingredients': [self.facet(self.salt, 2)],
+        })
+
+    def test_facets_follow_list_filters(self):
+        """Test the counts cover only the recipes the list would return."""
+        res = self.client.get(FACETS_URL, {'tags': f'{self.quick.id}'})
+
+        self.assertEqual(res.data['tags'], [self.facet(self.quick, 2), self.facet(self.vegan, 1)])
+        self.assertEqual(res.data['ingredients'], [self.facet(self.salt, 1)])
+
+        res = self.client.get(FACETS_URL, {'tags': f'{self.quick.id},{self.vegan.id}', 'match': 'all'})
+
+        self.assertEqual(res.data['tags'], [self.facet(self.quick, 1), self.facet(self.vegan, 1)])
+
+        res = self.client.get(FACETS_URL, {'search': 'soup'})
+
+        self.assertEqual(res.data['tags'], [self.facet(self.quick, 1), self.facet(self.vegan, 1)])
+
+    def test_facets_cached_per_filter_signature(self):
+        """Test equivalent filters share a cache entry until the recipes change."""
+        self.client.get(FACETS_URL, {'tags': f'{self.quick.id},{self.vegan.id}'})
+
+        with self.assertNumQueries(0):
+            res = self.client.get(FACETS_URL, {'tags': f' {self.vegan.id},{self.quick.id},{self.vegan.id}'})
+
+        self.assertEqual(res.data['ingredients'], [self.facet(self.salt, 2)])
+
+        self.salad.ingredients.remove(self.salt)
+        res = self.client.get(FACETS_URL, {'tags': f'{self.quick.id},{self.vegan.id}'})
+
+        self.assertEqual(res.data['ingredients'], [self.facet(self.salt, 1)])
+
+    def test_facets_invalid_ids(self):
+        """Test malformed ids are rejected."""
+        res = self.client.get(FACETS_URL, {'tags': 'vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
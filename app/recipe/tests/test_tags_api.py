@@ -4,16 +4,23 @@ Tests for the tags API
 from decimal import Decimal
 
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
 from core.models import (Tag, Recipe)
-from recipe.serializers import TagSerializer
+from recipe.search import has_trigram_support
+from recipe.serializers import TagDetailSerializer
+from recipe.views import autocomplete_cache
 
 TAGS_URL = reverse('recipe:tag-list')
+AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
+BULK_URL = reverse('recipe:tag-bulk')
+MERGE_URL = reverse('recipe:tag-merge')
 
 
 def detail_url(tag_id):
@@ -45,6 +52,7 @@ class PrivateTagsAPITests(TestCase):
         self.client = APIClient()
         self.user = create_user()
         self.client.force_authenticate(self.user)
+        autocomplete_cache.clear()
 
     def test_retrieve_tags(self):
         """Test retrieving tags"""
@@ -53,10 +61,10 @@ class PrivateTagsAPITests(TestCase):
         res = self.client.get(TAGS_URL)
 
         tags = Tag.objects.all().order_by('-name')
-        serializer = TagSerializer(tags, many=True)
+        serializer = TagDetailSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """Test retrieving tags for authenticated user"""
@@ -66,9 +74,9 @@ class PrivateTagsAPITests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
 
     def test_update_tag(self):
         """Test updating tag"""
@@ -84,6 +92,39 @@ class PrivateTagsAPITests(TestCase):
         self.assertEqual(tag.name, payload['name'])
         self.assertEqual(tag.user, self.user)
 
+    def test_update_keeps_recipe_count(self):
+        """Test updating a tag loaded before its count changed does not overwrite the count"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        stale = Tag.objects.get(id=tag.id)
+        Recipe.objects.create(user=self.user, title='Salad', time_minutes=5, price=Decimal('1.00')).tags.add(tag)
+
+        serializer = TagDetailSerializer(stale, data={'name': 'Plant based'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        tag.refresh_from_db()
+        self.assertEqual((tag.name, tag.recipe_count), ('Plant based', 1))
+
+    def test_update_tag_duplicate_name(self):
+        """Test renaming a tag to an existing name returns an error"""
+        Tag.objects.create(user=self.user, name='Dessert')
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dessert'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Vegan')
+
+    def test_list_not_modified(self):
+        """Test listing tags honours If-None-Match"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
     def test_delete_tag(self):
         """Test deleting tag"""
         tag = Tag.objects.create(user=self.user, name='Vegan')
@@ -106,13 +147,13 @@ class PrivateTagsAPITests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        s1 = TagSerializer(tag1)
-        s2 = TagSerializer(tag2)
-        s3 = TagSerializer(tag3)
+        s1 = TagDetailSerializer(Tag.objects.get(id=tag1.id))
+        s2 = TagDetailSerializer(Tag.objects.get(id=tag2.id))
+        s3 = TagDetailSerializer(Tag.objects.get(id=tag3.id))
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filtered_tags_unique(self):
         """Test filtering tags assigned to recipes list is unique."""
@@ -127,4 +168,256 @@ class PrivateTagsAPITests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_tags_paginated_by_name(self):
+        """Test paging through tags follows name order."""
+        names = ['Breakfast', 'Dessert', 'Lunch', 'Vegan', 'Dinner']
+        for name in names:
+            Tag.objects.create(user=self.user, name=name)
+
+        seen = []
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        while True:
+            seen.extend(item['name'] for item in res.data['results'])
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(seen, sorted(names, reverse=True))
+
+    def test_autocomplete_prefix(self):
+        """Test autocomplete returns the user's tags starting with the prefix"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        vegetarian = Tag.objects.create(user=self.user, name='vegetarian')
+        Tag.objects.create(user=self.user, name='Dessert')
+        Tag.objects.create(user=create_user(email='other@example.com'), name='Vegan')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'VEG'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': vegan.id, 'name': 'Vegan'},
+            {'id': vegetarian.id, 'name': 'vegetarian'},
+        ])
+
+    def test_autocomplete_limit(self):
+        """Test autocomplete returns at most limit matches"""
+        for i in range(5):
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tag', 'limit': 2})
+
+        self.assertEqual([item['name'] for item in res.data], ['Tag 0', 'Tag 1'])
+
+    def test_autocomplete_empty_prefix(self):
+        """Test autocomplete without a prefix returns nothing"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': ' '})
+
+        self.assertEqual(res.data, [])
+
+    def test_autocomplete_cached(self):
+        """Test repeated prefixes are served from the cache"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(AUTOCOMPLETE_URL, {'q': 'veg'})
+
+        with self.assertNumQueries(0):
+            res = self.client.get(AUTOCOMPLETE_URL, {'q': 'Veg'})
+
+        self.assertEqual(res.data[0]['name'], 'Vegan')
+
+    def test_autocomplete_tolerates_typos(self):
+        """Test autocomplete falls back to similar names"""
+        if not has_trigram_support():
+            self.skipTest('pg_trgm is not installed')
+        Tag.objects.create(user=self.user, name='Breakfast')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'brekfast'})
+
+        self.assertEqual([item['name'] for item in res.data], ['Breakfast'])
+
+    def test_tags_include_recipe_count(self):
+        """Test tags are listed with the number of recipes using them, and can be ordered by it"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        dessert = Tag.objects.create(user=self.user, name='Dessert')
+        Tag.objects.create(user=self.user, name='Lunch')
+        for _ in range(2):
+            Recipe.objects.create(user=self.user, title='Cake', time_minutes=5, price=Decimal('1.00')).tags.add(dessert)
+        Recipe.objects.create(user=self.user, title='Salad', time_minutes=5, price=Decimal('1.00')).tags.add(vegan)
+
+        res = self.client.get(TAGS_URL, {'ordering': '-recipe_count'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count']) for tag in res.data['results']],
+            [('Dessert', 2), ('Vegan', 1), ('Lunch', 0)],
+        )
+
+        res = self.client.get(TAGS_URL, {'ordering': '-recipe_count', 'limit': 1, 'offset': 1})
+
+        self.assertEqual(res.data['count'], 3)
+        self.assertEqual([tag['name'] for tag in res.data['results']], ['Vegan'])
+        self.assertIn('offset=2', res.data['next'])
+
+    def test_tags_invalid_ordering(self):
+        """Test only the supported orderings are accepted"""
+        res = self.client.get(TAGS_URL, {'ordering': 'user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_assigned_only_uses_recipe_count(self):
+        """Test assigned_only reads the counter instead of joining the recipes"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Unused')
+        Recipe.objects.create(user=self.user, title='Salad', time_minutes=5, price=Decimal('1.00')).tags.add(tag)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual([tag['name'] for tag in res.data['results']], ['Vegan'])
+        self.assertFalse(any('core_recipe_tags' in query['sql'] for query in queries))
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 0})
+
+        self.assertEqual([tag['name'] for tag in res.data['results']], ['Vegan', 'Unused'])
+
+
+class TagBulkTests(TestCase):
+    """Test renaming, deleting and merging tags in bulk"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, *tags):
+        recipe = Recipe.objects.create(user=self.user, title='Recipe', time_minutes=5, price=Decimal('1.00'))
+        recipe.tags.add(*tags)
+        return recipe
+
+    def test_bulk_rename(self):
+        """Test renaming many tags at once"""
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(3)]
+        payload = [{'id': tags[0].id, 'name': 'Vegan'}, {'id': tags[1].id, 'name': 'Tag 2 old'}]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([{'id': tag['id'], 'name': tag['name']} for tag in res.data['results']], payload)
+        self.assertEqual(sorted(Tag.objects.values_list('name', flat=True)), ['Tag 2', 'Tag 2 old', 'Vegan'])
+
+    def test_bulk_rename_clashes(self):
+        """Test renames to a taken or repeated name reject the whole request"""
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(4)]
+        other = Tag.objects.create(user=create_user(email='other@example.com'), name='Vegan')
+        payload = [
+            {'id': tags[0].id, 'name': 'Tag 3'},
+            {'id': tags[1].id, 'name': 'Vegan'},
+            {'id': other.id, 'name': 'Mine'},
+            {'id': tags[2].id, 'name': 'Vegan'},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(sorted(error['index'] for error in res.data['errors']), [0, 2, 3])
+        self.assertEqual(sorted(Tag.objects.filter(user=self.user).values_list('name', flat=True)),
+                         ['Tag 0', 'Tag 1', 'Tag 2', 'Tag 3'])
+
+    def test_bulk_rename_swap(self):
+        """Test swapping names is reported instead of failing"""
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(2)]
+        payload = [{'id': tags[0].id, 'name': 'Tag 1'}, {'id': tags[1].id, 'name': 'Tag 0'}]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.get(id=tags[0].id).name, 'Tag 0')
+
+    def test_bulk_delete(self):
+        """Test deleting many tags, touching the recipes they were on"""
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(3)]
+        recipe = self.create_recipe(tags[0], tags[2])
+        before = Recipe.objects.get(id=recipe.id).updated_at
+        other = Tag.objects.create(user=create_user(email='other@example.com'), name='Vegan')
+
+        res = self.client.delete(BULK_URL, [tags[0].id, other.id], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['errors'], [{'index': 1, 'errors': {'id': ['Not found.']}}])
+        self.assertEqual(Tag.objects.count(), 4)
+
+        res = self.client.delete(BULK_URL, [tags[0].id, tags[1].id], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(Tag.objects.filter(user=self.user)), [tags[2]])
+        self.assertEqual(list(recipe.tags.all()), [tags[2]])
+        self.assertGreater(Recipe.objects.get(id=recipe.id).updated_at, before)
+
+    def test_bulk_malformed_ids(self):
+        """Test items that are not integer ids are reported per index, true is no id"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.filter(id=tag.id).update(id=1)
+
+        res = self.client.delete(BULK_URL, [{'id': 1}, [1], True, 1], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in res.data['errors']], [0, 1, 2])
+        self.assertEqual(res.data['errors'][2], {'index': 2, 'errors': {'id': ['A valid integer is required.']}})
+        self.assertTrue(Tag.objects.filter(id=1).exists())
+
+        res = self.client.patch(BULK_URL, [{'id': True, 'name': 'Bool'}], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.get(id=1).name, 'Vegan')
+
+    def test_merge(self):
+        """Test merging tags moves their recipes to the target without duplicate links"""
+        vegan, plant_based, veggie = (Tag.objects.create(user=self.user, name=name)
+                                      for name in ('Vegan', 'Plant based', 'Veggie'))
+        both = self.create_recipe(vegan, plant_based)
+        source_only = self.create_recipe(plant_based, veggie)
+        untouched = self.create_recipe()
+        before = Recipe.objects.get(id=untouched.id).updated_at
+
+        payload = {'ids': [plant_based.id, veggie.id, vegan.id], 'into': vegan.id}
+        res = self.client.post(MERGE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'id': vegan.id, 'name': 'Vegan', 'recipe_count': 2})
+        self.assertEqual(list(Tag.objects.filter(user=self.user)), [vegan])
+        self.assertEqual(list(both.tags.all()), [vegan])
+        self.assertEqual(list(source_only.tags.all()), [vegan])
+        self.assertEqual(Recipe.objects.get(id=untouched.id).updated_at, before)
+
+    def test_merge_query_count_is_constant(self):
+        """Test the merge does not load the recipes"""
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(3)]
+        for _ in range(2):
+            self.create_recipe(tags[1])
+        payload = {'ids': [tags[1].id], 'into': tags[0].id}
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(MERGE_URL, payload, format='json')
+
+        for _ in range(20):
+            self.create_recipe(tags[2])
+        payload = {'ids': [tags[2].id], 'into': tags[0].id}
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(MERGE_URL, payload, format='json')
+
+        self.assertEqual(tags[0].recipe_set.count(), 22)
+        self.assertEqual(len(few), len(many))
+
+    def test_merge_other_users_tags(self):
+        """Test tags of other users cannot be merged"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        other = Tag.objects.create(user=create_user(email='other@example.com'), name='Vegan')
+
+        res = self.client.post(MERGE_URL, {'ids': [other.id], 'into': tag.id}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.post(MERGE_URL, {'ids': [tag.id], 'into': other.id}, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertEqual(Tag.objects.count(), 2)
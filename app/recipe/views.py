@@ -3,56 +3,214 @@ Views for the recipe app.
 """
 from drf_spectacular.utils import (extend_schema, extend_schema_view, OpenApiParameter, OpenApiTypes)
 
+from django.db import (IntegrityError, transaction)
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.contrib.postgres.search import (SearchQuery, SearchRank)
+from django.db.models import (Count, Exists, F, FloatField, OuterRef, Prefetch, Value)
+from django.db.models.functions import (Cast, Collate, Upper)
+
 from rest_framework import (viewsets, mixins, status)
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
+from core.authentication import CachedTokenAuthentication
+from core.cache import LRUCache
 from core.models import (Recipe, Tag, Ingredient)
-from recipe import serializers
+from core.renderers import NDJSONRenderer
+from core.uploadhandlers import ImageUploadHandler
+from recipe import (bulk, images, serializers)
+from recipe.cache import (CachedListMixin, ConditionalGetMixin, bump_data_version, filter_cache_key, get_data_version)
+from recipe.pagination import (RecipeCursorPagination, RecipeAttrCursorPagination, RecipeAttrCountPagination)
+from recipe.search import (TrigramWordSimilar, TrigramWordSimilarity, has_trigram_support)
+
+autocomplete_cache = LRUCache(maxsize=settings.AUTOCOMPLETE_CACHE_SIZE, ttl=settings.AUTOCOMPLETE_CACHE_TTL)
+
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter("fields", OpenApiTypes.STR, description="Comma separated list of fields to return"),
+    OpenApiParameter("omit", OpenApiTypes.STR, description="Comma separated list of fields to leave out"),
+]
+
+FILTER_PARAMETERS = [
+    OpenApiParameter("tags", OpenApiTypes.STR, description="Comma separated list of Tag IDs to filter"),
+    OpenApiParameter("ingredients", OpenApiTypes.STR, description="Comma separated list of Ingredients IDs to filter"),
+    OpenApiParameter(
+        "search",
+        OpenApiTypes.STR,
+        description="Full text search over title and description, results are ordered by relevance"
+    ),
+    OpenApiParameter(
+        "match",
+        OpenApiTypes.STR,
+        description="Return recipes with any or all of the given tags/ingredients",
+        enum=["any", "all"],
+        default="any"
+    ),
+]
 
 
 @extend_schema_view(
-    list=extend_schema(
+    list=extend_schema(parameters=FILTER_PARAMETERS + SPARSE_FIELDS_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
+    bulk=extend_schema(
         parameters=[
             OpenApiParameter(
-                "tags",
-                OpenApiTypes.STR,
-                description="Comma separated list of Tag IDs to filter"
-            ),
-            OpenApiParameter(
-                "ingredients",
-                OpenApiTypes.STR,
-                description="Comma separated list of Ingredients IDs to filter"
+                "atomic",
+                OpenApiTypes.BOOL,
+                description="Reject the whole request if any item is invalid, or write the valid items anyway",
+                default=True
             )
-        ]
-    )
+        ],
+        request=serializers.RecipeBulkSerializer(many=True),
+    ),
+    facets=extend_schema(
+        parameters=FILTER_PARAMETERS,
+        responses=serializers.RecipeFacetsSerializer,
+    ),
+    export=extend_schema(
+        parameters=SPARSE_FIELDS_PARAMETERS,
+        responses={(200, NDJSONRenderer.media_type): serializers.RecipeBulkSerializer},
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, CachedListMixin, viewsets.ModelViewSet):
     """View for manage recipe APIS"""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeCursorPagination
+    # read or write by method unless an action sets its own, see core.throttling
+    throttle_scope = None
+    relations = {'tags': Tag, 'ingredients': Ingredient}
 
     def params_to_ints(self, qs):
         """convert params to ints"""
         return [int(str_id) for str_id in qs.split(',')]
 
+    def filter_by_related(self, queryset, through, field, ids, match_all):
+        """Filter recipes linked to the given ids through an M2M table.
+
+        Uses EXISTS (any) or a single grouped subquery (all), so the recipe
+        rows are never joined to the links and need no DISTINCT.
+        """
+        links = through.objects.filter(**{f'{field}__in': ids})
+        if match_all:
+            matching = links.values('recipe_id').annotate(
+                matched=Count(field, distinct=True),
+            ).filter(matched=len(set(ids))).values('recipe_id')
+            return queryset.filter(id__in=matching)
+
+        return queryset.filter(Exists(links.filter(recipe_id=OuterRef('pk'))))
+
+    def get_search_query(self):
+        """Return the full text query for ?search, or None"""
+        search = self.request.query_params.get('search')
+        if not search:
+            return None
+        return SearchQuery(search, config='english', search_type='websearch')
+
+    def get_filter_signature(self):
+        """Return the tags/ingredients/search filters of the request in a canonical form"""
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': 'Must be "any" or "all".'})
+        signature = {'match': match, 'search': self.request.query_params.get('search', '').strip()}
+        for relation in self.relations:
+            value = self.request.query_params.get(relation)
+            try:
+                signature[relation] = tuple(sorted(set(self.params_to_ints(value)))) if value else ()
+            except ValueError:
+                raise ValidationError({relation: 'Must be a comma separated list of ids.'})
+        return signature
+
+    def filter_recipes(self, queryset):
+        """Apply the tags/ingredients/search filters of the request to the user's recipes"""
+        signature = self.get_filter_signature()
+        match_all = signature['match'] == 'all'
+        if signature['tags']:
+            queryset = self.filter_by_related(queryset, Recipe.tags.through, 'tag_id', signature['tags'], match_all)
+        if signature['ingredients']:
+            queryset = self.filter_by_related(
+                queryset, Recipe.ingredients.through, 'ingredient_id', signature['ingredients'], match_all)
+        query = self.get_search_query()
+        if query is not None:
+            queryset = queryset.filter(search_vector=query)
+        return queryset.filter(user=self.request.user)
+
     def get_queryset(self):
         """We are overwrite this method because we want user to be able to change only his own recipies"""
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
-        if tags:
-            tag_ids = self.params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
-            ingredient_ids = self.params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        queryset = self.filter_recipes(self.queryset)
+        query = self.get_search_query()
+        if query is not None:
+            # Cast to double precision so the rank survives the round trip through the cursor exactly
+            queryset = queryset.annotate(rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
+
+        ordering = self.get_pagination_ordering()
+        queryset = queryset.order_by(*ordering)
+        if self.use_fast_list():
+            # Plain rows for RecipeListFastSerializer, plus whatever the cursor needs to read its position
+            fields = self.get_requested_fields()
+            columns = set(self.get_columns(fields))
+            return queryset.values(*columns | {name.lstrip('-') for name in ordering})
+        if self.request.method == 'GET' and self.action in ('list', 'retrieve'):
+            # Load only the columns and relations the response renders
+            fields = self.get_requested_fields()
+            queryset = queryset.only(*self.get_columns(fields))
+            return self.prefetch(queryset, [name for name in fields if name in self.relations])
+
+        # The search vector is only used inside the database
+        queryset = queryset.defer('search_vector')
+        if self.action != 'upload_image':
+            # Load nested tags/ingredients in one query each instead of one per recipe
+            queryset = self.prefetch(queryset, self.relations)
+
+        return queryset
+
+    def prefetch(self, queryset, relations):
+        """Prefetch tags/ingredients in id order, the order RecipeListFastSerializer renders them in"""
+        return queryset.prefetch_related(*(
+            Prefetch(name, queryset=self.relations[name].objects.order_by('id')) for name in relations
+        ))
+
+    def get_columns(self, fields):
+        """Return the recipe columns the given serializer fields are rendered from"""
+        columns = ['id']
+        for name in fields:
+            if name not in self.relations:
+                columns += serializers.FIELD_COLUMNS.get(name, (name,))
+        return columns
+
+    def get_requested_fields(self):
+        """Return the serializer fields the request asked for"""
+        return serializers.get_requested_fields(self.request.query_params, self.get_serializer_class().Meta.fields)
+
+    def use_fast_list(self):
+        """Whether to render the list with RecipeListFastSerializer"""
+        return (
+            settings.RECIPE_FAST_LIST_SERIALIZER
+            and self.action == 'list'
+            and self.request.method == 'GET'
+            and not getattr(self, 'swagger_fake_view', False)
+        )
 
-        return queryset.filter(user=self.request.user).order_by('-id').distinct()
+    def get_serializer(self, *args, **kwargs):
+        if self.use_fast_list():
+            return serializers.RecipeListFastSerializer(
+                *args, fields=self.get_requested_fields(), request=self.request)
+        return super().get_serializer(*args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_get(super().retrieve, request, *args, **kwargs)
+
+    def get_pagination_ordering(self):
+        """Order searches by relevance, everything else newest first"""
+        if self.request.query_params.get('search'):
+            return ('-rank', '-id')
+        return ('-id',)
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
@@ -60,6 +218,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'bulk':
+            return serializers.RecipeBulkSerializer
 
         return self.serializer_class
 
@@ -67,17 +227,154 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Create a new recipe"""
         serializer.save(user=self.request.user)
 
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    @action(methods=['POST'], detail=True, url_path='upload-image', throttle_scope='upload')
     def upload_image(self, request, pk=None):
         """Upload an image to a recipe"""
+        # Before anything reads request.data, so the upload is checked while it streams in
+        request.upload_handlers = [ImageUploadHandler(
+            request._request,
+            max_bytes=settings.RECIPE_IMAGE_MAX_BYTES,
+            max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS,
+        )]
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                image, renditions = serializer.validated_data['image'], {}
+                if settings.RECIPE_IMAGE_CONTENT_ADDRESSED:
+                    image = images.store_image(image)
+                    # Identical images share their renditions too
+                    renditions = images.shared_renditions(image)
+                # Otherwise the original stands in for the renditions until they are rendered
+                recipe = serializer.save(image=image, renditions=renditions)
+            if not renditions:
+                transaction.on_commit(lambda: images.schedule_renditions(recipe))
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=['GET'], detail=False, renderer_classes=[NDJSONRenderer])
+    def export(self, request):
+        """Stream all of the user's recipes as newline delimited JSON, oldest first"""
+        fields = serializers.get_requested_fields(request.query_params, serializers.RecipeBulkSerializer.Meta.fields)
+        rows = Recipe.objects.filter(user=request.user).order_by('id').values(*self.get_columns(fields))
+        response = StreamingHttpResponse(self.export_lines(rows, fields), content_type=NDJSONRenderer.media_type)
+        response['Content-Disposition'] = 'attachment; filename="recipes.ndjson"'
+        return response
+
+    @staticmethod
+    def export_lines(rows, fields):
+        """Yield one chunk of lines per batch read from a server side cursor.
+
+        Tags and ingredients are looked up once per batch, so memory stays
+        bounded by the chunk size and queries grow per batch, not per recipe.
+        """
+        def render(batch):
+            data = serializers.RecipeListFastSerializer(batch, fields=fields).data
+            return b''.join(map(NDJSONRenderer.render_line, data))
+
+        chunk_size = settings.RECIPE_EXPORT_CHUNK_SIZE
+        batch = []
+        for row in rows.iterator(chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) == chunk_size:
+                yield render(batch)
+                batch = []
+        if batch:
+            yield render(batch)
+
+    @action(methods=['GET'], detail=False)
+    def facets(self, request):
+        """Count the recipes matching the list filters per tag and per ingredient"""
+        return self.conditional_get(self.get_facets, request)
+
+    def get_facets(self, request):
+        key = filter_cache_key(request.user.pk, 'facets', self.get_filter_signature())
+        data = cache.get(key)
+        if data is None:
+            data = self.facet_counts(self.filter_recipes(self.queryset))
+            cache.set(key, data, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+        return Response(data)
+
+    def facet_counts(self, recipes):
+        """Count the links of the given recipes per tag and ingredient.
+
+        Both through tables are grouped in one UNION ALL query, the recipe
+        filters run once per branch as a subquery.
+        """
+        recipe_ids = recipes.values('id')
+        branches = []
+        for relation in self.relations:
+            descriptor = getattr(Recipe, relation)
+            related = descriptor.field.m2m_reverse_field_name()
+            branches.append(descriptor.through.objects.filter(recipe_id__in=recipe_ids).values(
+                facet=Value(relation),
+                item_id=F(f'{related}_id'),
+                name=F(f'{related}__name'),
+            ).annotate(count=Count('*')))
+        data = {relation: [] for relation in self.relations}
+        rows = branches[0].union(*branches[1:], all=True).order_by('-count', 'name', 'item_id')
+        for row in rows:
+            data[row['facet']].append({'id': row['item_id'], 'name': row['name'], 'count': row['count']})
+        return data
+
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False)
+    def bulk(self, request):
+        """Create (POST), update (PATCH) or delete (DELETE) many recipes in one request.
+
+        POST takes a list of recipes, PATCH a list of partial recipes with
+        their id and DELETE a list of ids. Errors are reported by index.
+        """
+        items = bulk.check_items(request.data)
+
+        if request.method == 'POST':
+            valid, errors = bulk.validate(self.get_serializer(), items)
+            return self.bulk_write(valid, errors, self.bulk_create, status.HTTP_201_CREATED)
+        if request.method == 'PATCH':
+            ids = [item['id'] for item in items if isinstance(item, dict) and bulk.is_id(item.get('id'))]
+            recipes = Recipe.objects.filter(user=request.user).defer('search_vector').in_bulk(ids)
+            valid, errors = bulk.validate(self.get_serializer(partial=True), items, instances=recipes)
+            return self.bulk_write(valid, errors, self.bulk_update, status.HTTP_200_OK)
+
+        valid, errors = bulk.find_ids(Recipe.objects.filter(user=request.user), items)
+        return self.bulk_write(valid, errors, self.bulk_destroy, status.HTTP_200_OK)
+
+    def is_bulk_atomic(self):
+        """Whether one invalid item rejects the whole bulk request"""
+        atomic = self.request.query_params.get('atomic')
+        if atomic is None:
+            return settings.RECIPE_BULK_ATOMIC
+        if atomic not in ('true', 'false'):
+            raise ValidationError({'atomic': 'Must be "true" or "false".'})
+        return atomic == 'true'
+
+    def bulk_write(self, valid, errors, write, success_status):
+        """Write the valid items in one transaction, unless the errors reject the request"""
+        if errors and (self.is_bulk_atomic() or not valid):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            results = write(list(valid.values()))
+            # Bulk writes skip the signals that invalidate the cached responses
+            bump_data_version(self.request.user.pk)
+        return Response({'results': results, 'errors': errors}, status=success_status)
+
+    def bulk_results(self, recipes):
+        """Render written recipes in the order they were given"""
+        fields = self.get_serializer_class().Meta.fields
+        written = Recipe.objects.filter(id__in=[recipe.pk for recipe in recipes]).values(*self.get_columns(fields))
+        rows = {row['id']: row for row in written}
+        return serializers.RecipeListFastSerializer([rows[recipe.pk] for recipe in recipes], fields=fields).data
+
+    def bulk_create(self, items):
+        return self.bulk_results(bulk.create_recipes(self.request.user, [data for _, data in items]))
+
+    def bulk_update(self, items):
+        return self.bulk_results(bulk.update_recipes(self.request.user, items))
+
+    def bulk_destroy(self, ids):
+        Recipe.objects.filter(id__in=ids).delete()
+        return ids
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -88,34 +385,188 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 description="Filter by items assigned to recipies",
                 enum=["0", "1"],  # Restrict allowed values to '0' and '1'
                 default="0"  # Set default value to '0'
+            ),
+            OpenApiParameter(
+                "ordering",
+                OpenApiTypes.STR,
+                description="Order by name or by number of recipes, most used first. "
+                            "Ordered by recipes, pages are selected with limit and offset instead of a cursor",
+                enum=["-name", "-recipe_count"],
+                default="-name"
             )
         ]
-    )
+    ),
+    autocomplete=extend_schema(
+        parameters=[
+            OpenApiParameter("q", OpenApiTypes.STR, description="Name prefix to complete", required=True),
+            OpenApiParameter("limit", OpenApiTypes.INT, description="Maximum number of matches (up to 50)", default=10),
+        ]
+    ),
+    merge=extend_schema(request=serializers.RecipeAttrMergeSerializer),
 )
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(ConditionalGetMixin,
+                            CachedListMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Base ViewSet for manage recipe attributes"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeAttrCursorPagination
+
+    orderings = {'-name': ('-name', 'id'), '-recipe_count': ('-recipe_count', 'id')}
 
     def get_queryset(self):
         """We are overwrite this method because we want user to be able to change only his own ingredients"""
-        assigned_only = int(bool(self.request.query_params.get('assigned_only', False)))
+        try:
+            assigned_only = bool(int(self.request.query_params.get('assigned_only', 0)))
+        except ValueError:
+            raise ValidationError({'assigned_only': 'Must be 0 or 1.'})
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
+            # Served by the partial index on recipe_count > 0, no join with the recipes
+            queryset = queryset.filter(recipe_count__gt=0)
+        return queryset.filter(user=self.request.user).order_by(*self.get_pagination_ordering())
+
+    @property
+    def paginator(self):
+        """Page count ordered lists by offset, the name ordering keeps its cursor"""
+        if not hasattr(self, '_paginator'):
+            by_count = self.request is not None and self.get_pagination_ordering() == self.orderings['-recipe_count']
+            self._paginator = RecipeAttrCountPagination() if by_count else self.pagination_class()
+        return self._paginator
+
+    def get_pagination_ordering(self):
+        """Order by name (the default) or by number of recipes, most used first"""
+        ordering = self.request.query_params.get('ordering', '-name')
+        if ordering not in self.orderings:
+            raise ValidationError({'ordering': f'Must be one of {", ".join(self.orderings)}.'})
+        return self.orderings[ordering]
+
+    def find_matches(self, text, limit):
+        """Return up to limit names starting with text, topped up with near misses"""
+        queryset = self.queryset.model.objects.filter(user=self.request.user)
+        # The prefix index is "C" collated (migration 0016), so ordering in its byte-wise order lets the range
+        # scan over the prefix stop after limit rows instead of sorting every match
+        prefixed = queryset.filter(name__istartswith=text).order_by(Collate(Upper('name'), 'C'))
+        matches = list(prefixed.values('id', 'name')[:limit])
+        if len(matches) < limit and len(text) >= 3 and has_trigram_support():
+            similar = queryset.filter(TrigramWordSimilar(Value(text), 'name')).exclude(
+                id__in=[match['id'] for match in matches],
+            ).order_by(TrigramWordSimilarity(Value(text), 'name').desc(), 'name')
+            matches += similar.values('id', 'name')[:limit - len(matches)]
+        return matches
+
+    @action(methods=['GET'], detail=False)
+    def autocomplete(self, request):
+        """Complete a tag or ingredient name from a prefix, tolerating small typos"""
+        text = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), 50)
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+        if not text or limit < 1:
+            return Response([])
+
+        key = (self.queryset.model._meta.label, request.user.pk, get_data_version(request.user.pk), text.lower(), limit)
+        matches = autocomplete_cache.get(key)
+        if matches is None:
+            matches = self.find_matches(text, limit)
+            autocomplete_cache.set(key, matches)
+        return Response(matches)
+
+    def perform_update(self, serializer):
+        """Report a clash with the per user unique name as a validation error"""
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({'name': 'You already have an item with this name.'})
+
+    @action(methods=['PATCH', 'DELETE'], detail=False)
+    def bulk(self, request):
+        """Rename (PATCH) or delete (DELETE) many items in one request, all or nothing.
+
+        PATCH takes a list of {"id", "name"}, DELETE a list of ids. Errors
+        are reported by index.
+        """
+        items = bulk.check_items(request.data)
+        model = self.queryset.model
+        queryset = model.objects.filter(user=request.user)
+        if request.method == 'PATCH':
+            ids = [item['id'] for item in items if isinstance(item, dict) and bulk.is_id(item.get('id'))]
+            valid, errors = bulk.validate(self.get_serializer(), items, instances=queryset.in_bulk(ids))
+            errors += self.name_clashes(queryset, valid)
+            if errors:
+                return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+            renamed, now = [], timezone.now()
+            for instance, data in valid.values():
+                instance.name = data['name']
+                # bulk_update does not run auto_now
+                instance.updated_at = now
+                renamed.append(instance)
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_update(renamed, ['name', 'updated_at'])
+                    # Bulk writes skip the signals that invalidate the cached responses
+                    bump_data_version(request.user.pk)
+            except IntegrityError:
+                # Swapping names between items clashes half way through the update
+                raise ValidationError({'non_field_errors': ['Names clash with each other, rename in two steps.']})
+            return Response({'results': self.get_serializer(renamed, many=True).data, 'errors': []})
+
+        valid, errors = bulk.find_ids(queryset, items)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            bulk.touch_linked_recipes(model, set(valid.values()))
+            queryset.filter(id__in=valid.values()).delete()
+        return Response({'results': items, 'errors': []})
+
+    @staticmethod
+    def name_clashes(queryset, valid):
+        """Return the errors of renames to a name that is taken, or given twice"""
+        errors, seen = [], set()
+        names = {data['name'] for _, data in valid.values()}
+        renamed = [instance.pk for instance, _ in valid.values()]
+        taken = set(queryset.filter(name__in=names).exclude(id__in=renamed).values_list('name', flat=True))
+        for index, (_, data) in valid.items():
+            if data['name'] in taken or data['name'] in seen:
+                errors.append({'index': index, 'errors': {'name': ['You already have an item with this name.']}})
+            seen.add(data['name'])
+        return errors
+
+    @action(methods=['POST'], detail=False)
+    def merge(self, request):
+        """Merge items into the one given by "into", moving their recipes over and deleting them"""
+        serializer = serializers.RecipeAttrMergeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        target_id = serializer.validated_data['into']
+        ids = set(serializer.validated_data['ids']) - {target_id}
+        model = self.queryset.model
+        found = model.objects.filter(user=request.user).in_bulk(ids | {target_id})
+        if target_id not in found:
+            raise ValidationError({'into': 'Not found.'})
+        missing = ids - found.keys()
+        if missing:
+            raise ValidationError({'ids': f'Not found: {", ".join(map(str, sorted(missing)))}.'})
+
+        with transaction.atomic():
+            bulk.merge(model, found[target_id], ids)
+            # The links are rewired with raw SQL, which sends no signals
+            bump_data_version(request.user.pk)
+        found[target_id].refresh_from_db(fields=['recipe_count'])
+        return Response(self.get_serializer(found[target_id]).data)
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """View for manage tag APIS"""
-    serializer_class = serializers.TagSerializer
+    serializer_class = serializers.TagDetailSerializer
     queryset = Tag.objects.all()
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """View for manage ingredient APIS"""
-    serializer_class = serializers.IngredientSerializer
+    serializer_class = serializers.IngredientDetailSerializer
     queryset = Ingredient.objects.all()
@@ -56,3 +56,9 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs['user'] = user
         return attrs
+
+
+class TokenSerializer(serializers.Serializer):
+    """Serializer for an issued auth token, the key is only ever shown here"""
+    token = serializers.CharField()
+    expires = serializers.DateTimeField()
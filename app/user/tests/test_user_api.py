@@ -11,6 +11,7 @@ from rest_framework import status
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
+ROTATE_TOKEN_URL = reverse('user:token-rotate')
 
 
 # helper function
@@ -78,6 +79,29 @@ class PublicUserTests(TestCase):
         self.assertIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_token_authenticates_until_rotated(self):
+        """Test an issued token works and stops working once rotated"""
+        create_user(email='test@example.com', password='testpass123')
+        res = self.client.post(TOKEN_URL, {'email': 'test@example.com', 'password': 'testpass123'})
+        old = res.data['token']
+        self.assertIn('expires', res.data)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {old}')
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
+
+        res = self.client.post(ROTATE_TOKEN_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data['token'], old)
+
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {res.data['token']}")
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
+
+    def test_rotate_token_unauthorized(self):
+        """Test rotating requires a token"""
+        res = self.client.post(ROTATE_TOKEN_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
     def test_create_token_invalid_credentials(self):
         """Test that token is not created if invalid credentials are given"""
 
@@ -1,11 +1,23 @@
 """
 Views for the user API
 """
-from rest_framework import generics, authentication, permissions
+from django.db import transaction
+from drf_spectacular.utils import extend_schema
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 
-from user.serializers import (UserSerializer, AuthTokenSerializer)
+from core.authentication import CachedTokenAuthentication
+from core.models import AuthToken
+from user.serializers import (UserSerializer, AuthTokenSerializer, TokenSerializer)
+
+
+def token_response(user):
+    """Issue a new token for the user and return it with its expiry"""
+    token, key = AuthToken.objects.issue(user)
+    return Response(TokenSerializer({'token': key, 'expires': token.expires}).data)
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -17,12 +29,33 @@ class CreateTokenView(ObtainAuthToken):
     """Create a new auth token."""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    # ObtainAuthToken turns throttling off, but every attempt runs the password hash
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    throttle_scope = 'login'
+
+    @extend_schema(responses=TokenSerializer)
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return token_response(serializer.validated_data['user'])
+
+
+class RotateTokenView(APIView):
+    """Replace the token of the request with a new one, the old token stops working at once."""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    @extend_schema(request=None, responses=TokenSerializer)
+    def post(self, request):
+        with transaction.atomic():
+            AuthToken.objects.filter(pk=request.auth.pk).delete()
+            return token_response(request.user)
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):